@@ -0,0 +1,166 @@
+# 建立 autofit.py → 圖像機密自動縮放模組
+# 機密圖像放不進選定的載體時，自動縮小尺寸 / 降低品質 / 減色，找出放得下的最高畫質
+#
+# 策略（依序，找到就停）:
+#   1. 原圖就放得下 → 不處理
+#   2. 有損編碼（jpeg、指定品質的 webp）→ 原尺寸下二分搜尋品質
+#   3. 無損壓縮（png、webp）且允許減色 → 原尺寸減成 256 色調色盤
+#   4. 二分搜尋最長邊（維持長寬比；有損編碼用最低品質、允許減色時用減色版本）
+#
+# 逐像素格式（raw）的位元數只跟尺寸、色彩模式有關，直接用公式計算，不必實際編碼
+
+import math
+
+from PIL import Image
+
+from config import DEFAULT_IMAGE_CODEC, DEFAULT_IMAGE_QUALITY, DEFAULT_KEY_TAG, DEFAULT_PROGRESSIVE
+from config import TYPE_MARKER_SIZE, IMAGE_HEADER_SIZE
+from embed import plan_embedding, calculate_capacity, header_overhead
+from secret_encoding import get_image_color_info
+
+AUTOFIT_MIN_SIDE = 8       # 縮小的下限（最長邊）
+AUTOFIT_MIN_QUALITY = 30   # 有損編碼的品質下限
+
+def is_lossy(image_codec, quality):
+    return image_codec == 'jpeg' or (image_codec == 'webp' and quality is not None)
+
+def normalize_mode(image):
+    """統一色彩模式（與 image_to_binary 相同），縮放前先處理調色盤等模式"""
+    is_color, has_alpha = get_image_color_info(image)
+    if not is_color:
+        return image.convert('L')
+    if image.mode not in ['RGB', 'RGBA']:
+        return image.convert('RGBA' if has_alpha else 'RGB')
+    return image
+
+def scaled_size(size, side):
+    """等比例縮放到最長邊 = side 的尺寸"""
+    width, height = size
+    scale = side / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def resize_longest_side(image, side):
+    """等比例縮小到最長邊 = side"""
+    return image.resize(scaled_size(image.size, side), Image.LANCZOS, reducing_gap=2.0)
+
+def quantize_palette(image):
+    """減成 256 色調色盤（保留透明）"""
+    if image.mode == 'L':
+        return image
+    method = Image.FASTOCTREE if image.mode == 'RGBA' else Image.MEDIANCUT
+    return image.quantize(256, method=method)
+
+def required_bits(image, image_codec, quality, key_tag=None, progressive=None):
+    return plan_embedding(image, 'image', image_codec=image_codec, quality=quality, key_tag=key_tag,
+                          progressive=progressive)['required_bits']
+
+def search_max(low, high, fits):
+    """
+    二分搜尋 [low, high] 中 fits(x) 成立的最大整數（假設單調：x 越小越容易放得下）
+
+    返回:
+        最大的 x，low 也放不下則返回 None
+    """
+    if not fits(low):
+        return None
+    while low < high:
+        mid = (low + high + 1) // 2
+        if fits(mid):
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+def fit_image_secret(image, budget_bits=None, cover_size=None, image_codec=None, quality=None,
+                     allow_quantize=True, min_side=AUTOFIT_MIN_SIDE, key_tag=None, progressive=None):
+    """
+    功能:
+        將機密圖像調整到放得進指定容量的最高畫質
+
+    參數:
+        image: PIL Image 物件
+        budget_bits: 可用位元數（含類型標記）
+        cover_size: 載體邊長（未指定 budget_bits 時，以此載體的容量為上限）
+        image_codec: 嵌入時的圖像編碼方式（見 embed.embed_secret）
+        quality: 有損編碼的起始品質（jpeg 預設 DEFAULT_IMAGE_QUALITY）
+        allow_quantize: 無損壓縮時是否允許減色
+        min_side: 縮小的下限（最長邊）
+        key_tag: 嵌入時是否加密鑰檢查碼（見 embed.embed_secret）
+        progressive: 嵌入時逐像素圖像是否用漸進式順序（見 embed.embed_secret）
+
+    返回:
+        fitted: 調整後的 PIL Image
+        info: dict
+            - size: 調整後尺寸
+            - quality: 嵌入時要用的品質（無損為 None）
+            - quantized: 是否減色
+            - required_bits: 調整後所需位元數
+            - changed: 是否有調整
+
+    例外:
+        縮到 min_side 仍放不下時拋出 ValueError
+    """
+    if budget_bits is None:
+        if cover_size is None:
+            raise ValueError("需要指定 budget_bits 或 cover_size")
+        budget_bits = calculate_capacity(cover_size, cover_size)
+    image_codec = image_codec or DEFAULT_IMAGE_CODEC
+    lossy = is_lossy(image_codec, quality)
+    if image_codec == 'jpeg' and quality is None:
+        quality = DEFAULT_IMAGE_QUALITY
+
+    def result(fitted, used_quality, quantized, bits, changed=True):
+        return fitted, {'size': fitted.size, 'quality': used_quality, 'quantized': quantized,
+                        'required_bits': bits, 'changed': changed}
+
+    # 1. 原圖就放得下
+    bits = required_bits(image, image_codec, quality, key_tag, progressive)
+    if bits <= budget_bits:
+        return result(image, quality, False, bits, changed=False)
+
+    image = normalize_mode(image)
+
+    # 2. 有損編碼：原尺寸下找放得下的最高品質
+    if lossy:
+        best_quality = search_max(AUTOFIT_MIN_QUALITY, quality,
+                                  lambda q: required_bits(image, image_codec, q, key_tag, progressive) <= budget_bits)
+        if best_quality is not None:
+            return result(image, best_quality, False, required_bits(image, image_codec, best_quality, key_tag, progressive))
+        quality = AUTOFIT_MIN_QUALITY
+        bits = required_bits(image, image_codec, quality, key_tag, progressive)
+
+    # 3. 無損壓縮：減色
+    quantized = allow_quantize and image_codec in ('png', 'webp') and not lossy and image.mode != 'L'
+    if quantized:
+        candidate = quantize_palette(image)
+        bits = required_bits(candidate, image_codec, quality, key_tag, progressive)
+        if bits <= budget_bits:
+            return result(candidate, quality, True, bits)
+
+    # 4. 縮小尺寸：找放得下的最大邊長
+    # 位元數大約與面積成正比，搜尋上限取估計邊長的 2 倍（避免反覆壓縮大尺寸）
+    longest = max(image.size)
+    estimate = longest * math.sqrt(budget_bits / bits)
+    if image_codec == 'raw':
+        # 位元數 = 類型標記 + 34 + w×h×每像素位元數，直接用公式
+        is_color, has_alpha = get_image_color_info(image)
+        bits_per_pixel = (32 if has_alpha else 24) if is_color else 8
+        overhead = header_overhead('image', image_codec, DEFAULT_KEY_TAG if key_tag is None else key_tag,
+                                   DEFAULT_PROGRESSIVE if progressive is None else progressive)
+        def fits(side):
+            width, height = scaled_size(image.size, side)
+            return overhead + TYPE_MARKER_SIZE + IMAGE_HEADER_SIZE + width * height * bits_per_pixel <= budget_bits
+    else:
+        def fits(side):
+            return required_bits(shrink(side), image_codec, quality, key_tag, progressive) <= budget_bits
+
+    def shrink(side):
+        candidate = resize_longest_side(image, side)
+        return quantize_palette(candidate) if quantized else candidate
+
+    side = search_max(min(min_side, longest), min(longest - 1, math.ceil(2 * estimate)), fits)
+    if side is None:
+        raise ValueError(f"機密圖像縮小到 {min_side} px 仍放不下（容量 {budget_bits:,} bits）")
+
+    fitted = shrink(side)
+    return result(fitted, quality, quantized, required_bits(fitted, image_codec, quality, key_tag, progressive))
@@ -0,0 +1,217 @@
+# 建立 backends.py → 運算後端模組
+# 「載體 → MSB 平面」與「位元 ⊕ MSB 平面」的可替換實作（後端註冊表）
+#
+# 內建後端（結果逐位元相同）:
+#   reference: 原本的逐區塊流程（驗證基準）
+#   numpy:     依區塊數自動選 scalar / vector（見 engine.py）
+#   scalar:    純 Python 整數（numpy 後端的固定模式）
+#   vector:    整張陣列 numpy（numpy 後端的固定模式）
+#   numba:     JIT 編譯的區塊核心（需安裝 numba，選用）
+#
+# 選擇方式（優先順序）:
+#   1. 呼叫時指定：embed_secret(..., backend='numba')
+#   2. 環境變數：ECIHMSB_BACKEND=numpy
+#   3. config.DEFAULT_BACKEND（'auto' = AUTO_ORDER 中第一個可用的後端）
+
+import os
+import importlib.util
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from config import BLOCK_SIZE, TOTAL_AVERAGES_PER_UNIT, DEFAULT_BACKEND
+from mapping import map_to_z
+from permutation import THREE_ROUND_TABLE
+from engine import msb_plane_reference, compute_msb_plane, combine_with_plane, generate_Q_ids
+from engine import LAYER1_THRESHOLD, LAYER2_THRESHOLD, LAYER3_THRESHOLD
+
+AUTO_ORDER = ('numba', 'numpy')  # 'auto' 時依序嘗試
+
+# ==================== 後端介面 ====================
+class Backend(ABC):
+    """
+    運算後端介面（子類別必須實作 msb_plane，否則無法建立物件）
+
+    方法:
+        is_available(): 此環境能否使用
+        msb_plane(cover_image, num_blocks, contact_key, first_block): 從 first_block 起 num_blocks 個區塊排列後的 MSB 平面
+        xor_plane(bits, plane): 位元與 MSB 平面逐位映射（嵌入、提取共用）
+    """
+    name = None
+
+    def is_available(self):
+        return True
+
+    @abstractmethod
+    def msb_plane(self, cover_image, num_blocks, contact_key=None, first_block=0):
+        """從 first_block 起 num_blocks 個區塊排列後的 MSB 平面"""
+
+    def xor_plane(self, bits, plane):
+        return combine_with_plane(bits, plane)
+
+class ReferenceBackend(Backend):
+    """原本的逐區塊流程 + 映射表（最慢，作為驗證基準）"""
+    name = 'reference'
+
+    def msb_plane(self, cover_image, num_blocks, contact_key=None, first_block=0):
+        return msb_plane_reference(cover_image, num_blocks, contact_key, first_block)
+
+    def xor_plane(self, bits, plane):
+        # 正向 (M, MSB) → Z 與反向 (Z, MSB) → M 的映射表內容相同，嵌入、提取都可用 map_to_z
+        return [map_to_z(bit, msb) for bit, msb in zip(bits, plane)]
+
+class NumpyBackend(Backend):
+    """
+    numpy 後端
+
+    參數:
+        engine: 'auto'（依區塊數選擇）、'scalar' 或 'vector'，None 表示 config.DEFAULT_ENGINE
+    """
+    def __init__(self, name='numpy', engine=None):
+        self.name = name
+        self.engine = engine
+
+    def msb_plane(self, cover_image, num_blocks, contact_key=None, first_block=0):
+        return compute_msb_plane(cover_image, num_blocks, contact_key, self.engine, first_block)
+
+class NumbaBackend(Backend):
+    """
+    numba JIT 後端（第一次使用時編譯，cache=True 會把編譯結果存到 __pycache__）
+
+    註:
+        Q 仍由 numpy 的 argsort 計算（numba 的排序演算法不同，像素值相同時順序會不一樣）
+    """
+    name = 'numba'
+
+    def __init__(self):
+        self._kernel = None
+        self._available = None
+
+    def is_available(self):
+        if self._available is None:
+            self._available = importlib.util.find_spec('numba') is not None
+        return self._available
+
+    def get_kernel(self):
+        if self._kernel is None:
+            self._kernel = build_numba_kernel()
+        return self._kernel
+
+    def msb_plane(self, cover_image, num_blocks, contact_key=None, first_block=0):
+        if num_blocks <= 0:
+            return []
+        Q_ids = generate_Q_ids(cover_image, num_blocks, contact_key, first_block)
+        plane = np.empty(num_blocks * TOTAL_AVERAGES_PER_UNIT, dtype=np.uint8)
+        cover_image = np.ascontiguousarray(cover_image, dtype=np.uint8)
+        self.get_kernel()(cover_image, first_block, num_blocks, cover_image.shape[1] // BLOCK_SIZE, Q_ids,
+                          THREE_ROUND_TABLE, plane)
+        return plane
+
+def msb_plane_kernel(cover_image, first_block, num_blocks, num_cols, Q_ids, three_round_table, plane):
+    """
+    功能:
+        numba 後端的區塊核心（純 Python 也能執行，但只在 njit 編譯後使用）
+
+    參數:
+        cover_image: uint8 灰階圖像 (H×W)
+        first_block: 第一個區塊的編號
+        num_blocks: 區塊數
+        num_cols: 水平方向區塊數
+        Q_ids: (num_blocks,) Q 的排列編號
+        three_round_table: permutation.THREE_ROUND_TABLE (5040×21)
+        plane: 輸出 MSB 平面（uint8，長度 num_blocks × 21）
+    """
+    msbs = np.empty(TOTAL_AVERAGES_PER_UNIT, dtype=np.uint8)
+    s2 = np.empty(4, dtype=np.int64)
+    for index in range(num_blocks):
+        r0 = ((first_block + index) // num_cols) * BLOCK_SIZE
+        c0 = ((first_block + index) % num_cols) * BLOCK_SIZE
+        s2[:] = 0
+
+        # 第一層：16 個 2×2 總和，同時累加到所屬的第二層分組
+        for a in range(4):
+            for b in range(4):
+                r = r0 + 2 * a
+                c = c0 + 2 * b
+                s = (np.int64(cover_image[r, c]) + np.int64(cover_image[r, c + 1]) +
+                     np.int64(cover_image[r + 1, c]) + np.int64(cover_image[r + 1, c + 1]))
+                msbs[a * 4 + b] = 1 if s >= LAYER1_THRESHOLD else 0
+                s2[(a // 2) * 2 + b // 2] += s
+
+        # 第二層、第三層
+        s3 = 0
+        for g in range(4):
+            msbs[16 + g] = 1 if s2[g] >= LAYER2_THRESHOLD else 0
+            s3 += s2[g]
+        msbs[20] = 1 if s3 >= LAYER3_THRESHOLD else 0
+
+        # 三輪套用同一個 Q（依編號查表）
+        base = index * TOTAL_AVERAGES_PER_UNIT
+        row = three_round_table[Q_ids[index]]
+        for k in range(TOTAL_AVERAGES_PER_UNIT):
+            plane[base + k] = msbs[row[k]]
+
+def build_numba_kernel():
+    """編譯 msb_plane_kernel（模組層級常數在編譯時固定）"""
+    import numba
+    return numba.njit(cache=True)(msb_plane_kernel)
+
+# ==================== 註冊表 ====================
+BACKENDS = {}
+
+def register_backend(backend):
+    """
+    功能:
+        註冊（或取代）一個後端
+
+    參數:
+        backend: Backend 物件（以 backend.name 為名稱）
+
+    例外:
+        不是 Backend 物件、沒有名稱時拋出 TypeError
+    """
+    if not isinstance(backend, Backend) or not backend.name:
+        raise TypeError(f"後端必須是有名稱的 Backend 物件: {backend!r}")
+    BACKENDS[backend.name] = backend
+
+def available_backends():
+    """返回此環境可用的後端名稱列表"""
+    return [name for name, backend in BACKENDS.items() if backend.is_available()]
+
+def get_backend(name=None):
+    """
+    功能:
+        取得後端
+
+    參數:
+        name: 後端名稱或 'auto'；None 表示依環境變數 ECIHMSB_BACKEND、config.DEFAULT_BACKEND 決定
+
+    返回:
+        Backend 物件
+
+    例外:
+        名稱未知或該後端在此環境不可用時拋出 ValueError
+    """
+    if isinstance(name, Backend):
+        return name
+
+    name = name or os.environ.get('ECIHMSB_BACKEND') or DEFAULT_BACKEND
+    if name == 'auto':
+        for candidate in AUTO_ORDER:
+            backend = BACKENDS.get(candidate)
+            if backend is not None and backend.is_available():
+                return backend
+        name = 'reference'
+
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"未知的運算後端: {name}（可用: auto, {', '.join(available_backends())}）")
+    if not backend.is_available():
+        raise ValueError(f"運算後端 {name} 在此環境不可用（可用: {', '.join(available_backends())}）")
+    return backend
+
+register_backend(ReferenceBackend())
+register_backend(NumpyBackend())
+register_backend(NumpyBackend('scalar', 'scalar'))
+register_backend(NumpyBackend('vector', 'vector'))
+register_backend(NumbaBackend())
@@ -0,0 +1,312 @@
+# 建立 benchmarks/run_benchmarks.py → 效能測試模組
+# 量測嵌入/提取流程各函式的執行時間，結果輸出為 JSON（用於比對效能退化）
+#
+# 用法:
+#   python benchmarks/run_benchmarks.py                          # 全部測項
+#   python benchmarks/run_benchmarks.py --sizes 64 256 --repeat 5
+#   python benchmarks/run_benchmarks.py --filter embed --output bench.json
+#   python benchmarks/run_benchmarks.py --compare old.json       # 與舊結果比對，變慢則回傳 1
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+
+import numpy as np
+from PIL import Image
+
+# 讓腳本可直接執行（模組都放在專案根目錄）
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from config import AVAILABLE_SIZES
+from embed import embed_secret, calculate_capacity, plan_embedding
+from extract import extract_secret, detect_and_extract
+from secret_encoding import xor_cipher, image_to_binary, binary_to_image
+from image_encoding import z_to_image_with_header, image_to_z_with_header
+from image_processing import convert_to_grayscale
+from backends import available_backends, get_backend
+
+BENCH_CONTACT_KEY = "0123456789abcdef0123456789abcdef"  # 與 generate_contact_key 同格式（32 字元）
+
+# ==================== 合成測試資料 ====================
+def make_synthetic_cover(size, seed=0):
+    """
+    功能:
+        產生合成的灰階載體圖像（不需網路）
+    
+    參數:
+        size: 圖像邊長
+        seed: 隨機種子
+    
+    返回:
+        cover: numpy array (size×size)，uint8
+    
+    原理:
+        漸層 + 雜訊，讓平均值的 MSB 有 0 也有 1（接近真實照片）
+    """
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(40, 215, size, dtype=np.float64)
+    base = (gradient[None, :] + gradient[:, None]) / 2
+    noise = rng.normal(0, 25, (size, size))
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+def make_synthetic_text(num_chars, seed=0):
+    """
+    功能:
+        產生中英混合的測試文字
+    
+    參數:
+        num_chars: 字元數
+        seed: 隨機種子
+    
+    返回:
+        text: 測試文字
+    """
+    rng = np.random.default_rng(seed)
+    alphabet = list("abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789，。今天天氣很好我們一起去看電影吧")
+    return ''.join(rng.choice(alphabet, num_chars))
+
+def make_synthetic_image(width, height, mode='RGB', seed=0):
+    """
+    功能:
+        產生測試用的機密圖像
+    
+    參數:
+        width, height: 圖像尺寸
+        mode: 色彩模式（'RGB'、'L'、'RGBA'）
+        seed: 隨機種子
+    
+    返回:
+        image: PIL Image 物件
+    """
+    rng = np.random.default_rng(seed)
+    channels = {'L': 1, 'RGB': 3, 'RGBA': 4}[mode]
+    data = rng.integers(0, 256, (height, width, channels), dtype=np.uint8)
+    if channels == 1:
+        data = data[:, :, 0]
+    return Image.fromarray(data, mode=mode)
+
+def make_fill_image(size, fraction):
+    """
+    功能:
+        產生大小約為載體容量 fraction 倍的 RGB 機密圖像
+    
+    參數:
+        size: 載體邊長
+        fraction: 佔用比例（0~1）
+    
+    返回:
+        image: PIL Image 物件
+    """
+    capacity = calculate_capacity(size, size)
+    side = max(1, int(((capacity * fraction - 35) / 24) ** 0.5))
+    return make_synthetic_image(side, side, 'RGB', seed=size)
+
+# ==================== 計時 ====================
+def time_call(func, repeat):
+    """
+    功能:
+        重複執行 func 並記錄每次耗時
+    
+    參數:
+        func: 無參數函式
+        repeat: 重複次數
+    
+    返回:
+        stats: {'min_s', 'median_s', 'mean_s', 'repeat'}
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    
+    return {
+        'min_s': min(durations),
+        'median_s': statistics.median(durations),
+        'mean_s': statistics.mean(durations),
+        'repeat': repeat
+    }
+
+# ==================== 測項 ====================
+def build_secrets(size, fill_fraction):
+    """
+    功能:
+        建立一個載體尺寸要測的機密清單
+    
+    返回:
+        list: [(名稱, secret_type, secret), ...]
+    """
+    secrets = [
+        ('text_short', 'text', make_synthetic_text(20)),
+        ('text_long', 'text', make_synthetic_text(300)),
+        ('image_gray_16', 'image', make_synthetic_image(16, 16, 'L')),
+        ('image_rgb_32', 'image', make_synthetic_image(32, 32, 'RGB')),
+    ]
+    if fill_fraction:
+        secrets.append((f'image_fill_{fill_fraction:g}', 'image', make_fill_image(size, fill_fraction)))
+    
+    # 只保留放得下的機密
+    capacity = calculate_capacity(size, size)
+    return [(name, secret_type, secret) for name, secret_type, secret in secrets
+            if plan_embedding(secret, secret_type)['required_bits'] <= capacity]
+
+def iter_cases(sizes, fill_fraction):
+    """
+    功能:
+        產生所有測項（名稱、參數、待計時函式）
+    
+    參數:
+        sizes: 要測的載體尺寸
+        fill_fraction: 大圖測項佔用容量的比例（0 表示不測）
+    
+    返回:
+        generator: (name, params, func)
+    """
+    for size in sizes:
+        cover = make_synthetic_cover(size)
+        
+        rgb_cover = np.repeat(cover[:, :, None], 3, axis=2)
+        for rounding in ['pil', 'legacy']:
+            yield ('convert_to_grayscale', {'size': size, 'rounding': rounding},
+                   lambda im=rgb_cover, r=rounding: convert_to_grayscale(im, rounding=r))
+        
+        total_blocks = (size // 8) ** 2
+        for num_blocks in sorted({1, 16, total_blocks}):
+            for backend_name in available_backends():
+                if backend_name in ('reference', 'scalar') and num_blocks > 4096:
+                    continue  # 逐區塊 Python 流程太慢，大圖不測
+                backend = get_backend(backend_name)
+                backend.msb_plane(cover, 1, BENCH_CONTACT_KEY)  # 先執行一次，JIT 編譯時間不計入
+                yield ('msb_plane', {'size': size, 'blocks': num_blocks, 'backend': backend_name},
+                       lambda c=cover, n=num_blocks, b=backend: b.msb_plane(c, n, BENCH_CONTACT_KEY))
+        
+        for secret_name, secret_type, secret in build_secrets(size, fill_fraction):
+            for key_name, contact_key in [('nokey', None), ('key', BENCH_CONTACT_KEY)]:
+                params = {'size': size, 'secret': secret_name, 'key': key_name}
+                z_bits, _, _ = embed_secret(cover, secret, secret_type=secret_type, contact_key=contact_key)
+                params['z_bits'] = len(z_bits)
+                
+                yield ('embed_secret', params,
+                       lambda c=cover, s=secret, t=secret_type, k=contact_key: embed_secret(c, s, secret_type=t, contact_key=k))
+                yield ('extract_secret', params,
+                       lambda c=cover, z=z_bits, t=secret_type, k=contact_key: extract_secret(c, z, secret_type=t, contact_key=k))
+                yield ('detect_and_extract', params,
+                       lambda c=cover, z=z_bits, k=contact_key: detect_and_extract(c, z, contact_key=k))
+    
+    # 與載體無關的編碼函式（以機密大小為參數）
+    for bits_len in [1_000, 100_000]:
+        bits = np.random.default_rng(bits_len).integers(0, 2, bits_len).tolist()
+        yield ('xor_cipher', {'bits': bits_len}, lambda b=bits: xor_cipher(b, BENCH_CONTACT_KEY))
+        
+        z_img, _ = z_to_image_with_header(bits, 1, 1, 64)
+        yield ('z_to_image_with_header', {'bits': bits_len}, lambda b=bits: z_to_image_with_header(b, 1, 1, 64))
+        yield ('image_to_z_with_header', {'bits': bits_len}, lambda im=z_img: image_to_z_with_header(im))
+    
+    for side, mode in [(32, 'L'), (32, 'RGB'), (128, 'RGB'), (128, 'RGBA')]:
+        image = make_synthetic_image(side, side, mode)
+        binary, _, _ = image_to_binary(image)
+        params = {'image': f'{mode}_{side}', 'bits': len(binary)}
+        yield ('image_to_binary', params, lambda im=image: image_to_binary(im))
+        yield ('binary_to_image', params, lambda b=binary: binary_to_image(b))
+
+def run_benchmarks(sizes=None, repeat=3, name_filter=None, fill_fraction=0.0, verbose=True):
+    """
+    功能:
+        執行所有測項
+    
+    參數:
+        sizes: 載體尺寸列表（預設 AVAILABLE_SIZES）
+        repeat: 每個測項重複次數
+        name_filter: 只跑名稱包含此字串的測項
+        fill_fraction: 大圖測項佔用容量的比例（0 表示不測）
+        verbose: 是否印出進度
+    
+    返回:
+        report: {'meta': 執行環境, 'results': [每個測項的結果]}
+    """
+    sizes = sizes or AVAILABLE_SIZES
+    results = []
+    
+    for name, params, func in iter_cases(sizes, fill_fraction):
+        if name_filter and name_filter not in name:
+            continue
+        stats = time_call(func, repeat)
+        results.append({'name': name, 'params': params, **stats})
+        if verbose:
+            param_text = ' '.join(f'{k}={v}' for k, v in params.items())
+            print(f"{name:<24} {param_text:<60} {stats['median_s'] * 1000:10.2f} ms")
+    
+    meta = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'repeat': repeat
+    }
+    return {'meta': meta, 'results': results}
+
+# ==================== 比對 ====================
+def result_key(result):
+    """測項的唯一識別（名稱 + 參數）"""
+    return result['name'] + json.dumps(result['params'], sort_keys=True)
+
+def compare_reports(old_report, new_report, threshold=1.2):
+    """
+    功能:
+        比對兩份結果，找出變慢的測項
+    
+    參數:
+        old_report: 舊結果
+        new_report: 新結果
+        threshold: median 變慢超過這個倍數即視為退化
+    
+    返回:
+        regressions: [(測項識別, 舊 median, 新 median), ...]
+    """
+    old_map = {result_key(r): r for r in old_report['results']}
+    regressions = []
+    
+    for r in new_report['results']:
+        old = old_map.get(result_key(r))
+        if old and r['median_s'] > old['median_s'] * threshold:
+            regressions.append((result_key(r), old['median_s'], r['median_s']))
+    
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="E-CIHMSB 效能測試")
+    parser.add_argument('--sizes', type=int, nargs='+', help="載體尺寸（預設全部 AVAILABLE_SIZES）")
+    parser.add_argument('--repeat', type=int, default=3, help="每個測項重複次數")
+    parser.add_argument('--filter', dest='name_filter', help="只跑名稱包含此字串的測項")
+    parser.add_argument('--fill', type=float, default=0.0, help="加測佔用容量此比例的大圖（例如 0.25）")
+    parser.add_argument('--output', help="結果輸出的 JSON 檔案")
+    parser.add_argument('--compare', help="與此 JSON 結果比對")
+    parser.add_argument('--threshold', type=float, default=1.2, help="變慢超過此倍數視為退化")
+    args = parser.parse_args(argv)
+    
+    report = run_benchmarks(args.sizes, args.repeat, args.name_filter, args.fill)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"結果已寫入 {args.output}")
+    
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            old_report = json.load(f)
+        regressions = compare_reports(old_report, report, args.threshold)
+        for key, old_s, new_s in regressions:
+            print(f"變慢: {key}  {old_s * 1000:.2f} ms → {new_s * 1000:.2f} ms")
+        if regressions:
+            return 1
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -25,8 +25,74 @@ TOTAL_AVERAGES_PER_UNIT = NUM_LAYER1_BLOCKS + NUM_LAYER2_BLOCKS + NUM_LAYER3_BLO
 Q_LENGTH = 7                                    # Q 的長度(從圖像第一行取 7 個像素)
 Q_ROUNDS = TOTAL_AVERAGES_PER_UNIT // Q_LENGTH  # 重複使用輪數: 21÷7=3
 
+# 灰階轉換參數
+GRAYSCALE_ROUNDING = 'legacy'   # 彩色載體轉灰階：'legacy' = 舊版浮點截斷（舊 Z 碼使用）；'pil' = 定點整數四捨五入（與 PIL convert('L') 相同）
+GRAYSCALE_CHUNK_ROWS = 256   # 灰階轉換每次處理的列數（控制暫存記憶體）
+
+# 區塊運算引擎（見 engine.py）
+DEFAULT_ENGINE = 'auto'        # 'auto' = 依區塊數選 scalar / vector；也可指定 'scalar'、'vector'、'reference'
+ENGINE_CROSSOVER_BLOCKS = 4    # 未校準時的切換點（區塊數 ≥ 此值使用 vector）
+DEFAULT_BACKEND = 'auto'       # 運算後端（見 backends.py）；'auto' = 有 numba 用 numba，否則 numpy
+
 # 機密內容編碼參數
 IMAGE_HEADER_SIZE = 34  # 圖像 header 大小（寬 16 bits + 高 16 bits + is_color 1 bit + has_alpha 1 bit）
+TYPE_MARKER_SIZE = 1    # 類型標記大小（0 = 文字, 1 = 圖像）
+
+# 擴充 header（類型標記 1 之後接 16 個 0 = 寬度 0 的圖像，舊版不會產生，用來區分新舊格式）
+# [類型標記 1] + [16 bits 0] + [版本 4 bits | 類型 4 bits] + [旗標 8 bits] + [內容長度 32 bits] + XOR([內容])
+PAYLOAD_ESCAPE_SIZE = 16
+PAYLOAD_VERSION = 2
+EXTENDED_HEADER_SIZE = PAYLOAD_ESCAPE_SIZE + 8 + 8 + 32  # 64 bits（不含類型標記）
+PAYLOAD_TYPE_TEXT = 0        # 文字（UTF-8）
+PAYLOAD_TYPE_IMAGE_RAW = 1   # 圖像像素（與舊版相同的 34 bits header + 像素）
+PAYLOAD_TYPE_IMAGE_FILE = 2  # 壓縮後的圖檔 bytes（PNG / WebP / JPEG）
+
+# 密鑰檢查碼（旗標 PAYLOAD_FLAG_KEY_TAG，接在擴充 header 之後，不加密）
+# 檢查碼 = HMAC-SHA256(對象密鑰, 類型標記 + 擴充 header) 的前 KEY_TAG_SIZE bits
+# 提取時只要解出前幾個區塊就能判斷密鑰對不對，不必解完整個 Z 碼
+PAYLOAD_FLAG_KEY_TAG = 0x01
+KEY_TAG_SIZE = 16            # 選錯對象卻通過檢查的機率 1/65536
+# 類型標記 + 擴充 header + 檢查碼（81 bits）所在的前 4 個區塊不用對象密鑰排列 Q：
+# 雜訊多的載體上，密鑰不同時 MSB 平面幾乎全變，header 讀不出來就無法檢查；不用密鑰則任何對象都讀得到 header
+KEY_CHECK_BLOCKS = -(-(TYPE_MARKER_SIZE + EXTENDED_HEADER_SIZE + KEY_TAG_SIZE) // TOTAL_AVERAGES_PER_UNIT)
+DEFAULT_KEY_TAG = False      # 函式庫預設不加（維持舊版格式）
+
+# 可跳轉的密鑰流（擴充 header 一律設定此旗標；舊版格式、沒有旗標的擴充 header 仍用雜湊鏈）
+# 計數器模式的密鑰流可從任意位置開始，提取一段內容（extract.extract_range）不必從頭產生密鑰流
+PAYLOAD_FLAG_SEEKABLE = 0x02
+
+# 漸進式圖像（旗標 PAYLOAD_FLAG_PROGRESSIVE）：逐像素圖像的像素改用 Adam7 交錯順序（見 secret_encoding.ADAM7_PASSES）
+# 只解出 Z 碼開頭幾 % 就能畫出整張低解析度預覽（extract.extract_preview）
+PAYLOAD_FLAG_PROGRESSIVE = 0x04
+# 旗標沒有編碼方式：文字編碼在內容開頭（text_codecs.TEXT_ESCAPE），圖檔格式看檔頭（見 secret_encoding.parse_payload_header）
+DEFAULT_PROGRESSIVE = False  # 函式庫預設不用（逐像素圖像維持舊版格式）
+PREVIEW_FRACTION = 0.05      # 預覽預設解出內容的比例
+
+# 內容合理性評分（見 plausibility.py；沒有密鑰檢查碼的 Z 碼用來提早判斷亂碼）
+PLAUSIBILITY_PREFIX_BYTES = 256   # 提取前先解密開頭這麼多 bytes 評分
+PLAUSIBILITY_SAMPLE_ROWS = 64     # 圖像最終判斷只取樣這麼多列
+
+# 圖像機密的編碼方式（見 secret_encoding.encode_image_file）
+IMAGE_CODECS = ['raw', 'png', 'webp', 'jpeg']  # 'raw' = 舊版逐像素格式
+DEFAULT_IMAGE_CODEC = 'raw'                    # 預設維持舊版格式
+DEFAULT_IMAGE_QUALITY = 85                     # 有損壓縮（jpeg、指定品質的 webp）的預設品質
+
+# 文字機密的編碼方式（見 text_codecs.py）
+DEFAULT_TEXT_CODEC = 'raw'   # 'raw' = UTF-8（舊版格式）；'auto' = 取最短的編碼
+
+# 載體圖像尺寸（正方形邊長）
+AVAILABLE_SIZES = [64, 128, 256, 512, 1024, 2048, 4096]
+
+# Z 碼輸出參數
+Z_IMAGE_HEADER_SIZE = 72   # Z碼圖 header 大小（長度 32 + 風格 8 + 圖像編號 16 + 尺寸 16）
+QR_MAX_DATA_BITS = 23648   # QR Code 最大資料量（版本 40、容錯等級 L：2956 bytes）
+# 載體用快速灰階解碼（見 image_library.FAST_COVER_DECODE）時，Z 碼 header 要記錄，提取端才會用相同方式解碼
+Z_FAST_DECODE_STYLE_BIT = 0x80   # Z碼圖 header：風格編號（8 bits）的最高位元
+Z_FAST_DECODE_TEXT_TAG = 'f'     # 含 header 文字："風格編號-圖像編號-尺寸-f|Z碼"
+
+# 網頁預覽縮圖（見 rendering.py；下載按鈕仍提供原圖）
+PREVIEW_MAX_SIDE = 400       # 縮圖最長邊（頁面顯示 150~200 px，高解析度螢幕需 2 倍）
+PREVIEW_JPEG_QUALITY = 85    # 沒有透明通道的縮圖用 JPEG
 
 # 測試資料 (論文的圖 2)
 TEST_IMAGE = [
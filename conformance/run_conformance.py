@@ -0,0 +1,263 @@
+# 建立 conformance/run_conformance.py → 一致性驗證模組
+# 確認每個運算後端產生的 Z 碼與 reference（原本的逐區塊流程）逐位元相同，並與黃金向量比對
+#
+# 用法:
+#   python conformance/run_conformance.py                      # 全部尺寸、全部可用後端
+#   python conformance/run_conformance.py --sizes 64 256 --keys 32
+#   python conformance/run_conformance.py --backends numpy numba
+#   python conformance/run_conformance.py --update-golden      # 重新產生黃金向量（用 reference 後端）
+#
+# 檢查項目:
+#   1. MSB 平面：每個後端 vs reference（隨機對象密鑰、容易出現相同像素值的載體）
+#   2. 整張 MSB 平面：快速後端彼此比對（大圖 reference 太慢）
+#   3. Z 碼：每個後端的 embed_secret vs reference，並用每個後端提取還原
+#   4. 黃金向量：reference 的 Z 碼雜湊與 golden_vectors.json 相同（抓出 numpy 版本、平台差異）
+#
+# 有任何不一致即回傳 1
+
+import os
+import sys
+import json
+import string
+import hashlib
+import argparse
+
+import numpy as np
+from PIL import Image
+
+# 讓腳本可直接執行（模組都放在專案根目錄）
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from config import AVAILABLE_SIZES, BLOCK_SIZE, TOTAL_AVERAGES_PER_UNIT
+from embed import embed_secret
+from extract import detect_and_extract
+from backends import available_backends, get_backend
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden_vectors.json')
+
+COVER_KINDS = ['uniform', 'tie_heavy', 'near_threshold', 'flat', 'binary', 'gradient']
+GOLDEN_KEYS = [None, 'Alice', '0123456789abcdef0123456789abcdef']
+REFERENCE_MAX_BLOCKS = 512    # 和 reference 比對 MSB 平面時最多比對的區塊數
+SCALAR_MAX_BLOCKS = 16384     # 純 Python 後端的整張平面比對上限
+
+# ==================== 測試資料 ====================
+def make_cover(kind, size, seed=0):
+    """
+    功能:
+        產生指定類型的合成灰階載體
+
+    參數:
+        kind: COVER_KINDS 之一
+        size: 圖像邊長
+        seed: 隨機種子
+
+    返回:
+        cover: numpy array (size×size)，uint8
+
+    類型:
+        uniform:        均勻亂數
+        tie_heavy:      只有 3 種像素值，第一行幾乎每個區塊都有相同值（考驗 argsort 的順序）
+        near_threshold: 像素值 126~129，平均值在 128 附近（考驗截斷與門檻）
+        flat:           整張 128（全部相同）
+        binary:         只有 0 和 255
+        gradient:       漸層 + 少量雜訊（接近真實照片）
+    """
+    rng = np.random.default_rng([seed, size, COVER_KINDS.index(kind)])
+    if kind == 'uniform':
+        return rng.integers(0, 256, (size, size), dtype=np.uint8)
+    if kind == 'tie_heavy':
+        return rng.choice(np.array([100, 128, 200], dtype=np.uint8), (size, size))
+    if kind == 'near_threshold':
+        return rng.integers(126, 130, (size, size), dtype=np.uint8)
+    if kind == 'flat':
+        return np.full((size, size), 128, dtype=np.uint8)
+    if kind == 'binary':
+        return rng.choice(np.array([0, 255], dtype=np.uint8), (size, size))
+    if kind == 'gradient':
+        gradient = np.linspace(40, 215, size)
+        base = (gradient[None, :] + gradient[:, None]) / 2
+        return np.clip(base + rng.integers(-3, 4, (size, size)), 0, 255).astype(np.uint8)
+    raise ValueError(f"未知的載體類型: {kind}")
+
+def make_random_keys(count, seed=0):
+    """
+    功能:
+        產生隨機對象密鑰（含空字串、中文、emoji 等邊界情況）
+
+    參數:
+        count: 隨機密鑰數量
+        seed: 隨機種子
+
+    返回:
+        keys: 密鑰列表
+    """
+    rng = np.random.default_rng([seed, 1])
+    alphabet = list(string.ascii_letters + string.digits + " -_你好世界密鑰🔑")
+    keys = [None, '', 'Alice', '王小明']
+    for _ in range(count):
+        keys.append(''.join(rng.choice(alphabet, int(rng.integers(1, 40)))))
+    return keys
+
+def make_secrets(seed=0):
+    """
+    功能:
+        產生固定的測試機密（文字、各色彩模式的小圖像）
+
+    返回:
+        list: (名稱, secret_type, secret)
+    """
+    rng = np.random.default_rng([seed, 2])
+    return [
+        ('text_ascii', 'text', 'Hello, World!'),
+        ('text_cjk', 'text', '無載體資訊隱藏：今天天氣很好 🌤'),
+        ('image_L', 'image', Image.fromarray(rng.integers(0, 256, (5, 4), dtype=np.uint8), mode='L')),
+        ('image_RGB', 'image', Image.fromarray(rng.integers(0, 256, (4, 6, 3), dtype=np.uint8), mode='RGB')),
+    ]
+
+def sha256_hex(data):
+    return hashlib.sha256(bytes(data)).hexdigest()
+
+def secrets_equal(a, b):
+    if isinstance(a, str) or isinstance(b, str):
+        return a == b
+    return a.size == b.size and np.array_equal(np.array(a.convert('RGBA')), np.array(b.convert('RGBA')))
+
+# ==================== 檢查 ====================
+class Report:
+    """收集檢查結果"""
+    def __init__(self, verbose=True):
+        self.checks = 0
+        self.failures = []
+        self.verbose = verbose
+
+    def check(self, ok, description):
+        self.checks += 1
+        if not ok:
+            self.failures.append(description)
+            if self.verbose:
+                print(f"不一致: {description}")
+
+def check_planes(report, cover, label, backends, keys):
+    """MSB 平面：每個後端 vs reference（前 REFERENCE_MAX_BLOCKS 個區塊），快速後端之間比對整張"""
+    total_blocks = (cover.shape[0] // BLOCK_SIZE) * (cover.shape[1] // BLOCK_SIZE)
+    num_blocks = min(total_blocks, REFERENCE_MAX_BLOCKS)
+    reference = get_backend('reference')
+
+    for key in keys:
+        expected = list(reference.msb_plane(cover, num_blocks, key))
+        for name in backends:
+            actual = [int(v) for v in get_backend(name).msb_plane(cover, num_blocks, key)]
+            report.check(actual == expected, f"msb_plane {label} key={key!r} backend={name}")
+
+        # 區塊範圍（first_block）：跨區塊列的中間一段要和從頭算的結果相同
+        first_block = num_blocks // 3
+        for name in backends:
+            actual = [int(v) for v in get_backend(name).msb_plane(cover, num_blocks - first_block, key, first_block)]
+            report.check(actual == expected[first_block * TOTAL_AVERAGES_PER_UNIT:],
+                         f"msb_plane {label} key={key!r} backend={name} first_block={first_block}")
+
+    fast = [name for name in backends if name != 'reference' and not (name == 'scalar' and total_blocks > SCALAR_MAX_BLOCKS)]
+    if len(fast) > 1:
+        baseline = np.asarray(get_backend(fast[0]).msb_plane(cover, total_blocks, keys[-1]), dtype=np.uint8)
+        for name in fast[1:]:
+            actual = np.asarray(get_backend(name).msb_plane(cover, total_blocks, keys[-1]), dtype=np.uint8)
+            report.check(np.array_equal(actual, baseline), f"full msb_plane {label} backend={name} vs {fast[0]}")
+
+def check_embedding(report, cover, label, backends, secrets, keys, golden, golden_out):
+    """Z 碼：每個後端 vs reference，並用每個後端提取；reference 結果與黃金向量比對"""
+    for secret_name, secret_type, secret in secrets:
+        for key in keys:
+            case_id = f"{label}/{secret_name}/key={key}"
+            expected, _, _ = embed_secret(cover, secret, secret_type=secret_type, contact_key=key, backend='reference')
+
+            entry = {'cover_sha256': sha256_hex(cover.tobytes()), 'z_sha256': sha256_hex(expected), 'z_bits': len(expected)}
+            golden_out[case_id] = entry
+            if golden is not None:
+                stored = golden.get(case_id)
+                if stored is None:
+                    report.check(False, f"golden {case_id}: 黃金向量缺少此測項（請用 --update-golden 產生）")
+                elif stored['cover_sha256'] != entry['cover_sha256']:
+                    report.check(False, f"golden {case_id}: 合成載體與產生黃金向量時不同（numpy 亂數產生器改變）")
+                else:
+                    report.check(stored == entry, f"golden {case_id}: reference 的 Z 碼與黃金向量不同")
+
+            for name in backends:
+                z_bits, _, _ = embed_secret(cover, secret, secret_type=secret_type, contact_key=key, backend=name)
+                report.check(z_bits == expected, f"embed {case_id} backend={name}")
+
+                restored, restored_type, _ = detect_and_extract(cover, expected, contact_key=key, backend=name)
+                report.check(restored_type == secret_type and secrets_equal(restored, secret),
+                             f"extract {case_id} backend={name}")
+
+def run_conformance(sizes=None, backends=None, num_keys=8, seed=0, golden_path=GOLDEN_PATH,
+                    update_golden=False, verbose=True):
+    """
+    功能:
+        執行所有一致性檢查
+
+    參數:
+        sizes: 載體尺寸列表（預設 AVAILABLE_SIZES）
+        backends: 要檢查的後端（預設所有可用後端）
+        num_keys: MSB 平面檢查使用的隨機密鑰數量
+        seed: 隨機種子（黃金向量固定使用 seed=0）
+        golden_path: 黃金向量檔
+        update_golden: True 表示重新寫入黃金向量，不做比對
+        verbose: 是否印出進度
+
+    返回:
+        report: Report 物件（checks、failures）
+    """
+    sizes = sizes or AVAILABLE_SIZES
+    backends = backends or available_backends()
+    keys = make_random_keys(num_keys, seed)
+    secrets = make_secrets()
+
+    golden = None
+    if not update_golden and os.path.exists(golden_path):
+        with open(golden_path, 'r', encoding='utf-8') as f:
+            golden = json.load(f)['vectors']
+    elif not update_golden and verbose:
+        print(f"找不到黃金向量 {golden_path}，只比對各後端與 reference")
+    golden_out = {}
+
+    report = Report(verbose)
+    for size in sizes:
+        for kind in COVER_KINDS:
+            label = f"{kind}_{size}"
+            check_planes(report, make_cover(kind, size, seed), label, backends, keys)
+            check_embedding(report, make_cover(kind, size), label, backends, secrets, GOLDEN_KEYS, golden, golden_out)
+            if verbose:
+                print(f"{label:<24} 已檢查 {report.checks} 項，不一致 {len(report.failures)} 項")
+
+    if update_golden:
+        if golden_out and os.path.exists(golden_path):
+            with open(golden_path, 'r', encoding='utf-8') as f:
+                merged = json.load(f)['vectors']  # 只更新這次有跑的尺寸
+        else:
+            merged = {}
+        merged.update(golden_out)
+        with open(golden_path, 'w', encoding='utf-8') as f:
+            json.dump({'numpy': np.__version__, 'vectors': dict(sorted(merged.items()))}, f, ensure_ascii=False, indent=1)
+        if verbose:
+            print(f"黃金向量已寫入 {golden_path}（{len(merged)} 筆）")
+
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="E-CIHMSB 運算後端一致性驗證")
+    parser.add_argument('--sizes', type=int, nargs='+', help="載體尺寸（預設全部 AVAILABLE_SIZES）")
+    parser.add_argument('--backends', nargs='+', help="要檢查的後端（預設所有可用後端）")
+    parser.add_argument('--keys', type=int, default=8, help="MSB 平面檢查的隨機密鑰數量")
+    parser.add_argument('--seed', type=int, default=0, help="MSB 平面檢查的隨機種子")
+    parser.add_argument('--golden', default=GOLDEN_PATH, help="黃金向量檔")
+    parser.add_argument('--update-golden', action='store_true', help="用 reference 後端重新產生黃金向量")
+    args = parser.parse_args(argv)
+
+    report = run_conformance(args.sizes, args.backends, args.keys, args.seed, args.golden, args.update_golden)
+    print(f"共 {report.checks} 項檢查，{len(report.failures)} 項不一致")
+    return 1 if report.failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
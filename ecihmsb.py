@@ -0,0 +1,445 @@
+# 建立 ecihmsb.py → 命令列與函式庫入口
+# 不依賴 Streamlit 的嵌入/提取 API，並提供 python -m ecihmsb embed|extract|bench|conformance|calibrate
+#
+# 用法:
+#   python -m ecihmsb embed --cover 1-3-512 --text "Hello" --key KEY            # Z碼文字輸出到 stdout
+#   echo "Hello" | python -m ecihmsb embed --cover cover.png --text-file -
+#   python -m ecihmsb embed --cover 2-1-1024 --image "secrets/*.png" --output-dir out/
+#   python -m ecihmsb embed --cover 2-1-512 --image photo.jpg --image-codec webp --quality 80 --output z.png
+#   python -m ecihmsb embed --cover 2-1-256 --image photo.jpg --image-codec png --autofit --output z.png
+#   python -m ecihmsb embed --cover 2-1-1024 --image photo.jpg --progressive --output z.png  # 可先預覽整張圖
+#   python -m ecihmsb embed --cover 1-3-256 --text "明天見" --text-codec auto
+#   python -m ecihmsb extract --z z_code.png --key KEY                          # 載體由 Z碼 header 自動載入
+#   python -m ecihmsb extract --z z_code.png --contacts contacts.json           # 自動偵測收件對象
+#   python -m ecihmsb embed ... | python -m ecihmsb extract --z - --key KEY
+#   python -m ecihmsb bench --sizes 64 256
+#   python -m ecihmsb conformance --sizes 64 256                                 # 驗證各運算後端一致
+#   python -m ecihmsb calibrate                                                 # 校準 scalar/vector 切換點
+
+import os
+import re
+import sys
+import json
+import glob
+import argparse
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from secret_encoding import available_image_codecs
+from text_codecs import available_text_codecs
+from embed import embed_secret, calculate_capacity
+from autofit import fit_image_secret
+from extract import detect_and_extract, identify_contact
+from text_encoding import z_to_text_with_header, text_to_z_with_header, text_to_z
+from image_encoding import z_to_image_with_header, image_to_z_with_header
+from image_library import load_library_cover, decode_cover_gray, FAST_COVER_DECODE
+
+LIBRARY_REF_PATTERN = re.compile(r'^(\d+)-(\d+)-(\d+)$')  # 圖片庫載體：風格編號-圖像編號-尺寸
+
+# ==================== 函式庫 API ====================
+def parse_library_ref(source):
+    """
+    功能:
+        解析圖片庫載體代號
+    
+    參數:
+        source: 字串，例如 "1-3-512"
+    
+    返回:
+        (style_num, img_num, img_size)，若不是代號格式則返回 None
+    """
+    match = LIBRARY_REF_PATTERN.match(str(source))
+    if not match:
+        return None
+    return tuple(int(g) for g in match.groups())
+
+def load_cover(source, size=None, fast=None):
+    """
+    功能:
+        載入灰階載體圖像（本機檔案或圖片庫）
+    
+    參數:
+        source: 本機圖片路徑，或圖片庫代號 "風格編號-圖像編號-尺寸"（使用本機磁碟快取）
+        size: Z 碼 header 記錄的載體寬度（None 表示維持原尺寸）；
+              本機圖片寬度不同時（例如圖片庫的原圖）才縮放成 size×size，
+              相同時維持原尺寸，和嵌入時載入的載體一致（非正方形的載體也能提取）
+        fast: 圖片庫載體（和需要縮放的本機圖片）是否用快速灰階解碼，提取時依 Z 碼 header；
+              None 表示 image_library.FAST_COVER_DECODE
+    
+    返回:
+        cover: numpy array，灰階圖像 (H×W)
+    
+    例外:
+        找不到檔案且不是圖片庫代號時拋出 ValueError
+    """
+    if os.path.exists(str(source)):
+        with open(source, 'rb') as f:
+            image_data = f.read()
+        image = Image.open(BytesIO(image_data))
+        if size and image.width != size:
+            gray = decode_cover_gray(image_data, size, fast)
+        else:
+            gray = image.convert('L')
+        return np.array(gray)
+    
+    ref = parse_library_ref(source)
+    if ref is None:
+        raise ValueError(f"找不到載體：{source}（請給本機檔案或「風格編號-圖像編號-尺寸」）")
+    gray = load_library_cover(*ref, fast=fast)
+    return np.array(gray)
+
+def cover_header(source, cover, fast=False):
+    """
+    功能:
+        取得 Z 碼 header 要記錄的載體資訊
+    
+    參數:
+        source: 載體來源（本機路徑或圖片庫代號）
+        cover: 灰階載體 numpy array
+        fast: 圖片庫載體是否用快速灰階解碼載入
+    
+    返回:
+        (style_num, img_num, img_size, fast_decode)，本機載體的風格與圖像編號為 0（不使用快速解碼）
+    """
+    ref = parse_library_ref(source)
+    if ref is not None and not os.path.exists(str(source)):
+        return ref + (bool(fast),)
+    return 0, 0, cover.shape[1], False
+
+def encode_z_code(z_bits, style_num, img_num, img_size, fast_decode=False, fmt='text'):
+    """
+    功能:
+        將 Z 碼輸出成文字或 PNG
+    
+    參數:
+        z_bits: Z 碼位元列表
+        style_num, img_num, img_size, fast_decode: 載體資訊（寫入 header，見 cover_header）
+        fmt: 'text'（"風格-圖像-尺寸|Z碼"）或 'png'（Z碼圖）
+    
+    返回:
+        bytes: 輸出內容
+    """
+    if fmt == 'png':
+        z_img, _ = z_to_image_with_header(z_bits, style_num, img_num, img_size, fast_decode)
+        buf = BytesIO()
+        z_img.save(buf, format='PNG')
+        return buf.getvalue()
+    return (z_to_text_with_header(z_bits, style_num, img_num, img_size, fast_decode) + '\n').encode('utf-8')
+
+def decode_z_code(data):
+    """
+    功能:
+        解析 Z 碼（Z碼圖、QR Code 圖片、含 header 文字或純 0/1 文字）
+    
+    參數:
+        data: bytes
+    
+    返回:
+        z_bits: Z 碼位元列表
+        header: (style_num, img_num, img_size, fast_decode)，純 0/1 文字則為 None
+    """
+    try:
+        image = Image.open(BytesIO(data))
+        image.load()
+    except Exception:
+        image = None
+    
+    if image is not None:
+        # 先試 QR Code（需要 pyzbar），再試 Z碼圖
+        try:
+            from pyzbar.pyzbar import decode as decode_qr
+            decoded = decode_qr(image)
+            if decoded:
+                z_bits, *header = text_to_z_with_header(decoded[0].data.decode('utf-8'))
+                return z_bits, tuple(header)
+        except ImportError:
+            pass
+        z_bits, *header = image_to_z_with_header(image)
+        return z_bits, tuple(header)
+    
+    text = data.decode('utf-8').strip()
+    if '|' in text:
+        z_bits, *header = text_to_z_with_header(text)
+        return z_bits, tuple(header)
+    return text_to_z(''.join(c for c in text if c in '01')), None
+
+def embed(cover_source, secret, secret_type='text', contact_key=None, fmt=None, backend=None, image_codec=None, quality=None,
+          text_codec=None, autofit=False, key_tag=None, progressive=None):
+    """
+    功能:
+        嵌入機密並輸出 Z 碼（函式庫 API）
+    
+    參數:
+        cover_source: 本機圖片路徑或圖片庫代號
+        secret: 機密內容（字串或 PIL Image）
+        secret_type: 'text' 或 'image'
+        contact_key: 對象專屬密鑰
+        fmt: 'text' 或 'png'（預設文字機密輸出文字、圖像機密輸出 PNG）
+        backend: 運算後端名稱（見 backends.py）
+        image_codec: 圖像機密的編碼方式（'raw'、'png'、'webp'、'jpeg'，見 embed_secret）
+        quality: 有損壓縮品質 1~100
+        text_codec: 文字機密的編碼方式（'raw'、'auto'、'deflate'、'utf16'、'cjk'，見 text_codecs.py）
+        autofit: 圖像機密放不下時自動縮小 / 降低品質（見 autofit.fit_image_secret）
+        key_tag: 是否加上密鑰檢查碼（提取時選錯密鑰可立即判斷）
+        progressive: 逐像素圖像是否用漸進式順序（提取一小段就能預覽整張圖）
+    
+    返回:
+        output: Z 碼內容（bytes）
+        info: 嵌入資訊（自動縮放時含 'autofit'）
+    """
+    fast = FAST_COVER_DECODE  # 圖片庫載體的解碼方式記在 header，提取端依 header 解碼
+    cover = load_cover(cover_source, fast=fast)
+    fit_info = None
+    if autofit and secret_type == 'image':
+        secret, fit_info = fit_image_secret(secret, budget_bits=calculate_capacity(cover.shape[1], cover.shape[0]),
+                                            image_codec=image_codec, quality=quality, key_tag=key_tag,
+                                            progressive=progressive)
+        quality = fit_info['quality']
+    z_bits, capacity, info = embed_secret(cover, secret, secret_type=secret_type, contact_key=contact_key, backend=backend,
+                                          image_codec=image_codec, quality=quality, text_codec=text_codec, key_tag=key_tag,
+                                          progressive=progressive)
+    fmt = fmt or ('text' if secret_type == 'text' else 'png')
+    output = encode_z_code(z_bits, *cover_header(cover_source, cover, fast), fmt=fmt)
+    info = dict(info, capacity=capacity, z_bits=len(z_bits))
+    if fit_info is not None:
+        info['autofit'] = fit_info
+    return output, info
+
+def extract(z_data, contact_key=None, cover_source=None, backend=None, contacts=None):
+    """
+    功能:
+        從 Z 碼提取機密（函式庫 API）
+    
+    參數:
+        z_data: Z 碼內容（bytes）
+        contact_key: 對象專屬密鑰
+        cover_source: 載體來源（None 表示依 Z 碼 header 從圖片庫載入）
+        backend: 運算後端名稱（見 backends.py）
+        contacts: {對象名稱: 密鑰}，指定時自動偵測收件對象（忽略 contact_key，見 extract.identify_contact）
+    
+    返回:
+        secret: 機密內容（字串或 PIL Image）
+        secret_type: 'text' 或 'image'
+        info: 提取資訊（自動偵測時含 'contact'）
+    """
+    z_bits, header = decode_z_code(z_data)
+    if not z_bits:
+        raise ValueError("Z 碼是空的")
+    
+    if cover_source is None:
+        if header is None or header[0] == 0:
+            raise ValueError("Z 碼沒有圖片庫資訊，請用 --cover 指定載體")
+        cover_source = '-'.join(str(v) for v in header[:3])
+    
+    cover = load_cover(cover_source, size=header[2] if header and header[2] else None, fast=header[3] if header else None)
+    if contacts is None:
+        return detect_and_extract(cover, z_bits, contact_key=contact_key, backend=backend)
+    
+    name, detection = identify_contact(cover, z_bits, contacts)
+    if name is None:
+        if len(detection['candidates']) > 1:
+            raise ValueError(f"無法判斷對象（{', '.join(detection['candidates'])} 都有可能），請用 --key 指定")
+        raise ValueError("沒有對象符合這個 Z 碼")
+    secret, secret_type, info = detect_and_extract(cover, z_bits, contact_key=contacts[name], backend=backend)
+    return secret, secret_type, dict(info, contact=name)
+
+# ==================== 命令列 ====================
+def expand_inputs(patterns):
+    """
+    功能:
+        展開檔案 glob（'-' 表示 stdin）
+    
+    參數:
+        patterns: 檔名或 glob 列表
+    
+    返回:
+        list: 檔名列表（保持順序、不重複）
+    """
+    paths = []
+    for pattern in patterns:
+        matches = [pattern] if pattern == '-' else sorted(glob.glob(pattern)) or [pattern]
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+def read_input(path):
+    """讀取檔案內容（'-' 表示 stdin）"""
+    if path == '-':
+        return sys.stdin.buffer.read()
+    with open(path, 'rb') as f:
+        return f.read()
+
+def write_output(data, path):
+    """寫出內容（None 或 '-' 表示 stdout）"""
+    if path in (None, '-'):
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+    else:
+        with open(path, 'wb') as f:
+            f.write(data)
+
+def output_path_for(input_path, output, output_dir, suffix):
+    """
+    功能:
+        決定批次處理中單一輸入的輸出路徑
+    
+    參數:
+        input_path: 輸入檔名
+        output: --output（單一輸入時使用）
+        output_dir: --output-dir（批次時使用）
+        suffix: 輸出副檔名（例如 '.png'）
+    
+    返回:
+        str: 輸出路徑，None 表示 stdout
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        name = 'stdin' if input_path == '-' else os.path.splitext(os.path.basename(input_path))[0]
+        return os.path.join(output_dir, name + suffix)
+    return output
+
+def resolve_key(args):
+    """取得對象密鑰（--key 或 --key-env 指定的環境變數）"""
+    if args.key:
+        return args.key
+    if args.key_env:
+        return os.environ.get(args.key_env)
+    return None
+
+def cmd_embed(args):
+    contact_key = resolve_key(args)
+    
+    if args.text is not None:
+        jobs = [('-', args.text, 'text')]
+    elif args.text_file:
+        jobs = [(path, read_input(path).decode('utf-8').rstrip('\n'), 'text') for path in expand_inputs(args.text_file)]
+    else:
+        jobs = [(path, Image.open(BytesIO(read_input(path))), 'image') for path in expand_inputs(args.image)]
+    
+    if len(jobs) > 1 and not args.output_dir:
+        raise SystemExit("批次處理多個檔案時請用 --output-dir")
+    
+    for path, secret, secret_type in jobs:
+        fmt = args.format or ('text' if secret_type == 'text' else 'png')
+        output, info = embed(args.cover, secret, secret_type=secret_type, contact_key=contact_key, fmt=fmt, backend=args.backend,
+                             image_codec=args.image_codec, quality=args.quality, text_codec=args.text_codec,
+                             autofit=args.autofit, key_tag=args.key_tag, progressive=args.progressive)
+        suffix = '.png' if fmt == 'png' else '.txt'
+        target = output_path_for(path, args.output, args.output_dir, suffix)
+        if fmt == 'png' and target is None and sys.stdout.isatty():
+            raise SystemExit("PNG 輸出請用 --output 或 --output-dir 指定檔案")
+        write_output(output, target)
+        if info.get('autofit', {}).get('changed'):
+            fit = info['autofit']
+            print(f"{path}: 自動縮放為 {fit['size'][0]}×{fit['size'][1]}"
+                  + (f"、品質 {fit['quality']}" if fit['quality'] is not None else '')
+                  + ('、256 色' if fit['quantized'] else ''), file=sys.stderr)
+        if target:
+            print(f"{path} → {target}（{info['z_bits']:,} bits）", file=sys.stderr)
+    return 0
+
+def load_contact_keys(path):
+    """讀取對象檔（contacts.json 格式：{名稱: {"key": 密鑰, ...}} 或 {名稱: 密鑰}）→ {名稱: 密鑰}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {name: value.get('key') if isinstance(value, dict) else value for name, value in data.items()}
+
+def cmd_extract(args):
+    contact_key = resolve_key(args)
+    contacts = load_contact_keys(args.contacts) if args.contacts else None
+    paths = expand_inputs(args.z)
+    
+    for path in paths:
+        secret, secret_type, info = extract(read_input(path), contact_key=contact_key, cover_source=args.cover, backend=args.backend,
+                                            contacts=contacts)
+        if 'contact' in info:
+            print(f"{path}: 對象 {info['contact']}", file=sys.stderr)
+        if secret_type == 'text':
+            target = output_path_for(path, args.output, args.output_dir, '.txt')
+            write_output((secret + '\n').encode('utf-8'), target)
+        else:
+            target = output_path_for(path, args.output, args.output_dir, '.png')
+            if target is None:
+                raise SystemExit("圖像機密請用 --output 或 --output-dir 指定輸出檔案")
+            buf = BytesIO()
+            secret.save(buf, format='PNG')
+            write_output(buf.getvalue(), target)
+            print(f"{path} → {target}（{secret.size[0]}×{secret.size[1]}）", file=sys.stderr)
+    return 0
+
+def cmd_bench(args, extra):
+    from benchmarks.run_benchmarks import main as bench_main
+    return bench_main(extra)
+
+def cmd_conformance(args, extra):
+    from conformance.run_conformance import main as conformance_main
+    return conformance_main(extra)
+
+def cmd_calibrate(args):
+    from engine import calibrate
+    calibrate(args.output, repeat=args.repeat, max_blocks=args.max_blocks)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='ecihmsb', description="E-CIHMSB 無載體機密編碼（命令列版）")
+    sub = parser.add_subparsers(dest='command', required=True)
+    
+    p_embed = sub.add_parser('embed', help="嵌入機密，輸出 Z 碼")
+    p_embed.add_argument('--cover', required=True, help="載體：本機圖片路徑或圖片庫代號「風格編號-圖像編號-尺寸」")
+    secret_group = p_embed.add_mutually_exclusive_group(required=True)
+    secret_group.add_argument('--text', help="機密文字")
+    secret_group.add_argument('--text-file', nargs='+', help="機密文字檔（可用 glob，'-' 表示 stdin）")
+    secret_group.add_argument('--image', nargs='+', help="機密圖像檔（可用 glob）")
+    p_embed.add_argument('--format', choices=['text', 'png'], help="Z 碼輸出格式（預設文字機密=text、圖像機密=png）")
+    p_embed.add_argument('--image-codec', choices=available_image_codecs(), help="圖像機密編碼（raw=逐像素；png/webp 無損壓縮；jpeg 有損）")
+    p_embed.add_argument('--quality', type=int, help="有損壓縮品質 1~100（webp 指定時改為有損）")
+    p_embed.add_argument('--autofit', action='store_true', help="圖像機密放不下時自動縮小尺寸 / 降低品質 / 減色")
+    p_embed.add_argument('--key-tag', action='store_true', default=None, help="加上密鑰檢查碼（提取時選錯密鑰立即失敗，多 80 bits）")
+    p_embed.add_argument('--progressive', action='store_true', default=None,
+                         help="逐像素圖像用漸進式（Adam7）順序，提取開頭幾 %% 就能預覽整張圖（沒加檢查碼時多 64 bits）")
+    p_embed.add_argument('--text-codec', choices=available_text_codecs(), help="文字機密編碼（raw=UTF-8；deflate=預設字典壓縮；utf16、cjk=中文每字 2 bytes；auto=取最短）")
+    
+    p_extract = sub.add_parser('extract', help="由 Z 碼提取機密")
+    p_extract.add_argument('--z', nargs='+', required=True, help="Z 碼檔（Z碼圖、QR Code 或文字；可用 glob，'-' 表示 stdin）")
+    p_extract.add_argument('--cover', help="載體（預設依 Z 碼 header 從圖片庫載入）")
+    p_extract.add_argument('--contacts', help="對象檔（contacts.json），自動偵測收件對象")
+    
+    for p in (p_embed, p_extract):
+        p.add_argument('--key', help="對象專屬密鑰")
+        p.add_argument('--key-env', help="從此環境變數讀取對象密鑰")
+        p.add_argument('--output', help="輸出檔案（預設 stdout）")
+        p.add_argument('--output-dir', help="批次輸出資料夾")
+        p.add_argument('--backend', help="運算後端（auto、numpy、numba、reference…，預設依 ECIHMSB_BACKEND）")
+    
+    sub.add_parser('bench', help="執行效能測試（其餘參數同 benchmarks/run_benchmarks.py）")
+    sub.add_parser('conformance', help="驗證各運算後端與 reference 一致（其餘參數同 conformance/run_conformance.py）")
+    
+    p_calibrate = sub.add_parser('calibrate', help="量測並寫入區塊運算引擎的 scalar/vector 切換點（安裝後執行一次）")
+    p_calibrate.add_argument('--output', help="校準檔路徑（預設 ~/.cache/ecihmsb/engine_calibration.json）")
+    p_calibrate.add_argument('--repeat', type=int, default=5)
+    p_calibrate.add_argument('--max-blocks', type=int, default=4096)
+    
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if args.command == 'bench':
+        return cmd_bench(args, extra)  # 其餘參數交給效能測試
+    if args.command == 'conformance':
+        return cmd_conformance(args, extra)
+    if extra:
+        parser.error(f"無法識別的參數：{' '.join(extra)}")
+    
+    commands = {'embed': cmd_embed, 'extract': cmd_extract, 'calibrate': cmd_calibrate}
+    try:
+        return commands[args.command](args)
+    except ValueError as e:
+        print(f"錯誤：{e}", file=sys.stderr)
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
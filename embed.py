@@ -1,14 +1,21 @@
 # 建立 embed.py → 嵌入模組
 # 將機密內容嵌入載體圖像，產生 Z 碼
 
+import math
 import numpy as np
 
-from config import Q_LENGTH, TOTAL_AVERAGES_PER_UNIT, BLOCK_SIZE, IMAGE_HEADER_SIZE
-from permutation import generate_Q_from_block, apply_Q_three_rounds
-from image_processing import convert_to_grayscale, validate_image_size, calculate_hierarchical_averages 
-from binary_operations import get_msbs
-from mapping import map_to_z
-from secret_encoding import text_to_binary, image_to_binary, xor_cipher
+from config import TOTAL_AVERAGES_PER_UNIT, BLOCK_SIZE, IMAGE_HEADER_SIZE
+from config import TYPE_MARKER_SIZE, AVAILABLE_SIZES, Z_IMAGE_HEADER_SIZE, QR_MAX_DATA_BITS
+from config import DEFAULT_IMAGE_CODEC, DEFAULT_KEY_TAG, EXTENDED_HEADER_SIZE, KEY_TAG_SIZE, PAYLOAD_FLAG_KEY_TAG
+from config import PAYLOAD_FLAG_SEEKABLE, PAYLOAD_FLAG_PROGRESSIVE, DEFAULT_PROGRESSIVE, KEY_CHECK_BLOCKS
+from config import PAYLOAD_TYPE_TEXT, PAYLOAD_TYPE_IMAGE_RAW, PAYLOAD_TYPE_IMAGE_FILE
+from image_processing import convert_to_grayscale, validate_image_size
+from backends import get_backend
+from secret_encoding import image_to_binary, xor_cipher, calculate_text_bits, calculate_image_bits
+from secret_encoding import encode_image_file, calculate_image_file_bits, build_payload_header, bytes_to_bits
+from secret_encoding import compute_key_tag
+from text_codecs import encode_text_payload, text_codec_name
+from profiling import stage
 
 # 載體容量計算
 def calculate_capacity(image_width, image_height):
@@ -31,8 +38,143 @@ def calculate_capacity(image_width, image_height):
     
     return capacity
 
+# 嵌入規劃（不實際編碼）
+def find_min_cover_size(required_bits):
+    """
+    功能:
+        找出容量足夠的最小載體尺寸
+    
+    參數:
+        required_bits: 所需位元數（含類型標記）
+    
+    返回:
+        size: AVAILABLE_SIZES 中最小的足夠尺寸，若都不夠則返回 None
+    """
+    for size in AVAILABLE_SIZES:
+        if calculate_capacity(size, size) >= required_bits:
+            return size
+    return None
+
+def estimate_z_image_size(z_length):
+    """
+    功能:
+        預估 z_to_image_with_header 產生的 Z碼圖尺寸
+    
+    參數:
+        z_length: Z 碼位元數
+    
+    返回:
+        (width, height): Z碼圖尺寸
+    """
+    num_pixels = math.ceil((Z_IMAGE_HEADER_SIZE + z_length) / 8)
+    width = int(math.sqrt(num_pixels))
+    height = math.ceil(num_pixels / width)
+    return width, height
+
+def estimate_qr_fits(z_length, header_length=16):
+    """
+    功能:
+        預估文字 Z 碼能否放進單一 QR Code
+    
+    參數:
+        z_length: Z 碼位元數
+        header_length: QR 內容前綴長度（例如 "1-3-512|"），預設取上限 16 字元
+    
+    返回:
+        bool: True 表示可用 QR Code
+    
+    原理:
+        QR 內容 = 前綴（byte 模式，每字元 8 bits）+ Z 碼（只有 0/1，numeric 模式，每 3 位數 10 bits）
+        每段另加 mode 4 bits + 長度欄位（byte 16 bits、numeric 14 bits）
+    """
+    prefix_bits = 4 + 16 + header_length * 8
+    digits_bits = 4 + 14 + math.ceil(z_length * 10 / 3)
+    return prefix_bits + digits_bits <= QR_MAX_DATA_BITS
+
+def header_overhead(secret_type, image_codec, key_tag, progressive=False):
+    """
+    擴充 header 多出的位元數
+    壓縮圖像本來就有擴充 header，只多檢查碼；
+    文字、逐像素圖像加檢查碼（或逐像素圖像用漸進式順序）時改用擴充 header
+    """
+    tag_bits = KEY_TAG_SIZE if key_tag else 0
+    if secret_type == 'image' and image_codec != 'raw':
+        return tag_bits
+    if key_tag or (progressive and secret_type == 'image'):
+        return EXTENDED_HEADER_SIZE + tag_bits
+    return 0
+
+def plan_embedding(secret, secret_type='text', image_codec=None, quality=None, text_codec=None, key_tag=None,
+                   progressive=None, exact=True):
+    """
+    功能:
+        規劃嵌入，不產生位元列表
+        文字、逐像素圖像只讀 header 資訊（O(1)）；壓縮圖像見 exact
+    
+    參數:
+        secret: 機密內容（字串或 PIL Image）
+        secret_type: 'text' 或 'image'
+        image_codec: 圖像機密的編碼方式（見 embed_secret），None 表示 config.DEFAULT_IMAGE_CODEC
+        quality: 有損壓縮品質
+        text_codec: 文字機密的編碼方式（見 text_codecs.py），None 表示 config.DEFAULT_TEXT_CODEC
+        key_tag: 是否加上密鑰檢查碼，None 表示 config.DEFAULT_KEY_TAG
+        progressive: 逐像素圖像是否用漸進式順序，None 表示 config.DEFAULT_PROGRESSIVE
+        exact: 壓縮圖像機密（image_codec 不是 'raw'）的算法
+            - True: 實際壓縮一次，required_bits 是準確值（耗時與圖像大小成正比，不是 O(1)）
+            - False: 不壓縮，以逐像素大小估計（壓縮後通常更小，但不保證，只能當估計值）
+    
+    返回:
+        plan: 規劃結果
+            - required_bits: 所需位元數（含類型標記；exact 為 True 時等於 Z 碼長度）
+            - exact: required_bits 是否為準確值（只有 exact=False 的壓縮圖像是估計值）
+            - min_size: 容量足夠的最小載體尺寸（都不夠則為 None）
+            - num_blocks: 需要用到的 8×8 區塊數
+            - z_format: 預期的 Z碼圖格式（'qr' 或 'image'）
+            - z_image_size: 使用圖像 Z碼時的尺寸 (width, height)
+    
+    用途:
+        在下載載體、編碼機密之前，先判斷是否放得下、該用哪個尺寸
+    
+    註:
+        壓縮圖像機密需要實際壓縮一次才知道準確大小，服務端的 /capacity 會把這類請求交給 worker
+    """
+    image_codec = image_codec or DEFAULT_IMAGE_CODEC
+    key_tag = DEFAULT_KEY_TAG if key_tag is None else key_tag
+    progressive = DEFAULT_PROGRESSIVE if progressive is None else progressive
+    if secret_type == 'text':
+        content_bits = calculate_text_bits(secret, text_codec)
+    elif image_codec == 'raw':
+        content_bits = calculate_image_bits(secret)
+    elif not exact:
+        # 不壓縮：圖檔大小以像素資料的大小估計（擴充 header + 每像素 1/3/4 bytes）
+        content_bits = EXTENDED_HEADER_SIZE + calculate_image_bits(secret) - IMAGE_HEADER_SIZE
+    else:
+        content_bits = calculate_image_file_bits(encode_image_file(secret, image_codec, quality))
+    estimated = secret_type == 'image' and image_codec != 'raw' and not exact
+    
+    required_bits = TYPE_MARKER_SIZE + content_bits + header_overhead(secret_type, image_codec, key_tag, progressive)
+    num_blocks = math.ceil(required_bits / TOTAL_AVERAGES_PER_UNIT)
+    
+    # 文字優先用 QR Code，放不下（或是圖像）則用 Z碼圖
+    if secret_type == 'text' and estimate_qr_fits(required_bits):
+        z_format = 'qr'
+    else:
+        z_format = 'image'
+    
+    plan = {
+        'type': secret_type,
+        'required_bits': required_bits,
+        'exact': not estimated,
+        'min_size': find_min_cover_size(required_bits),
+        'num_blocks': num_blocks,
+        'z_format': z_format,
+        'z_image_size': estimate_z_image_size(required_bits)
+    }
+    return plan
+
 # 嵌入
-def embed_secret(cover_image, secret, secret_type='text', contact_key=None):
+def embed_secret(cover_image, secret, secret_type='text', contact_key=None, backend=None, image_codec=None, quality=None,
+                 text_codec=None, key_tag=None, progressive=None, rounding=None):
     """
     功能:
         將機密內容嵌入載體圖像，產生 Z 碼
@@ -42,6 +184,21 @@ def embed_secret(cover_image, secret, secret_type='text', contact_key=None):
         secret: 機密內容（字串或 PIL Image）
         secret_type: 'text' 或 'image'
         contact_key: 對象專屬密鑰（字串），用於加密
+        backend: 運算後端名稱（見 backends.py，None 表示依環境變數 / 設定值）
+        image_codec: 圖像機密的編碼方式，None 表示 config.DEFAULT_IMAGE_CODEC
+            - 'raw': 逐像素（舊版格式，8/24/32 bits 每像素）
+            - 'png'、'webp': 無損壓縮的圖檔 bytes（webp 指定 quality 時為有損）
+            - 'jpeg': 有損壓縮的圖檔 bytes
+        quality: 有損壓縮品質 1~100
+        text_codec: 文字機密的編碼方式，None 表示 config.DEFAULT_TEXT_CODEC
+            - 'raw': UTF-8（舊版格式）
+            - 'deflate': 預設字典壓縮（沒有比 UTF-8 短時仍用 UTF-8）
+            - 'utf16'、'cjk': 中文每字 2 bytes（沒有比 UTF-8 短時仍用 UTF-8）
+            - 'auto': 所有編碼取最短
+        key_tag: 是否加上密鑰檢查碼（提取時選錯對象可立即判斷；前 KEY_CHECK_BLOCKS 個區塊不用密鑰），None 表示 config.DEFAULT_KEY_TAG
+        progressive: 逐像素圖像的像素改用漸進式順序（提取一小段就能預覽整張圖），None 表示 config.DEFAULT_PROGRESSIVE
+        rounding: 彩色載體轉灰階的方式（'legacy' 或 'pil'，見 image_processing.convert_to_grayscale），
+                  提取時必須和嵌入時相同；None 表示 config.GRAYSCALE_ROUNDING（灰階載體不受影響）
     
     返回:
         z_bits: Z 碼位元列表
@@ -57,10 +214,21 @@ def embed_secret(cover_image, secret, secret_type='text', contact_key=None):
     格式:
         [1 bit 類型標記] + [機密內容]
         類型標記: 0 = 文字, 1 = 圖像
+        壓縮圖像: [1] + [擴充 header 64 bits] + [圖檔 bytes]（見 secret_encoding.build_payload_header）
+        密鑰檢查碼: [1] + [擴充 header 64 bits] + [檢查碼 16 bits] + [內容]（文字、逐像素圖像也改用擴充 header）
+        擴充 header 的內容用計數器模式的密鑰流加密（旗標 PAYLOAD_FLAG_SEEKABLE）
+        漸進式圖像: [1] + [擴充 header 64 bits]（+ 檢查碼）+ [34 bits header + Adam7 順序的像素]
+                    （旗標 PAYLOAD_FLAG_PROGRESSIVE）
     """
     # 步驟 1：圖像預處理
-    cover_image = convert_to_grayscale(cover_image)
+    with stage('grayscale') as counters:
+        cover_image = convert_to_grayscale(cover_image, rounding)
+        counters['bytes'] = cover_image.nbytes
     height, width = validate_image_size(cover_image)
+    key_tag = DEFAULT_KEY_TAG if key_tag is None else key_tag
+    image_codec = image_codec or DEFAULT_IMAGE_CODEC
+    progressive = DEFAULT_PROGRESSIVE if progressive is None else progressive
+    progressive = bool(progressive) and secret_type == 'image' and image_codec == 'raw'  # 只用於逐像素圖像
     
     # 步驟 2：計算容量並檢查
     # 例如 512×512 的圖像：
@@ -73,15 +241,56 @@ def embed_secret(cover_image, secret, secret_type='text', contact_key=None):
     num_units = num_rows * num_cols                 # 總共幾個區塊
     capacity = num_units * TOTAL_AVERAGES_PER_UNIT  # 每區塊 21 bits
     
-    # 將機密內容轉成二進位（加入類型標記）
-    if secret_type == 'text':
-        type_marker = [0]                      # 0 = 文字
-        content_bits = text_to_binary(secret)  # "Hi" → [0,1,0,0,1,0,0,0,...]
-        info = {'type': 'text', 'length': len(secret), 'bits': len(content_bits) + 1}
+    # 先用 header 預估所需位元數，太大就直接拒絕（不必先編碼整個機密）
+    # 壓縮圖像需要先壓縮才知道大小，壓縮結果直接用於下面的編碼
+    file_data = None
+    if secret_type == 'image' and image_codec != 'raw':
+        with stage('compress') as counters:
+            file_data = encode_image_file(secret, image_codec, quality)
+            counters['bytes'] = len(file_data)
+        required_bits = TYPE_MARKER_SIZE + calculate_image_file_bits(file_data) + header_overhead(secret_type, image_codec, key_tag)
     else:
-        type_marker = [1]                                   # 1 = 圖像
-        content_bits, size, mode = image_to_binary(secret)  # PIL Image → 二進位
-        info = {'type': 'image', 'size': size, 'mode': mode, 'bits': len(content_bits) + 1}
+        required_bits = plan_embedding(secret, secret_type, text_codec=text_codec, key_tag=key_tag,
+                                       progressive=progressive)['required_bits']
+    if required_bits > capacity:
+        raise ValueError(
+            f"機密內容太大！需要 {required_bits} bits，但容量只有 {capacity} bits"
+        )
+    
+    # 將機密內容轉成二進位（加入類型標記）
+    with stage('encode') as counters:
+        if secret_type == 'text':
+            type_marker = [0]                      # 0 = 文字
+            payload = encode_text_payload(secret, text_codec)      # 文字 → bytes（可能經過壓縮）
+            content_bits = bytes_to_bits(payload)                   # "Hi" → [0,1,0,0,1,0,0,0,...]
+            payload_type = PAYLOAD_TYPE_TEXT
+            info = {'type': 'text', 'length': len(secret), 'codec': text_codec_name(payload), 'bits': len(content_bits) + 1}
+        elif file_data is not None:
+            type_marker = [1]                                   # 1 = 圖像（接擴充 header）
+            content_bits = bytes_to_bits(file_data)             # 圖檔 bytes → 二進位
+            payload_type = PAYLOAD_TYPE_IMAGE_FILE
+            info = {'type': 'image', 'size': secret.size, 'mode': secret.mode, 'codec': image_codec,
+                    'file_bytes': len(file_data), 'bits': EXTENDED_HEADER_SIZE + len(content_bits) + 1}
+        else:
+            type_marker = [1]                                   # 1 = 圖像
+            content_bits, size, mode = image_to_binary(secret, progressive)  # PIL Image → 二進位
+            payload_type = PAYLOAD_TYPE_IMAGE_RAW
+            info = {'type': 'image', 'size': size, 'mode': mode, 'bits': len(content_bits) + 1}
+        
+        # 擴充 header（壓縮圖像一定有；加密鑰檢查碼、漸進式圖像也改用擴充 header）
+        payload_header = None
+        if file_data is not None or key_tag or progressive:
+            type_marker = [1]
+            flags = PAYLOAD_FLAG_SEEKABLE | (PAYLOAD_FLAG_KEY_TAG if key_tag else 0)
+            flags |= PAYLOAD_FLAG_PROGRESSIVE if progressive else 0
+            payload_header = build_payload_header(payload_type, len(content_bits), flags=flags)
+            if key_tag:
+                payload_header = payload_header + compute_key_tag(contact_key, type_marker + payload_header)
+            info['bits'] = 1 + len(payload_header) + len(content_bits)
+        info['key_tag'] = bool(key_tag)
+        if secret_type == 'image':
+            info['progressive'] = progressive
+        counters['bits'] = info['bits']
     
     # 組合完整的 secret_bits
     # 例如文字 "H": [0] + [0,1,0,0,1,0,0,0] = [0,0,1,0,0,1,0,0,0]
@@ -89,91 +298,59 @@ def embed_secret(cover_image, secret, secret_type='text', contact_key=None):
     secret_bits = type_marker + content_bits
     
     # 檢查容量是否足夠
-    if len(secret_bits) > capacity:
+    if info['bits'] > capacity:
         raise ValueError(
-            f"機密內容太大！需要 {len(secret_bits)} bits，但容量只有 {capacity} bits"
+            f"機密內容太大！需要 {info['bits']} bits，但容量只有 {capacity} bits"
         )
     
     # 步驟 3：XOR 加密
     # type_marker 不加密（確保類型判斷正確）
     # 圖像的 header (34 bits) 也不加密（確保尺寸正確）
-    if secret_type == 'image' and len(content_bits) > IMAGE_HEADER_SIZE:
-        # 圖像加密結構：
-        # [type_marker 1 bit] + [header 34 bits] + XOR([像素資料])
-        #      不加密              不加密              加密
-        image_header = content_bits[:IMAGE_HEADER_SIZE]   # 寬、高、色彩模式
-        pixel_data = content_bits[IMAGE_HEADER_SIZE:]     # 像素資料
-        encrypted_pixels = xor_cipher(pixel_data, contact_key)
-        encrypted_bits = type_marker + image_header + encrypted_pixels
-    else:
-        # 文字加密結構：
-        # [type_marker 1 bit] + XOR([content_bits])
-        #      不加密                  加密
-        encrypted_content = xor_cipher(content_bits, contact_key)
-        encrypted_bits = type_marker + encrypted_content
-    
-    # 步驟 4：對每個 8×8 區塊進行嵌入
-    # 遍歷每個區塊，產生 Z 碼
-    # 載體圖像分割示意（以 16×16 為例）：
+    with stage('xor', bits=len(content_bits)):
+        if payload_header is not None:
+            # 擴充 header 加密結構：
+            # [type_marker 1 bit] + [擴充 header 64 bits（+ 檢查碼 16 bits）] + XOR([內容])
+            #      不加密                        不加密                            加密（計數器模式密鑰流）
+            encrypted_bits = type_marker + payload_header + xor_cipher(content_bits, contact_key, counter=True)
+        elif secret_type == 'image' and len(content_bits) > IMAGE_HEADER_SIZE:
+            # 圖像加密結構：
+            # [type_marker 1 bit] + [header 34 bits] + XOR([像素資料])
+            #      不加密              不加密              加密
+            image_header = content_bits[:IMAGE_HEADER_SIZE]   # 寬、高、色彩模式
+            pixel_data = content_bits[IMAGE_HEADER_SIZE:]     # 像素資料
+            encrypted_pixels = xor_cipher(pixel_data, contact_key)
+            encrypted_bits = type_marker + image_header + encrypted_pixels
+        else:
+            # 文字加密結構：
+            # [type_marker 1 bit] + XOR([content_bits])
+            #      不加密                  加密
+            encrypted_content = xor_cipher(content_bits, contact_key)
+            encrypted_bits = type_marker + encrypted_content
+    
+    # 步驟 4：對用到的 8×8 區塊進行嵌入
+    # 載體圖像分割示意（以 16×16 為例），依列優先順序使用區塊：
     # ┌────┬────┐
     # │ 0,0│ 0,1│  每格是 8×8 區塊
     # ├────┼────┤
     # │ 1,0│ 1,1│
     # └────┴────┘
-    z_bits = []
-    secret_bit_index = 0
-    finished = False
-    
-    for i in range(num_rows):      # i = 第幾列區塊
-        if finished:
-            break
-        
-        for j in range(num_cols):  # j = 第幾行區塊
-            if secret_bit_index >= len(encrypted_bits):
-                finished = True
-                break
-            
-            # 提取這個 8×8 區塊
-            # 例如 i=1, j=2 時：
-            # start_row = 1 × 8 = 8
-            # end_row = 8 + 8 = 16
-            # start_col = 2 × 8 = 16
-            # end_col = 16 + 8 = 24
-            # block = cover_image[8:16, 16:24]
-            start_row = i * BLOCK_SIZE
-            end_row = start_row + BLOCK_SIZE
-            start_col = j * BLOCK_SIZE
-            end_col = start_col + BLOCK_SIZE
-            block = cover_image[start_row:end_row, start_col:end_col]
-            
-            # 生成這個區塊專屬的排列密鑰 Q
-            # 每個區塊的 Q 都不同（基於區塊內容 + contact_key）
-            Q = generate_Q_from_block(block, Q_LENGTH, contact_key=contact_key)
-            
-            # 計算 21 個多層次平均值
-            # 第一層: 16 個 (2×2 區塊)
-            # 第二層: 4 個 (4×4 區塊)
-            # 第三層: 1 個 (8×8 整塊)
-            averages_21 = calculate_hierarchical_averages(block)
-            
-            # 用 Q 重新排列 21 個平均值（分 3 輪，每輪 7 個）
-            reordered_averages = apply_Q_three_rounds(averages_21, Q)
-            
-            # 提取排列後的 21 個 MSB (最高有效位元）
-            # 例如 156 = 10011100，MSB = 1
-            msbs = get_msbs(reordered_averages)
-            
-            # 映射產生 Z 碼
-            # 對這個區塊的 21 個位置，逐一產生 Z
-            for k in range(TOTAL_AVERAGES_PER_UNIT):  # k = 0~20
-                if secret_bit_index >= len(encrypted_bits):
-                    finished = True
-                    break
-                
-                secret_bit = encrypted_bits[secret_bit_index]  # 要嵌入的 bit
-                msb = msbs[k]                                  # 對應的 MSB
-                z_bit = map_to_z(secret_bit, msb)              # (M, MSB) → Z
-                z_bits.append(z_bit)
-                secret_bit_index += 1
+    # 每個區塊：Q（第一行像素排序 + contact_key）→ 21 個多層次平均值 → 用 Q 排列 → 21 個 MSB
+    # 所有區塊的 MSB 接起來即為 MSB 平面，再與加密後的位元逐一映射 (M, MSB) → Z
+    # 實際運算由後端負責（reference / numpy / numba，見 backends.py）
+    num_blocks = math.ceil(len(encrypted_bits) / TOTAL_AVERAGES_PER_UNIT)
+    with stage('blocks') as counters:
+        backend = get_backend(backend)
+        # 有密鑰檢查碼時，前 KEY_CHECK_BLOCKS 個區塊不用密鑰（見 config.KEY_CHECK_BLOCKS），其餘區塊照常
+        head_blocks = min(num_blocks, KEY_CHECK_BLOCKS) if key_tag else 0
+        z_bits = []
+        if head_blocks:
+            plane = backend.msb_plane(cover_image, head_blocks, None)
+            z_bits = backend.xor_plane(encrypted_bits[:head_blocks * TOTAL_AVERAGES_PER_UNIT], plane)
+        if num_blocks > head_blocks:
+            plane = backend.msb_plane(cover_image, num_blocks - head_blocks, contact_key, first_block=head_blocks)
+            z_bits = z_bits + backend.xor_plane(encrypted_bits[head_blocks * TOTAL_AVERAGES_PER_UNIT:], plane)
+        counters['blocks'] = num_blocks
+        counters['bits'] = len(z_bits)
+        counters['backend'] = backend.name
     
     return z_bits, capacity, info
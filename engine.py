@@ -0,0 +1,416 @@
+# 建立 engine.py → 區塊運算引擎模組
+# 一次算出多個 8×8 區塊排列後的 MSB（MSB 平面），並依區塊數自動選擇實作
+#
+# 三種實作（結果逐位元相同）:
+#   reference: 原本的逐區塊流程（generate_Q_from_block → 平均值 → apply_Q_three_rounds → get_msbs）
+#   scalar:    純 Python 整數運算，Q 只呼叫一次 argsort（適合短訊息，幾個區塊）
+#   vector:    整張陣列一次運算（適合大圖像機密，上千個區塊）
+#
+# 校準切換點（安裝後執行一次）:
+#   python engine.py calibrate
+#   python ecihmsb.py calibrate
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+import functools
+
+import numpy as np
+
+from config import Q_LENGTH, BLOCK_SIZE, TOTAL_AVERAGES_PER_UNIT, DEFAULT_ENGINE, ENGINE_CROSSOVER_BLOCKS
+from permutation import generate_Q_from_block, apply_Q_three_rounds
+from permutation import PERMUTATION_TABLE, THREE_ROUND_TABLE, permutations_to_ids, get_key_composition_table
+from image_processing import calculate_hierarchical_averages
+from binary_operations import get_msbs
+
+ENGINES = ('reference', 'scalar', 'vector')
+
+# 校準結果檔（可用環境變數 ECIHMSB_ENGINE_CALIBRATION 指定）
+CALIBRATION_PATH = os.environ.get(
+    'ECIHMSB_ENGINE_CALIBRATION',
+    os.path.join(os.path.expanduser('~'), '.cache', 'ecihmsb', 'engine_calibration.json')
+)
+
+# MSB 門檻（以區塊內像素總和判斷，避免浮點平均）
+# 平均值 ≥ 128 ⇔ 總和 ≥ 128 × 像素數
+LAYER1_THRESHOLD = 128 * 4    # 2×2
+LAYER2_THRESHOLD = 128 * 16   # 4×4
+LAYER3_THRESHOLD = 128 * 64   # 8×8
+
+THREE_ROUND_INDICES = THREE_ROUND_TABLE.tolist()  # scalar 路徑用的 Python 列表版本
+
+# ==================== 共用 ====================
+def block_range_rows(cover_image, num_blocks, first_block=0):
+    """
+    功能:
+        區塊範圍 [first_block, first_block + num_blocks) 涵蓋的區塊列
+
+    返回:
+        num_cols: 水平方向區塊數
+        first_row: 第一個區塊列
+        block_rows: 涵蓋的區塊列數
+        offset: first_block 在涵蓋範圍中的位置（first_block - first_row × num_cols）
+    """
+    num_cols = cover_image.shape[1] // BLOCK_SIZE
+    first_row = first_block // num_cols
+    block_rows = math.ceil((first_block + num_blocks) / num_cols) - first_row
+    return num_cols, first_row, block_rows, first_block - first_row * num_cols
+
+def generate_Q_ids(cover_image, num_blocks, contact_key=None, first_block=0):
+    """
+    功能:
+        一次生成 num_blocks 個區塊 Q 的排列編號（見 permutation.py）
+
+    參數:
+        cover_image: numpy array，灰階圖像 (H×W)
+        num_blocks: 區塊數（依列優先順序）
+        contact_key: 對象專屬密鑰（字串）
+        first_block: 從第幾個區塊開始（預設從頭）
+
+    返回:
+        ids: numpy array (num_blocks,)，uint16
+
+    註:
+        與 generate_Q_from_block 相同，使用 float64 + np.argsort 預設排序，
+        像素值相同時的順序（tie-breaking）才會和逐區塊計算一致；
+        contact_key 的置換用合成表查表，不必逐區塊重排
+    """
+    num_cols, first_row, block_rows, offset = block_range_rows(cover_image, num_blocks, first_block)
+
+    # 每個區塊第一行 = 圖像第 0、8、16... 列
+    first_rows = cover_image[first_row * BLOCK_SIZE:(first_row + block_rows) * BLOCK_SIZE:BLOCK_SIZE,
+                             :num_cols * BLOCK_SIZE]
+    first_rows = first_rows.reshape(block_rows * num_cols, BLOCK_SIZE)[offset:offset + num_blocks, :Q_LENGTH]
+    ids = permutations_to_ids(np.argsort(first_rows.astype(np.float64), axis=1))
+
+    table = get_key_composition_table(contact_key, Q_LENGTH)
+    if table is not None:
+        ids = table[ids]
+    return ids
+
+def generate_Q_batch(cover_image, num_blocks, contact_key=None):
+    """
+    功能:
+        一次生成前 num_blocks 個區塊的 Q（0-based）
+
+    參數:
+        cover_image: numpy array，灰階圖像 (H×W)
+        num_blocks: 區塊數
+        contact_key: 對象專屬密鑰（字串）
+
+    返回:
+        Q: numpy array (num_blocks×7)，每列為 0-based 排列順序
+    """
+    return PERMUTATION_TABLE[generate_Q_ids(cover_image, num_blocks, contact_key)]
+
+def combine_with_plane(bits, plane):
+    """
+    功能:
+        位元與 MSB 平面逐位映射（嵌入和提取共用）
+
+    參數:
+        bits: 位元列表（嵌入時為加密後的機密，提取時為 Z 碼）
+        plane: MSB 平面（list 或 numpy array）
+
+    返回:
+        result: 位元列表，長度為 min(len(bits), len(plane))
+
+    原理:
+        映射表 (M, MSB) → Z 與反向 (Z, MSB) → M 都是「相同為 1、不同為 0」
+        即 1 ⊕ bit ⊕ MSB
+    """
+    if isinstance(plane, np.ndarray):
+        n = min(len(bits), plane.size)
+        bits = np.asarray(bits[:n], dtype=np.uint8)
+        return (1 ^ bits ^ plane[:n]).tolist()
+    return [1 ^ b ^ m for b, m in zip(bits, plane)]
+
+# ==================== reference：原本的逐區塊流程 ====================
+def msb_plane_reference(cover_image, num_blocks, contact_key=None, first_block=0):
+    """
+    功能:
+        逐區塊呼叫原始函式計算 MSB 平面（作為驗證基準）
+
+    參數:
+        cover_image: numpy array，灰階圖像 (H×W)
+        num_blocks: 區塊數
+        contact_key: 對象專屬密鑰（字串）
+        first_block: 從第幾個區塊開始
+
+    返回:
+        plane: MSB 列表，長度 num_blocks × 21
+    """
+    num_cols = cover_image.shape[1] // BLOCK_SIZE
+    plane = []
+    for index in range(first_block, first_block + num_blocks):
+        i, j = divmod(index, num_cols)
+        block = cover_image[i * BLOCK_SIZE:(i + 1) * BLOCK_SIZE, j * BLOCK_SIZE:(j + 1) * BLOCK_SIZE]
+        Q = generate_Q_from_block(block, Q_LENGTH, contact_key=contact_key)
+        averages_21 = calculate_hierarchical_averages(block)
+        plane.extend(get_msbs(apply_Q_three_rounds(averages_21, Q)))
+    return plane
+
+# ==================== scalar：純 Python 整數 ====================
+def msb_plane_scalar(cover_image, num_blocks, contact_key=None, first_block=0):
+    """
+    功能:
+        用 Python 整數計算 MSB 平面（每個區塊不做 numpy 轉換）
+
+    參數:
+        cover_image: numpy array，灰階圖像 (H×W)
+        num_blocks: 區塊數
+        contact_key: 對象專屬密鑰（字串）
+        first_block: 從第幾個區塊開始
+
+    返回:
+        plane: MSB 列表，長度 num_blocks × 21
+    """
+    num_cols, first_row, block_rows, offset = block_range_rows(cover_image, num_blocks, first_block)
+    Q_ids = generate_Q_ids(cover_image, num_blocks, contact_key, first_block).tolist()
+    used_cols = num_cols if block_rows > 1 else offset + num_blocks
+    pixels = cover_image[first_row * BLOCK_SIZE:(first_row + block_rows) * BLOCK_SIZE,
+                         :used_cols * BLOCK_SIZE].tolist()  # 只轉換用得到的像素（列號從 first_row 起算）
+
+    plane = []
+    for index in range(num_blocks):
+        i, j = divmod(offset + index, num_cols)
+        r0, c0 = i * BLOCK_SIZE, j * BLOCK_SIZE
+
+        # 第一層：16 個 2×2 總和
+        s1 = []
+        for r in range(r0, r0 + BLOCK_SIZE, 2):
+            top, bottom = pixels[r], pixels[r + 1]
+            for c in range(c0, c0 + BLOCK_SIZE, 2):
+                s1.append(top[c] + top[c + 1] + bottom[c] + bottom[c + 1])
+
+        # 第二層：4 個 4×4 總和（第一層排成 4×4 後每 2×2 一組）
+        s2 = [
+            s1[0] + s1[1] + s1[4] + s1[5],
+            s1[2] + s1[3] + s1[6] + s1[7],
+            s1[8] + s1[9] + s1[12] + s1[13],
+            s1[10] + s1[11] + s1[14] + s1[15],
+        ]
+        s3 = s2[0] + s2[1] + s2[2] + s2[3]
+
+        msbs = ([1 if s >= LAYER1_THRESHOLD else 0 for s in s1] +
+                [1 if s >= LAYER2_THRESHOLD else 0 for s in s2] +
+                [1 if s3 >= LAYER3_THRESHOLD else 0])
+
+        # 三輪套用同一個 Q（查表取得 21 個取值位置）
+        plane.extend([msbs[k] for k in THREE_ROUND_INDICES[Q_ids[index]]])
+    return plane
+
+# ==================== vector：整張陣列 ====================
+def block_msbs(cover_image, num_blocks, first_block=0):
+    """
+    功能:
+        用 numpy 整批計算 num_blocks 個區塊排列前的 21 個 MSB（與密鑰無關）
+
+    參數:
+        cover_image: numpy array，灰階圖像 (H×W)
+        num_blocks: 區塊數
+        first_block: 從第幾個區塊開始
+
+    返回:
+        msbs: numpy array (num_blocks×21)，uint8
+    """
+    num_cols, first_row, block_rows, offset = block_range_rows(cover_image, num_blocks, first_block)
+
+    # (列, 8, 行, 8) → (區塊, 8, 8)
+    region = cover_image[first_row * BLOCK_SIZE:(first_row + block_rows) * BLOCK_SIZE, :num_cols * BLOCK_SIZE]
+    blocks = region.reshape(block_rows, BLOCK_SIZE, num_cols, BLOCK_SIZE).swapaxes(1, 2)
+    blocks = blocks.reshape(-1, BLOCK_SIZE, BLOCK_SIZE)[offset:offset + num_blocks]
+
+    s1 = blocks.reshape(num_blocks, 4, 2, 4, 2).sum(axis=(2, 4), dtype=np.int32)  # (n, 4, 4)
+    s2 = s1.reshape(num_blocks, 2, 2, 2, 2).sum(axis=(2, 4))                      # (n, 2, 2)
+    s3 = s2.sum(axis=(1, 2))                                                      # (n,)
+
+    msbs = np.empty((num_blocks, TOTAL_AVERAGES_PER_UNIT), dtype=np.uint8)
+    msbs[:, :16] = s1.reshape(num_blocks, 16) >= LAYER1_THRESHOLD
+    msbs[:, 16:20] = s2.reshape(num_blocks, 4) >= LAYER2_THRESHOLD
+    msbs[:, 20] = s3 >= LAYER3_THRESHOLD
+    return msbs
+
+def msb_plane_vector(cover_image, num_blocks, contact_key=None, first_block=0):
+    """
+    功能:
+        用 numpy 整批計算 MSB 平面
+
+    參數:
+        cover_image: numpy array，灰階圖像 (H×W)
+        num_blocks: 區塊數
+        contact_key: 對象專屬密鑰（字串）
+        first_block: 從第幾個區塊開始
+
+    返回:
+        plane: numpy array (uint8)，長度 num_blocks × 21
+    """
+    msbs = block_msbs(cover_image, num_blocks, first_block)
+
+    # 三輪排列 = 依 Q 編號從 THREE_ROUND_TABLE 取出 21 個取值位置，一次 gather
+    index = THREE_ROUND_TABLE[generate_Q_ids(cover_image, num_blocks, contact_key, first_block)]
+    return np.take_along_axis(msbs, index, axis=1).reshape(-1)
+
+def msb_planes_for_keys(cover_image, num_blocks, contact_keys):
+    """
+    功能:
+        一次計算多個密鑰的 MSB 平面（試解所有對象用）
+
+    參數:
+        cover_image: numpy array，灰階圖像 (H×W)
+        num_blocks: 區塊數
+        contact_keys: 密鑰列表
+
+    返回:
+        planes: numpy array (len(contact_keys) × num_blocks×21)，uint8，第 k 列與 msb_plane_vector(..., contact_keys[k]) 相同
+
+    原理:
+        平均值與 MSB 跟密鑰無關，只算一次；各密鑰只差 Q 的置換（查合成表），最後一次 gather
+    """
+    if not contact_keys:
+        return np.empty((0, num_blocks * TOTAL_AVERAGES_PER_UNIT), dtype=np.uint8)
+    msbs = block_msbs(cover_image, num_blocks)
+    base_ids = generate_Q_ids(cover_image, num_blocks)
+    tables = [get_key_composition_table(key, Q_LENGTH) for key in contact_keys]
+    ids = np.stack([base_ids if table is None else table[base_ids] for table in tables])  # (對象, 區塊)
+    index = THREE_ROUND_TABLE[ids]                                                      # (對象, 區塊, 21)
+    planes = np.take_along_axis(np.broadcast_to(msbs, index.shape), index, axis=2)
+    return planes.reshape(len(contact_keys), -1)
+
+ENGINE_FUNCTIONS = {
+    'reference': msb_plane_reference,
+    'scalar': msb_plane_scalar,
+    'vector': msb_plane_vector,
+}
+
+# ==================== 自動選擇 ====================
+@functools.lru_cache(maxsize=1)
+def get_crossover_blocks():
+    """
+    功能:
+        取得 scalar → vector 的切換點（優先使用校準結果）
+
+    返回:
+        int: 區塊數 ≥ 此值時使用 vector
+    """
+    try:
+        with open(CALIBRATION_PATH, 'r', encoding='utf-8') as f:
+            return int(json.load(f)['crossover_blocks'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return ENGINE_CROSSOVER_BLOCKS
+
+def select_engine(num_blocks, engine=None):
+    """
+    功能:
+        決定要使用的引擎
+
+    參數:
+        num_blocks: 需要處理的區塊數
+        engine: 'auto'、'scalar'、'vector' 或 'reference'（None 表示使用 config.DEFAULT_ENGINE）
+
+    返回:
+        str: 引擎名稱
+    """
+    engine = engine or DEFAULT_ENGINE
+    if engine == 'auto':
+        return 'scalar' if num_blocks < get_crossover_blocks() else 'vector'
+    if engine not in ENGINE_FUNCTIONS:
+        raise ValueError(f"未知的引擎: {engine}（可用: auto, {', '.join(ENGINES)}）")
+    return engine
+
+def compute_msb_plane(cover_image, num_blocks, contact_key=None, engine=None, first_block=0):
+    """
+    功能:
+        計算 num_blocks 個區塊排列後的 MSB 平面
+
+    參數:
+        cover_image: numpy array，灰階圖像 (H×W)，尺寸為 8 的倍數
+        num_blocks: 區塊數（first_block + num_blocks 不可超過載體區塊總數）
+        contact_key: 對象專屬密鑰（字串）
+        engine: 引擎名稱（見 select_engine）
+        first_block: 從第幾個區塊開始（預設從頭；只需要 Z 碼中間一段時用）
+
+    返回:
+        plane: MSB 平面（list 或 numpy array），長度 num_blocks × 21
+    """
+    if num_blocks <= 0:
+        return []
+    return ENGINE_FUNCTIONS[select_engine(num_blocks, engine)](cover_image, num_blocks, contact_key, first_block)
+
+# ==================== 校準 ====================
+def time_engine(engine, cover_image, num_blocks, repeat):
+    """回傳 engine 計算 num_blocks 個區塊的最短耗時（秒）"""
+    func = ENGINE_FUNCTIONS[engine]
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(cover_image, num_blocks, 'calibration')
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def calibrate(path=None, repeat=5, max_blocks=4096, verbose=True):
+    """
+    功能:
+        量測 scalar 與 vector 在不同區塊數的耗時，找出切換點並寫入校準檔
+
+    參數:
+        path: 校準檔路徑（None 表示 CALIBRATION_PATH）
+        repeat: 每個量測重複次數（取最短）
+        max_blocks: 量測的最大區塊數
+        verbose: 是否印出量測結果
+
+    返回:
+        result: 校準結果 dict（含 crossover_blocks）
+    """
+    path = path or CALIBRATION_PATH
+    side = BLOCK_SIZE * int(math.ceil(math.sqrt(max_blocks)))
+    cover_image = np.random.default_rng(0).integers(0, 256, (side, side), dtype=np.uint8)
+
+    measurements = []
+    crossover = None
+    num_blocks = 1
+    while num_blocks <= max_blocks:
+        scalar = time_engine('scalar', cover_image, num_blocks, repeat)
+        vector = time_engine('vector', cover_image, num_blocks, repeat)
+        measurements.append({'blocks': num_blocks, 'scalar_us': round(scalar * 1e6, 1), 'vector_us': round(vector * 1e6, 1)})
+        if verbose:
+            print(f"{num_blocks:>6} 區塊  scalar {scalar * 1e6:>10.1f} µs  vector {vector * 1e6:>10.1f} µs")
+        if crossover is None and vector <= scalar:
+            crossover = num_blocks
+        num_blocks *= 2
+
+    result = {
+        'crossover_blocks': crossover if crossover is not None else max_blocks,
+        'measurements': measurements,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    get_crossover_blocks.cache_clear()
+
+    if verbose:
+        print(f"切換點：{result['crossover_blocks']} 區塊（已寫入 {path}）")
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="E-CIHMSB 區塊運算引擎")
+    sub = parser.add_subparsers(dest='command', required=True)
+    cal = sub.add_parser('calibrate', help="量測並寫入 scalar/vector 切換點")
+    cal.add_argument('--output', default=None, help="校準檔路徑")
+    cal.add_argument('--repeat', type=int, default=5)
+    cal.add_argument('--max-blocks', type=int, default=4096)
+    args = parser.parse_args(argv)
+
+    calibrate(args.output, repeat=args.repeat, max_blocks=args.max_blocks)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
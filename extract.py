@@ -1,18 +1,176 @@
 # 建立 extract.py → 提取模組
 # 從載體圖像和 Z 碼提取機密內容
 
+import math
 import numpy as np
 from PIL import Image
 
-from config import Q_LENGTH, TOTAL_AVERAGES_PER_UNIT, BLOCK_SIZE, IMAGE_HEADER_SIZE
-from permutation import generate_Q_from_block, apply_Q_three_rounds
-from image_processing import convert_to_grayscale, validate_image_size, calculate_hierarchical_averages
-from binary_operations import get_msbs
-from mapping import map_from_z
+from config import TOTAL_AVERAGES_PER_UNIT, BLOCK_SIZE, IMAGE_HEADER_SIZE, EXTENDED_HEADER_SIZE
+from config import TYPE_MARKER_SIZE, KEY_TAG_SIZE, PAYLOAD_FLAG_KEY_TAG, PAYLOAD_FLAG_SEEKABLE, PLAUSIBILITY_PREFIX_BYTES
+from config import KEY_CHECK_BLOCKS
+from config import PAYLOAD_FLAG_PROGRESSIVE, PREVIEW_FRACTION
+from config import PAYLOAD_TYPE_TEXT, PAYLOAD_TYPE_IMAGE_RAW, PAYLOAD_TYPE_IMAGE_FILE
+from image_processing import convert_to_grayscale, validate_image_size
+from backends import get_backend
+from engine import msb_planes_for_keys
 from secret_encoding import binary_to_text, binary_to_image, xor_cipher
+from secret_encoding import parse_payload_header, decode_image_file, bits_to_bytes, bytes_to_bits, compute_key_tag
+from text_codecs import text_codec_name
+from plausibility import assess_prefix, read_raw_image_header, raw_image_bits, GARBLED, STRUCTURAL_REASONS
+from profiling import stage
+
+# 密鑰檢查碼涵蓋的區塊數（config.KEY_CHECK_BLOCKS）：類型標記 + 擴充 header + 檢查碼 = 81 bits → 前 4 個區塊，不用密鑰
+KEY_MISMATCH_MESSAGE = "密鑰檢查碼不符，選擇的對象不是這個 Z 碼的收件人"
+
+# 提早判斷亂碼時先還原的區塊數：檢查碼之後再多 PLAUSIBILITY_PREFIX_BYTES bytes（約 102 個區塊）
+PLAUSIBILITY_BLOCKS = math.ceil((TYPE_MARKER_SIZE + EXTENDED_HEADER_SIZE + KEY_TAG_SIZE + PLAUSIBILITY_PREFIX_BYTES * 8)
+                                / TOTAL_AVERAGES_PER_UNIT)
+GARBLED_MESSAGE = "提取內容是亂碼（對象或載體圖像可能選錯）"
+
+# 密鑰檢查
+def tagged_header(head, total_bits):
+    """
+    功能:
+        判斷不用密鑰還原的開頭區塊是否為有密鑰檢查碼的擴充 header
+    
+    參數:
+        head: 用無密鑰 MSB 平面還原的前 KEY_CHECK_BLOCKS 個區塊
+        total_bits: Z 碼位元數
+    
+    返回:
+        payload_header（見 parse_payload_header），不是有檢查碼的擴充 header 時返回 None
+    
+    註:
+        舊版格式、沒有檢查碼的 Z 碼整個用密鑰排列，不用密鑰讀出來是亂碼；
+        要同時符合類型標記、16 個 0、版本、旗標、長度不超過 Z 碼才算，誤判機率可忽略
+    """
+    if len(head) < TYPE_MARKER_SIZE + EXTENDED_HEADER_SIZE + KEY_TAG_SIZE or head[0] != 1:
+        return None
+    try:
+        payload_header = parse_payload_header(head[1:])
+    except ValueError:
+        return None
+    if payload_header is None or not payload_header['flags'] & PAYLOAD_FLAG_KEY_TAG:
+        return None
+    if TYPE_MARKER_SIZE + EXTENDED_HEADER_SIZE + KEY_TAG_SIZE + payload_header['length'] > total_bits:
+        return None
+    return payload_header
+
+def read_key_tag(encrypted_bits, contact_key):
+    """
+    功能:
+        檢查 Z 碼開頭的密鑰檢查碼
+    
+    參數:
+        encrypted_bits: 從 Z 碼還原、尚未 XOR 解密的位元（至少含前 KEY_CHECK_BLOCKS 個區塊）
+        contact_key: 對象專屬密鑰
+    
+    返回:
+        True（密鑰正確）、False（密鑰不對），沒有檢查碼（舊版格式、嵌入時沒加）返回 None
+    """
+    if len(encrypted_bits) < 1 or encrypted_bits[0] != 1:
+        return None
+    try:
+        payload_header = parse_payload_header(encrypted_bits[1:])
+    except ValueError:
+        return None
+    if payload_header is None or not payload_header['flags'] & PAYLOAD_FLAG_KEY_TAG:
+        return None
+    
+    start = TYPE_MARKER_SIZE + EXTENDED_HEADER_SIZE
+    tag = [int(b) for b in encrypted_bits[start:start + KEY_TAG_SIZE]]
+    return tag == compute_key_tag(contact_key, [int(b) for b in encrypted_bits[:start]])
+
+def check_key(cover_image, z_bits, contact_key=None, backend=None, rounding=None):
+    """
+    功能:
+        只還原前 KEY_CHECK_BLOCKS 個區塊，用密鑰檢查碼判斷密鑰對不對
+    
+    參數:
+        cover_image: 載體圖像
+        z_bits: Z 碼位元列表
+        contact_key: 對象專屬密鑰
+        backend: 運算後端名稱（見 extract_secret）
+        rounding: 彩色載體轉灰階的方式（見 extract_secret）
+    
+    返回:
+        True / False，Z 碼沒有檢查碼時返回 None（只能解完再判斷）
+    """
+    cover_image = convert_to_grayscale(cover_image, rounding)
+    return read_key_tag(decode_head(cover_image, z_bits, KEY_CHECK_BLOCKS, contact_key, get_backend(backend)), contact_key)
+
+def decode_head(cover_image, z_bits, num_blocks, contact_key, backend):
+    """
+    只還原前 num_blocks 個區塊（灰階載體、後端物件），返回尚未 XOR 解密的位元
+    
+    先用無密鑰的 MSB 平面還原前 KEY_CHECK_BLOCKS 個區塊：是有密鑰檢查碼的 Z 碼（見 tagged_header）就沿用，
+    只有之後的區塊用 contact_key；否則整段改用 contact_key 還原（舊版格式、沒有檢查碼）
+    """
+    num_blocks = min(num_blocks, math.ceil(len(z_bits) / TOTAL_AVERAGES_PER_UNIT))
+    head_blocks = min(num_blocks, KEY_CHECK_BLOCKS)
+    head = backend.xor_plane(z_bits[:head_blocks * TOTAL_AVERAGES_PER_UNIT], backend.msb_plane(cover_image, head_blocks, None))
+    if contact_key and tagged_header(head, len(z_bits)) is None:
+        head_blocks = 0
+        head = []
+    if num_blocks > head_blocks:
+        plane = backend.msb_plane(cover_image, num_blocks - head_blocks, contact_key, first_block=head_blocks)
+        head = head + backend.xor_plane(z_bits[head_blocks * TOTAL_AVERAGES_PER_UNIT:num_blocks * TOTAL_AVERAGES_PER_UNIT], plane)
+    return head
+
+# 自動偵測對象
+CONTACT_TRIAL_BLOCKS = 8  # 每個對象試解的區塊數（168 bits：涵蓋密鑰檢查碼，沒有檢查碼時用來評分）
+
+
+def identify_contact(cover_image, z_bits, contacts, rounding=None):
+    """
+    功能:
+        找出 Z 碼的收件對象（所有對象一次試解開頭幾個區塊）
+    
+    參數:
+        cover_image: 載體圖像
+        z_bits: Z 碼位元列表
+        contacts: {對象名稱: 密鑰}
+        rounding: 彩色載體轉灰階的方式（見 extract_secret）
+    
+    返回:
+        name: 收件對象名稱（都不符、或多個對象同分無法判斷時為 None）
+        details: dict
+            - method: 'tag'（依密鑰檢查碼）或 'score'（依開頭內容評分）
+            - scores: {對象名稱: 分數}
+            - candidates: 分數最高的對象（超過一個表示無法判斷，Z 碼太短時常見）
+    
+    原理:
+        有密鑰檢查碼時，開頭區塊不用密鑰（見 decode_head），只還原一次，各對象只差檢查碼的計算；
+        沒有檢查碼時，平均值、MSB 只算一次，各對象只差 Q 置換（engine.msb_planes_for_keys），
+        試解成本是 對象數 × CONTACT_TRIAL_BLOCKS 個區塊，與機密大小無關；
+        找到對象後再用 detect_and_extract 完整提取
+    """
+    cover_image = convert_to_grayscale(cover_image, rounding)
+    height, width = validate_image_size(cover_image)
+    names = list(contacts)
+    num_blocks = min(CONTACT_TRIAL_BLOCKS, math.ceil(len(z_bits) / TOTAL_AVERAGES_PER_UNIT),
+                     (height // BLOCK_SIZE) * (width // BLOCK_SIZE))
+    
+    head = decode_head(cover_image, z_bits, KEY_CHECK_BLOCKS, None, get_backend())
+    if tagged_header(head, len(z_bits)) is not None:
+        tags = {name: read_key_tag(head, contacts[name]) for name in names}
+        scores = {name: float(tag) for name, tag in tags.items()}
+        candidates = [name for name, tag in tags.items() if tag]
+        method = 'tag'
+    else:
+        planes = msb_planes_for_keys(cover_image, num_blocks, [contacts[name] for name in names])
+        head = np.asarray(z_bits[:planes.shape[1]], dtype=np.uint8)
+        trials = {name: (1 ^ head ^ plane[:len(head)]).tolist() for name, plane in zip(names, planes)}
+        scores = {name: assess_prefix(bits, contacts[name], len(z_bits))['score'] for name, bits in trials.items()}
+        top = max(scores.values(), default=None)
+        candidates = [name for name, score in scores.items() if score == top]
+        method = 'score'
+    name = candidates[0] if len(candidates) == 1 else None
+    return name, {'method': method, 'scores': scores, 'candidates': candidates}
 
 # 提取
-def extract_secret(cover_image, z_bits, secret_type='text', contact_key=None):
+def extract_secret(cover_image, z_bits, secret_type='text', contact_key=None, backend=None, early_abort=False,
+                   rounding=None):
     """
     功能:
         從 Z 碼和載體圖像提取機密內容
@@ -20,157 +178,191 @@ def extract_secret(cover_image, z_bits, secret_type='text', contact_key=None):
     參數:
         cover_image: numpy array，灰階圖像 (H×W) 或彩色圖像 (H×W×3)
         z_bits: Z 碼位元列表
-        secret_type: 'text' 或 'image'
+        secret_type: 'text' 或 'image'（擴充 header 的 Z 碼以 header 中的內容類型為準），
+                     None 表示依類型標記判斷
         contact_key: 對象專屬密鑰（字串），用於解密
+        backend: 運算後端名稱（見 backends.py，None 表示依環境變數 / 設定值）
+        early_abort: 沒有密鑰檢查碼時，先解密開頭 PLAUSIBILITY_PREFIX_BYTES bytes 評分（見 plausibility.py）；
+                     格式不合就停止，內容統計的評分只記在 info['plausibility']
+        rounding: 彩色載體轉灰階的方式（'legacy' 或 'pil'，見 image_processing.convert_to_grayscale），
+                  提取時必須和嵌入時相同；None 表示 config.GRAYSCALE_ROUNDING（灰階載體不受影響）
     
     返回:
         secret: 機密內容（字串或 PIL Image）
-        info: 額外資訊（機密內容的相關資訊）
+        info: 額外資訊（機密內容的相關資訊；early_abort 時含開頭評分 'plausibility'）
+    
+    例外:
+        Z 碼有密鑰檢查碼且密鑰不對時拋出 ValueError（只解前 KEY_CHECK_BLOCKS 個區塊就停止）
+        擴充 header 的版本不支援、不完整（多半是對象或載體選錯）時拋出 ValueError（GARBLED_MESSAGE）
+        early_abort 且開頭內容格式不合（header、尺寸、長度、檔頭）時拋出 ValueError（只解前 PLAUSIBILITY_BLOCKS 個區塊就停止）
+    
+    註:
+        文字字元比例、像素平滑度只是統計，棋盤格、條紋、雜訊圖等正常機密也可能判為亂碼，
+        所以不會因此停止，由呼叫端依 info['plausibility'] 顯示警告
     
     流程:
         1. 圖像預處理（彩色轉灰階、檢查尺寸）
         2. 計算 8×8 區塊數量
-        3. 對每個 8×8 區塊進行提取（使用 contact_key 生成 Q）
+        3. 先還原開頭幾個區塊讀出類型標記和擴充 header（內容長度決定要還原幾個區塊），
+           再從下一個區塊接著還原其餘區塊（使用 contact_key 生成 Q），每個區塊只算一次
         4. XOR 解密（使用 contact_key）
         5. 將機密位元轉回原始內容
 
     格式:
         [1 bit 類型標記] + [機密內容]
         類型標記: 0 = 文字, 1 = 圖像
+        擴充 header: [1] + [64 bits header] + [內容]（見 secret_encoding.build_payload_header）
     """
-    # 步驟 1：圖像預處理
-    cover_image = convert_to_grayscale(cover_image)
+    # 步驟 1：圖像預處理（只轉一次灰階）
+    with stage('grayscale') as counters:
+        cover_image = convert_to_grayscale(cover_image, rounding)
+        counters['bytes'] = cover_image.nbytes
     height, width = validate_image_size(cover_image)
     
     # 步驟 2：計算 8×8 區塊數量
     num_rows = height // BLOCK_SIZE  # 垂直方向有幾個 8×8 區塊
     num_cols = width // BLOCK_SIZE   # 水平方向有幾個 8×8 區塊
     
-    # 步驟 3：對每個 8×8 區塊進行提取
-    # 流程和 embed.py 相反：從 Z 碼還原加密後的位元
-    encrypted_bits = []
-    z_bit_index = 0
-    finished = False
-    
-    for i in range(num_rows):      # i = 第幾列區塊
-        if finished:
-            break
+    # 步驟 3：對用到的 8×8 區塊進行提取
+    # 流程和 embed.py 相反：用相同的 MSB 平面從 Z 碼還原加密後的位元 (Z, MSB) → M
+    # Z 碼比載體容量長時，只還原容量範圍內的位元
+    num_blocks = min(math.ceil(len(z_bits) / TOTAL_AVERAGES_PER_UNIT), num_rows * num_cols)
+    if num_blocks < 1:
+        raise ValueError("提取的位元數不足，無法讀取類型標記")
+    with stage('blocks') as counters:
+        backend = get_backend(backend)
+        # 先還原開頭幾個區塊：讀出類型標記、擴充 header（和密鑰檢查碼）
+        head_blocks = min(num_blocks, PLAUSIBILITY_BLOCKS if early_abort else KEY_CHECK_BLOCKS)
+        head = decode_head(cover_image, z_bits, head_blocks, contact_key, backend)
+        type_marker = head[0]  # type_marker 沒有被加密
+        
+        # 類型標記 1 之後是 16 個 0 → 擴充 header（舊版圖像寬度不會是 0）
+        # 跳脫碼之後版本不對、header 不完整：對象或載體選錯才會出現，和 read_key_tag 一樣捕捉，回報亂碼
+        try:
+            payload_header = parse_payload_header(head[1:]) if type_marker == 1 else None
+        except ValueError:
+            raise ValueError(GARBLED_MESSAGE) from None
+        payload_start = EXTENDED_HEADER_SIZE
+        has_key_tag = payload_header is not None and bool(payload_header['flags'] & PAYLOAD_FLAG_KEY_TAG)
+        if payload_header is not None:
+            secret_type = 'text' if payload_header['type'] == PAYLOAD_TYPE_TEXT else 'image'
+            if has_key_tag:
+                if read_key_tag(head, contact_key) is False:
+                    raise ValueError(KEY_MISMATCH_MESSAGE)
+                payload_start += KEY_TAG_SIZE
+            # header 有內容長度：只還原到內容結尾的區塊（Z 碼尾端多出的位元不處理）
+            total_bits = TYPE_MARKER_SIZE + payload_start + payload_header['length']
+            num_blocks = min(num_blocks, math.ceil(total_bits / TOTAL_AVERAGES_PER_UNIT))
+        elif secret_type is None:
+            secret_type = 'image' if type_marker == 1 else 'text'
         
-        for j in range(num_cols):  # j = 第幾行區塊
-            if z_bit_index >= len(z_bits):
-                finished = True
-                break
-            
-            # 提取這個 8×8 區塊
-            # 例如 i=1, j=2 時：
-            # start_row = 1 × 8 = 8
-            # end_row = 8 + 8 = 16
-            # start_col = 2 × 8 = 16
-            # end_col = 16 + 8 = 24
-            # block = cover_image[8:16, 16:24]
-            start_row = i * BLOCK_SIZE
-            end_row = start_row + BLOCK_SIZE
-            start_col = j * BLOCK_SIZE
-            end_col = start_col + BLOCK_SIZE
-            block = cover_image[start_row:end_row, start_col:end_col]
-            
-            # 生成這個區塊專屬的排列密鑰 Q
-            # 每個區塊的 Q 都不同（基於區塊內容 + contact_key）
-            Q = generate_Q_from_block(block, Q_LENGTH, contact_key=contact_key)
-            
-            # 計算 21 個多層次平均值
-            # 第一層: 16 個 (2×2 區塊)
-            # 第二層: 4 個 (4×4 區塊)
-            # 第三層: 1 個 (8×8 整塊)
-            averages_21 = calculate_hierarchical_averages(block)
-            
-            # 用 Q 重新排列 21 個平均值（分 3 輪，每輪 7 個）
-            reordered_averages = apply_Q_three_rounds(averages_21, Q)
-            
-            # 提取排列後的 21 個 MSB（最高有效位元）
-            # 例如 156 = 10011100，MSB = 1
-            msbs = get_msbs(reordered_averages)
-            
-            # 反向映射還原加密後的位元
-            # 對這個區塊的 21 個位置，逐一還原 M
-            for k in range(TOTAL_AVERAGES_PER_UNIT):  # k = 0~20
-                if z_bit_index >= len(z_bits):
-                    finished = True
-                    break
-                
-                z_bit = z_bits[z_bit_index]             # Z 碼的 bit
-                msb = msbs[k]                           # 對應的 MSB
-                encrypted_bit = map_from_z(z_bit, msb)  # (Z, MSB) → M
-                encrypted_bits.append(encrypted_bit)
-                z_bit_index += 1
+        # 沒有密鑰檢查碼時，開頭內容格式不合就停止（內容統計的評分只供參考）
+        # Z 碼很短、開頭區塊已涵蓋全部內容時也一樣：格式不合的內容解碼沒有意義（例如尺寸超大的舊版圖像）
+        plausibility = None
+        if early_abort and not has_key_tag:
+            plausibility = assess_prefix(head, contact_key, len(z_bits))
+            if plausibility['verdict'] == GARBLED and plausibility['reason'] in STRUCTURAL_REASONS:
+                raise ValueError(GARBLED_MESSAGE)
+        
+        # 其餘區塊接在開頭之後（開頭已還原的區塊不重算）
+        if num_blocks > head_blocks:
+            plane = backend.msb_plane(cover_image, num_blocks - head_blocks, contact_key, first_block=head_blocks)
+            rest = z_bits[head_blocks * TOTAL_AVERAGES_PER_UNIT:num_blocks * TOTAL_AVERAGES_PER_UNIT]
+            encrypted_bits = head + backend.xor_plane(rest, plane)
+        else:
+            encrypted_bits = head[:num_blocks * TOTAL_AVERAGES_PER_UNIT]
+        counters['blocks'] = num_blocks
+        counters['bits'] = len(encrypted_bits)
+        counters['backend'] = backend.name
     
     # 步驟 4：XOR 解密
     # type_marker 不需要解密
     # 如果是圖像，header (34 bits) 也不需要解密，只解密像素資料
-    if len(encrypted_bits) < 1:
-        raise ValueError("提取的位元數不足，無法讀取類型標記")
-    
-    type_marker = encrypted_bits[0]           # type_marker 沒有被加密
     encrypted_content = encrypted_bits[1:]    # type_marker 之後的所有位元
     
-    if type_marker == 1 and len(encrypted_content) > IMAGE_HEADER_SIZE:
-        # 圖像解密結構：
-        # [type_marker 1 bit] + [header 34 bits] + XOR([像素資料])
-        #      不解密              不解密              解密
-        image_header = encrypted_content[:IMAGE_HEADER_SIZE]
-        encrypted_pixels = encrypted_content[IMAGE_HEADER_SIZE:]
-        decrypted_pixels = xor_cipher(encrypted_pixels, contact_key)
-        content_bits = image_header + decrypted_pixels
-    else:
-        # 文字解密結構：
-        # [type_marker 1 bit] + XOR([content_bits])
-        #      不解密                  解密
-        content_bits = xor_cipher(encrypted_content, contact_key)
+    with stage('xor', bits=len(encrypted_content)):
+        if payload_header is not None:
+            # 擴充 header 解密結構：
+            # [type_marker 1 bit] + [擴充 header 64 bits（+ 檢查碼 16 bits）] + XOR([內容])
+            #      不解密                        不解密                            解密
+            encrypted_payload = encrypted_content[payload_start:payload_start + payload_header['length']]
+            content_bits = xor_cipher(encrypted_payload, contact_key,
+                                      counter=bool(payload_header['flags'] & PAYLOAD_FLAG_SEEKABLE))
+        elif type_marker == 1 and len(encrypted_content) > IMAGE_HEADER_SIZE:
+            # 圖像解密結構：
+            # [type_marker 1 bit] + [header 34 bits] + XOR([像素資料])
+            #      不解密              不解密              解密
+            image_header = encrypted_content[:IMAGE_HEADER_SIZE]
+            encrypted_pixels = encrypted_content[IMAGE_HEADER_SIZE:]
+            decrypted_pixels = xor_cipher(encrypted_pixels, contact_key)
+            content_bits = image_header + decrypted_pixels
+        else:
+            # 文字解密結構：
+            # [type_marker 1 bit] + XOR([content_bits])
+            #      不解密                  解密
+            content_bits = xor_cipher(encrypted_content, contact_key)
     
     secret_bits = [type_marker] + content_bits  # 重組完整位元（用於計算 total_bits）
 
     # 步驟 5：將機密位元轉回原始內容
-    if secret_type == 'text':
-        secret = binary_to_text(content_bits)
-        info = {
-            'type': 'text', 
-            'length': len(secret),
-            'type_marker': type_marker,
-            'total_bits': len(secret_bits),
-            'content_bits': len(content_bits)
-        }
-    else:
-        try:
-            secret, size, is_color = binary_to_image(content_bits)
+    with stage('decode', bits=len(content_bits)):
+        if secret_type == 'text':
+            secret = binary_to_text(content_bits)
             info = {
-                'type': 'image', 
-                'size': size, 
-                'is_color': is_color,
+                'type': 'text', 
+                'length': len(secret),
+                'codec': text_codec_name(bits_to_bytes(content_bits)),
                 'type_marker': type_marker,
                 'total_bits': len(secret_bits),
                 'content_bits': len(content_bits)
             }
-        except Exception as e:
-            # 解碼失敗（Z 碼損壞或載體圖像完全不對）→ 生成 64×64 亂碼圖像
-            # 註：選錯對象不會進入這裡，只是圖像內容變亂碼（尺寸正確）
-            noise_size = 64
-            noise_data = bytes([content_bits[i % len(content_bits)] * 255 if i < len(content_bits) else 128 
-                               for i in range(noise_size * noise_size)])
-            secret = Image.frombytes('L', (noise_size, noise_size), noise_data)
-            info = {
-                'type': 'image',
-                'size': (noise_size, noise_size),
-                'is_color': False,
-                'type_marker': type_marker,
-                'total_bits': len(secret_bits),
-                'content_bits': len(content_bits),
-                'error': f'解碼失敗（Z 碼損壞或載體圖像不對）: {str(e)[:50]}'
-            }
+        else:
+            try:
+                if payload_header is not None and payload_header['type'] == PAYLOAD_TYPE_IMAGE_FILE:
+                    secret = decode_image_file(bits_to_bytes(content_bits))
+                    size, is_color = secret.size, secret.mode not in ['L', '1', 'LA']
+                elif payload_header is None or payload_header['type'] == PAYLOAD_TYPE_IMAGE_RAW:
+                    progressive = payload_header is not None and bool(payload_header['flags'] & PAYLOAD_FLAG_PROGRESSIVE)
+                    # 尺寸要先和內容長度比對：選錯對象時舊版圖像的 header 可能是數萬×數萬，逐像素解碼會卡住
+                    image_bits = raw_image_bits(*read_raw_image_header(content_bits))
+                    if image_bits > len(content_bits) or (progressive and image_bits != len(content_bits)):
+                        raise ValueError("圖像 header 的尺寸與內容長度不符")
+                    secret, size, is_color = binary_to_image(content_bits, progressive)
+                else:
+                    raise ValueError(f"未知的內容類型: {payload_header['type']}")
+                info = {
+                    'type': 'image', 
+                    'size': size, 
+                    'is_color': is_color,
+                    'type_marker': type_marker,
+                    'total_bits': len(secret_bits),
+                    'content_bits': len(content_bits)
+                }
+                if payload_header is not None and payload_header['type'] == PAYLOAD_TYPE_IMAGE_FILE:
+                    info['codec'] = (secret.format or '').lower()
+            except Exception as e:
+                # 解碼失敗（Z 碼損壞或載體圖像完全不對）→ 生成 64×64 亂碼圖像
+                # 註：選錯對象不會進入這裡，只是圖像內容變亂碼（尺寸正確）
+                noise_size = 64
+                noise_data = bytes([content_bits[i % len(content_bits)] * 255 if i < len(content_bits) else 128 
+                                   for i in range(noise_size * noise_size)])
+                secret = Image.frombytes('L', (noise_size, noise_size), noise_data)
+                info = {
+                    'type': 'image',
+                    'size': (noise_size, noise_size),
+                    'is_color': False,
+                    'type_marker': type_marker,
+                    'total_bits': len(secret_bits),
+                    'content_bits': len(content_bits),
+                    'error': f'解碼失敗（Z 碼損壞或載體圖像不對）: {str(e)[:50]}'
+                }
     
+    if plausibility is not None:
+        info['plausibility'] = plausibility
     return secret, info
 
-# 自動偵測類型並提取（重用 extract_secret）
-def detect_and_extract(cover_image, z_bits, contact_key=None):
+# 自動偵測類型並提取（extract_secret 依類型標記 / 擴充 header 判斷）
+def detect_and_extract(cover_image, z_bits, contact_key=None, backend=None, early_abort=False, rounding=None):
     """
     功能:
         自動偵測機密類型並提取
@@ -179,6 +371,9 @@ def detect_and_extract(cover_image, z_bits, contact_key=None):
         cover_image: 載體圖像
         z_bits: Z 碼位元列表
         contact_key: 對象專屬密鑰（字串），用於解密
+        backend: 運算後端名稱（見 extract_secret）
+        early_abort: 開頭內容格式不合時提早停止（見 extract_secret）
+        rounding: 彩色載體轉灰階的方式（見 extract_secret）
     
     返回:
         secret: 機密內容
@@ -186,25 +381,194 @@ def detect_and_extract(cover_image, z_bits, contact_key=None):
         info: 額外資訊（機密內容的相關資訊）
     
     原理:
-        1. 從第一個區塊提取 type_marker（第 1 個 bit）
-           類型標記: 0 = 文字, 1 = 圖像
-        2. 根據 type_marker 呼叫 extract_secret
-    """
-    # 圖像預處理（轉灰階）
-    cover_image = convert_to_grayscale(cover_image)
-    
-    # 從第一個區塊提取 type_marker
-    block = cover_image[0:BLOCK_SIZE, 0:BLOCK_SIZE]                      # 取第一個 8×8 區塊
-    Q = generate_Q_from_block(block, Q_LENGTH, contact_key=contact_key)
-    averages_21 = calculate_hierarchical_averages(block)
-    reordered = apply_Q_three_rounds(averages_21, Q)
-    msbs = get_msbs(reordered)
-    type_marker = map_from_z(z_bits[0], msbs[0])                         # 用 (Z, MSB) 還原第 1 個 bit
-    
-    # 根據類型呼叫 extract_secret
-    if type_marker == 0:
-        secret, info = extract_secret(cover_image, z_bits, secret_type='text', contact_key=contact_key)
-        return secret, 'text', info
+        extract_secret 還原開頭區塊時就讀出類型（secret_type=None）：
+        擴充 header 的 Z 碼依 header 中的內容類型，舊版 Z 碼依類型標記（0 = 文字, 1 = 圖像）；
+        載體只轉一次灰階、每個區塊只還原一次
+    """
+    secret, info = extract_secret(cover_image, z_bits, secret_type=None, contact_key=contact_key, backend=backend,
+                                  early_abort=early_abort, rounding=rounding)
+    return secret, info['type'], info
+
+# 提取一段內容（只還原涵蓋的區塊）
+def payload_layout(head, total_bits, contact_key=None):
+    """
+    功能:
+        從開頭區塊判斷機密內容在 Z 碼中的位置
+    
+    參數:
+        head: 開頭區塊還原、尚未解密的位元（至少 KEY_CHECK_BLOCKS 個區塊，Z 碼較短時為全部）
+        total_bits: Z 碼可用的位元數（不超過載體容量）
+        contact_key: 對象專屬密鑰（有密鑰檢查碼時用來檢查）
+    
+    返回:
+        dict:
+            - type: 'text' 或 'image'
+            - payload_type: config.PAYLOAD_TYPE_*（舊版格式依類型標記）
+            - flags: 擴充 header 的旗標（舊版格式為 0）
+            - start: 內容第一個位元在 Z 碼中的位置
+            - length: 內容位元數
+            - xor_start: 內容中從第幾個位元開始加密（舊版圖像的 34 bits header 不加密）
+            - counter: 是否為計數器模式的密鑰流
+    
+    例外:
+        密鑰檢查碼不符、擴充 header 無法解析（對象或載體選錯）時拋出 ValueError
+    """
+    type_marker = head[0]
+    try:
+        payload_header = parse_payload_header(head[1:]) if type_marker == 1 else None
+    except ValueError:
+        raise ValueError(GARBLED_MESSAGE) from None
+    if payload_header is None:
+        # 舊版格式：內容一直到 Z 碼結尾
+        return {'type': 'image' if type_marker == 1 else 'text',
+                'payload_type': PAYLOAD_TYPE_IMAGE_RAW if type_marker == 1 else PAYLOAD_TYPE_TEXT, 'flags': 0,
+                'start': TYPE_MARKER_SIZE,
+                'length': total_bits - TYPE_MARKER_SIZE, 'xor_start': IMAGE_HEADER_SIZE if type_marker == 1 else 0,
+                'counter': False}
+    
+    start = TYPE_MARKER_SIZE + EXTENDED_HEADER_SIZE
+    if payload_header['flags'] & PAYLOAD_FLAG_KEY_TAG:
+        if read_key_tag(head, contact_key) is False:
+            raise ValueError(KEY_MISMATCH_MESSAGE)
+        start += KEY_TAG_SIZE
+    return {'type': 'text' if payload_header['type'] == PAYLOAD_TYPE_TEXT else 'image',
+            'payload_type': payload_header['type'], 'flags': payload_header['flags'], 'start': start,
+            'length': min(payload_header['length'], max(total_bits - start, 0)), 'xor_start': 0,
+            'counter': bool(payload_header['flags'] & PAYLOAD_FLAG_SEEKABLE)}
+
+def extract_range(cover_image, z_bits, start_byte, end_byte=None, contact_key=None, backend=None, rounding=None):
+    """
+    功能:
+        只提取機密內容的第 start_byte ~ end_byte 個 byte（例如圖像的開頭幾列、大圖檔的一部分）
+    
+    參數:
+        cover_image: 載體圖像
+        z_bits: Z 碼位元列表
+        start_byte: 起始 byte（含）
+        end_byte: 結束 byte（不含），None 表示到內容結尾
+        contact_key: 對象專屬密鑰（字串），用於解密
+        backend: 運算後端名稱（見 extract_secret）
+        rounding: 彩色載體轉灰階的方式（見 extract_secret）
+    
+    返回:
+        data: 解密後、尚未解碼的內容 bytes（文字為文字編碼後的 bytes，圖像為像素或圖檔 bytes）
+        info: dict
+            - type: 'text' 或 'image'
+            - payload_type, flags: 內容類型與旗標（見 payload_layout）
+            - start_byte, end_byte: 實際提取的範圍（超過內容長度時截短）
+            - content_bytes: 內容總 bytes 數（內容位元數不是 8 的倍數時，最後一個 byte 尾端補 0）
+            - blocks: 還原的區塊數（開頭區塊 + 範圍涵蓋的區塊）
+    
+    例外:
+        Z 碼有密鑰檢查碼且密鑰不對時拋出 ValueError
+    
+    原理:
+        內容第 i 個位元在 Z 碼中的位置固定（start + i），位於第 (start + i) ÷ 21 個區塊，
+        所以一段 bytes 只需要還原涵蓋的連續區塊（engine 的 first_block）；
+        擴充 header 的 Z 碼用計數器模式的密鑰流，直接跳到該位置解密
+        （舊版雜湊鏈要從頭算 hash，但不必還原前面的區塊）
+    
+    內容範圍（bytes 從內容第一個位元起算，每 8 bits 一個 byte）:
+        舊版文字: 類型標記之後的 UTF-8
+        舊版圖像: 類型標記之後的 34 bits header + 像素（header 不加密，所以像素不是從整數 byte 開始）
+        擴充 header: header（和檢查碼）之後的內容
+    """
+    if start_byte < 0 or (end_byte is not None and end_byte < start_byte):
+        raise ValueError(f"提取範圍不正確: {start_byte} ~ {end_byte}")
+    cover_image = convert_to_grayscale(cover_image, rounding)
+    height, width = validate_image_size(cover_image)
+    capacity_blocks = (height // BLOCK_SIZE) * (width // BLOCK_SIZE)
+    total_bits = min(len(z_bits), capacity_blocks * TOTAL_AVERAGES_PER_UNIT)
+    if total_bits < 1:
+        raise ValueError("提取的位元數不足，無法讀取類型標記")
+    
+    backend = get_backend(backend)
+    head_blocks = min(KEY_CHECK_BLOCKS, capacity_blocks)
+    head = decode_head(cover_image, z_bits, head_blocks, contact_key, backend)
+    layout = payload_layout(head, total_bits, contact_key)
+    
+    # 範圍截到內容結尾
+    content_bytes = math.ceil(layout['length'] / 8)
+    end_byte = content_bytes if end_byte is None else min(end_byte, content_bytes)
+    start_byte = min(start_byte, end_byte)
+    info = {'type': layout['type'], 'payload_type': layout['payload_type'], 'flags': layout['flags'],
+            'start_byte': start_byte, 'end_byte': end_byte,
+            'content_bytes': content_bytes, 'blocks': head_blocks}
+    if start_byte == end_byte:
+        return b'', info
+    
+    # 涵蓋範圍的區塊（開頭區塊已還原的部分直接使用）
+    first_bit = layout['start'] + start_byte * 8
+    last_bit = layout['start'] + min(end_byte * 8, layout['length'])
+    first_block = first_bit // TOTAL_AVERAGES_PER_UNIT
+    last_block = math.ceil(last_bit / TOTAL_AVERAGES_PER_UNIT)
+    # （有密鑰檢查碼時開頭區塊不用密鑰，一定要沿用 decode_head 的結果）
+    if last_block <= head_blocks:
+        encrypted = head[first_bit:last_bit]
     else:
-        secret, info = extract_secret(cover_image, z_bits, secret_type='image', contact_key=contact_key)
-        return secret, 'image', info
+        first_block = max(first_block, head_blocks)
+        num_blocks = last_block - first_block
+        plane = backend.msb_plane(cover_image, num_blocks, contact_key, first_block=first_block)
+        block_bits = backend.xor_plane(z_bits[first_block * TOTAL_AVERAGES_PER_UNIT:last_block * TOTAL_AVERAGES_PER_UNIT], plane)
+        offset = first_bit - first_block * TOTAL_AVERAGES_PER_UNIT
+        if offset < 0:
+            encrypted = head[first_bit:] + block_bits[:last_bit - first_block * TOTAL_AVERAGES_PER_UNIT]
+        else:
+            encrypted = block_bits[offset:offset + last_bit - first_bit]
+        info['blocks'] += num_blocks
+    
+    # 解密：內容位元 i ≥ xor_start 對應密鑰流第 i - xor_start 個位元
+    content_bits = list(encrypted)
+    split = max(layout['xor_start'] - start_byte * 8, 0)
+    if split < len(content_bits):
+        content_bits[split:] = xor_cipher(content_bits[split:], contact_key,
+                                          offset=start_byte * 8 + split - layout['xor_start'], counter=layout['counter'])
+    content_bits += [0] * (-len(content_bits) % 8)  # 逐像素圖像有 34 bits header，最後一個 byte 可能不滿 8 bits
+    return bits_to_bytes(content_bits), info
+
+def extract_preview(cover_image, z_bits, fraction=PREVIEW_FRACTION, contact_key=None, backend=None, rounding=None):
+    """
+    功能:
+        只提取逐像素圖像機密的開頭一部分，畫出預覽（完整提取前先顯示）
+    
+    參數:
+        cover_image: 載體圖像
+        z_bits: Z 碼位元列表
+        fraction: 解出內容的比例（0~1）
+        contact_key: 對象專屬密鑰（字串），用於解密
+        backend: 運算後端名稱（見 extract_secret）
+        rounding: 彩色載體轉灰階的方式（見 extract_secret）
+    
+    返回:
+        preview: PIL Image（原尺寸；不是逐像素圖像機密時為 None）
+        info: extract_range 的資訊，另加
+            - progressive: 是否為漸進式順序
+    
+    例外:
+        Z 碼有密鑰檢查碼且密鑰不對時拋出 ValueError
+    
+    原理:
+        漸進式圖像（旗標 PAYLOAD_FLAG_PROGRESSIVE）開頭是每 8×8 一個像素，解出幾 % 就能畫出整張低解析度的圖；
+        舊版掃描順序只能畫出上方幾列
+    """
+    cover_image = convert_to_grayscale(cover_image, rounding)
+    height, width = validate_image_size(cover_image)
+    capacity_blocks = (height // BLOCK_SIZE) * (width // BLOCK_SIZE)
+    total_bits = min(len(z_bits), capacity_blocks * TOTAL_AVERAGES_PER_UNIT)
+    if total_bits < 1:
+        raise ValueError("提取的位元數不足，無法讀取類型標記")
+    head = decode_head(cover_image, z_bits, min(KEY_CHECK_BLOCKS, capacity_blocks), contact_key, get_backend(backend))
+    layout = payload_layout(head, total_bits, contact_key)
+    progressive = bool(layout['flags'] & PAYLOAD_FLAG_PROGRESSIVE)
+    if layout['payload_type'] != PAYLOAD_TYPE_IMAGE_RAW:
+        return None, dict(layout, progressive=progressive)
+    
+    # 至少要涵蓋 34 bits 的圖像 header
+    end_byte = max(math.ceil(layout['length'] * min(max(fraction, 0), 1) / 8), math.ceil(IMAGE_HEADER_SIZE / 8))
+    data, info = extract_range(cover_image, z_bits, 0, end_byte, contact_key=contact_key, backend=backend)
+    bits = bytes_to_bits(data)
+    if len(bits) < IMAGE_HEADER_SIZE or raw_image_bits(*read_raw_image_header(bits)) != layout['length']:
+        raise ValueError(GARBLED_MESSAGE)  # 尺寸與 Z 碼長度不符（對象或載體選錯），不畫預覽
+    preview, _, _ = binary_to_image(bits, progressive)
+    info['progressive'] = progressive
+    return preview, info
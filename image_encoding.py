@@ -5,6 +5,7 @@ import numpy as np
 import math
 from PIL import Image
 
+from config import Z_FAST_DECODE_STYLE_BIT
 from binary_operations import int_to_binary, binary_to_int
 
 # ==================== 基礎版（供 main.py 使用）====================
@@ -90,7 +91,7 @@ def image_to_z(image, original_bit_length=None):
     return z_bits
   
 # ==================== 含 Header 版（供 interface.py 使用）====================
-def z_to_image_with_header(z_bits, style_num, img_num, img_size):
+def z_to_image_with_header(z_bits, style_num, img_num, img_size, fast_decode=False):
     """
     功能:
         將 Z 碼編碼成灰階圖像（含 header 資訊）
@@ -100,6 +101,7 @@ def z_to_image_with_header(z_bits, style_num, img_num, img_size):
         style_num: 風格編號（1~5）
         img_num: 圖像編號（1~7）
         img_size: 圖像尺寸（64, 128, 256...）
+        fast_decode: 載體是否用快速灰階解碼（見 image_library.decode_cover_gray）
     
     返回:
         image: PIL Image（灰階）
@@ -107,6 +109,7 @@ def z_to_image_with_header(z_bits, style_num, img_num, img_size):
     
     Header 結構（共 72 bits）:
         [32 bits Z碼長度] + [8 bits 風格編號] + [16 bits 圖像編號] + [16 bits 尺寸]
+        快速解碼的載體：風格編號的最高位元（Z_FAST_DECODE_STYLE_BIT）為 1
     
     完整結構:
         [Header 72 bits] + [Z碼] + [補齊]
@@ -116,7 +119,7 @@ def z_to_image_with_header(z_bits, style_num, img_num, img_size):
     # 建立 header（72 bits）
     header_bits = []
     header_bits += int_to_binary(length, 32)    # Z碼長度: 32 bits
-    header_bits += int_to_binary(style_num, 8)  # 風格編號: 8 bits
+    header_bits += int_to_binary(style_num | (Z_FAST_DECODE_STYLE_BIT if fast_decode else 0), 8)  # 風格編號: 8 bits
     header_bits += int_to_binary(img_num, 16)   # 圖像編號: 16 bits
     header_bits += int_to_binary(img_size, 16)  # 圖像尺寸: 16 bits
     
@@ -163,9 +166,11 @@ def image_to_z_with_header(image):
         style_num: 風格編號
         img_num: 圖像編號
         img_size: 圖像尺寸
+        fast_decode: 載體是否用快速灰階解碼
     
     Header 結構（共 72 bits）:
         [32 bits Z碼長度] + [8 bits 風格編號] + [16 bits 圖像編號] + [16 bits 尺寸]
+        風格編號的最高位元為快速解碼旗標
     """
     # 確保是灰階圖像
     if image.mode != 'L':
@@ -186,7 +191,9 @@ def image_to_z_with_header(image):
     
     # 解析 header
     z_length = binary_to_int(all_bits[:32])     # Z碼長度
-    style_num = binary_to_int(all_bits[32:40])  # 風格編號
+    style_field = binary_to_int(all_bits[32:40])  # 風格編號（最高位元：快速解碼旗標）
+    style_num = style_field & ~Z_FAST_DECODE_STYLE_BIT
+    fast_decode = bool(style_field & Z_FAST_DECODE_STYLE_BIT)
     img_num = binary_to_int(all_bits[40:56])    # 圖像編號
     img_size = binary_to_int(all_bits[56:72])   # 圖像尺寸
     
@@ -197,4 +204,4 @@ def image_to_z_with_header(image):
     # 提取 Z碼
     z_bits = all_bits[72:72 + z_length]
     
-    return z_bits, style_num, img_num, img_size
+    return z_bits, style_num, img_num, img_size, fast_decode
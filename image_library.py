@@ -0,0 +1,422 @@
+# 建立 image_library.py → 載體圖片庫模組
+# 圖片庫清單、Pexels 下載（含本機磁碟快取）、載體圖像解碼（不依賴 Streamlit）
+
+import os
+import time
+import functools
+import threading
+from io import BytesIO
+
+import requests
+from PIL import Image
+
+from profiling import stage
+
+# ==================== 圖片庫設定 ====================
+STYLE_CATEGORIES = {
+    "1. 建築": "建築", 
+    "2. 動物": "動物", 
+    "3. 植物": "植物",
+    "4. 食物": "食物", 
+    "5. 交通": "交通",
+}
+
+STYLE_TO_NUM = {
+    "1. 建築": 1, "2. 動物": 2, "3. 植物": 3, "4. 食物": 4, "5. 交通": 5,
+    "建築": 1, "動物": 2, "植物": 3, "食物": 4, "交通": 5,
+}
+
+NUM_TO_STYLE = {1: "建築", 2: "動物", 3: "植物", 4: "食物", 5: "交通"}
+
+IMAGE_LIBRARY = {
+    "建築": [
+        {"id": 29493117, "name": "哈里發塔"},
+        {"id": 34132869, "name": "比薩斜塔"},
+        {"id": 16457365, "name": "埃菲爾鐵塔"},
+        {"id": 236294, "name": "聖彼得大教堂"},
+        {"id": 16681013, "name": "謝赫扎耶德大清真寺"},
+        {"id": 29144355, "name": "熨斗大樓"},
+        {"id": 1650904, "name": "泰坦尼克博物館"},
+    ],
+    "動物": [
+        {"id": 1108099, "name": "拉布拉多"},
+        {"id": 568022, "name": "白羊"},
+        {"id": 19613749, "name": "兔子"},
+        {"id": 7060929, "name": "刺蝟"},
+        {"id": 19597261, "name": "松鼠"},
+        {"id": 10386190, "name": "梅花鹿"},
+        {"id": 34954771, "name": "栗頭蜂虎"},
+    ],
+    "植物": [
+        {"id": 1048024, "name": "仙人掌"},
+        {"id": 11259955, "name": "雛菊"},
+        {"id": 6830332, "name": "櫻花"},
+        {"id": 7048610, "name": "鬱金香"},
+        {"id": 18439973, "name": "洋牡丹"},
+        {"id": 244796, "name": "木槿花"},
+        {"id": 206837, "name": "勿忘我"},
+    ],
+    "食物": [
+        {"id": 28503601, "name": "海鮮燉飯"},
+        {"id": 32538755, "name": "紅醬義大利麵"},
+        {"id": 1566837, "name": "比薩"},
+        {"id": 7245468, "name": "壽司"},
+        {"id": 4110272, "name": "水果拼盤"},
+        {"id": 6441084, "name": "草莓蛋糕"},
+        {"id": 7144558, "name": "鬆餅"},
+    ],
+    "交通": [
+        {"id": 33435422, "name": "摩托車"},
+        {"id": 1595483, "name": "自行車"},
+        {"id": 2263673, "name": "巴士"},
+        {"id": 33519108, "name": "火車"},
+        {"id": 33017407, "name": "飛機"},
+        {"id": 843633, "name": "遊艇"},
+        {"id": 586040, "name": "火箭"},
+    ],
+}
+
+# 本機磁碟快取位置（CLI、批次工作共用；可用環境變數 ECIHMSB_CACHE_DIR 指定）
+COVER_CACHE_DIR = os.environ.get('ECIHMSB_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'ecihmsb', 'covers'))
+
+# 快速灰階解碼（JPEG draft 模式）；會改變灰階數值，預設關閉（需要時設環境變數 ECIHMSB_FAST_COVER_DECODE=1）
+# 只影響嵌入：用快速模式嵌入的 Z 碼會在 header 記錄（見 config.Z_FAST_DECODE_STYLE_BIT），提取端依 header 選擇解碼方式
+FAST_COVER_DECODE = os.environ.get('ECIHMSB_FAST_COVER_DECODE', '') == '1'
+
+# 下載失敗的負快取時間（秒）：期間內同一張圖直接視為失敗，不再重試下載
+NEGATIVE_CACHE_TTL = 60
+
+# ==================== 圖片庫查詢 ====================
+def get_library_image(style_num, img_num):
+    """
+    功能:
+        由風格編號和圖像編號取得圖片庫項目
+    
+    參數:
+        style_num: 風格編號（1~5）
+        img_num: 圖像編號（1~7）
+    
+    返回:
+        dict: {"id": Pexels ID, "name": 名稱}，若不存在則返回 None
+    """
+    style_name = NUM_TO_STYLE.get(style_num)
+    images = IMAGE_LIBRARY.get(style_name, [])
+    if 1 <= img_num <= len(images):
+        return images[img_num - 1]
+    return None
+
+# ==================== 圖片下載 ====================
+def get_pexels_url(pexels_id, size):
+    """
+    功能:
+        產生 Pexels 圖片網址（由 Pexels 裁切成 size×size）
+    
+    參數:
+        pexels_id: Pexels 圖片 ID
+        size: 圖片尺寸
+    
+    返回:
+        str: 圖片網址
+    """
+    return f"https://images.pexels.com/photos/{pexels_id}/pexels-photo-{pexels_id}.jpeg?auto=compress&cs=tinysrgb&w={size}&h={size}&fit=crop"
+
+def get_cache_path(pexels_id, size):
+    """
+    功能:
+        取得圖片在本機磁碟快取的路徑
+    
+    參數:
+        pexels_id: Pexels 圖片 ID
+        size: 圖片尺寸
+    
+    返回:
+        str: 快取檔案路徑
+    """
+    return os.path.join(COVER_CACHE_DIR, f"{pexels_id}_{size}.jpeg")
+
+class SingleFlight:
+    """
+    同一個 key 同時只執行一次工作，其他同時到達的呼叫等待並共用結果
+
+    用途:
+        多個 Streamlit session（執行緒）同時要同一張還沒快取的圖時，只下載、解碼一次
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key → [完成事件, 結果, 例外]
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = [threading.Event(), None, None]
+                self._calls[key] = call
+
+        if not leader:
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+
+        try:
+            call[1] = func()
+            return call[1]
+        except BaseException as e:
+            call[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call[0].set()
+
+_inflight = SingleFlight()
+_failed_lock = threading.Lock()
+_failed_until = {}  # (pexels_id, size) → 負快取到期時間
+
+def is_recent_failure(pexels_id, size):
+    """
+    功能:
+        檢查這張圖是否在負快取期間內（最近下載失敗過）
+    
+    參數:
+        pexels_id: Pexels 圖片 ID
+        size: 圖片尺寸
+    
+    返回:
+        bool: True 表示最近失敗過，應直接使用備用圖
+    """
+    with _failed_lock:
+        expires = _failed_until.get((pexels_id, size))
+        if expires is None:
+            return False
+        if time.monotonic() < expires:
+            return True
+        del _failed_until[(pexels_id, size)]
+        return False
+
+def download_image_bytes(pexels_id, size):
+    """
+    功能:
+        實際發出 HTTP 請求下載 Pexels 圖片（失敗時記入負快取）
+    
+    參數:
+        pexels_id: Pexels 圖片 ID
+        size: 圖片尺寸
+    
+    返回:
+        bytes: 圖片的二進位資料，若下載失敗則返回 None
+    """
+    try:
+        response = requests.get(get_pexels_url(pexels_id, size), timeout=10)
+        if response.status_code == 200:
+            return response.content
+    except Exception:
+        pass
+    
+    with _failed_lock:
+        _failed_until[(pexels_id, size)] = time.monotonic() + NEGATIVE_CACHE_TTL
+    return None
+
+def fetch_image_bytes(pexels_id, size, use_disk_cache=True):
+    """
+    功能:
+        下載 Pexels 圖片（先查本機磁碟快取）
+    
+    參數:
+        pexels_id: Pexels 圖片 ID
+        size: 請求的圖片尺寸
+        use_disk_cache: 是否讀寫本機磁碟快取
+    
+    返回:
+        bytes: 圖片的二進位資料，若下載失敗則返回 None
+    
+    說明:
+        同一行程內同時要求同一張圖時只會下載一次（single-flight），
+        下載失敗後 NEGATIVE_CACHE_TTL 秒內直接返回 None
+    """
+    cache_path = get_cache_path(pexels_id, size)
+    if use_disk_cache and os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            return f.read()
+    
+    if is_recent_failure(pexels_id, size):
+        return None
+    
+    def download():
+        image_data = download_image_bytes(pexels_id, size)
+        if use_disk_cache and image_data:
+            try:
+                os.makedirs(COVER_CACHE_DIR, exist_ok=True)
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"  # 先寫暫存檔再改名，避免其他行程讀到寫一半的檔案
+                with open(tmp_path, 'wb') as f:
+                    f.write(image_data)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                pass
+        return image_data
+    
+    return _inflight.do(('fetch', pexels_id, size), download)
+
+# ==================== 載體圖像解碼 ====================
+def generate_gradient_image(size, color1, color2, direction='horizontal'):
+    """
+    功能:
+        生成漸層圖片（當網路下載失敗時的備用圖）
+    
+    參數:
+        size: 圖片尺寸
+        color1: 起始顏色 (R, G, B)
+        color2: 結束顏色 (R, G, B)
+        direction: 漸層方向 ('horizontal' 或 'vertical')
+    
+    返回:
+        img: PIL Image 物件
+    """
+    img = Image.new('RGB', (size, size))
+    for i in range(size):
+        ratio = i / size
+        r = int(color1[0] + (color2[0] - color1[0]) * ratio)
+        g = int(color1[1] + (color2[1] - color1[1]) * ratio)
+        b = int(color1[2] + (color2[2] - color1[2]) * ratio)
+        for j in range(size):
+            if direction == 'horizontal':
+                img.putpixel((i, j), (r, g, b))
+            else:
+                img.putpixel((j, i), (r, g, b))
+    return img
+
+@functools.lru_cache(maxsize=8)
+def fallback_cover_gray(size):
+    """
+    功能:
+        產生（並快取）下載失敗時使用的灰階漸層備用載體
+    
+    參數:
+        size: 圖片尺寸
+    
+    返回:
+        img_gray: 灰階 PIL Image（共用物件，使用前請 copy）
+    """
+    return generate_gradient_image(size, (100, 150, 200), (150, 200, 250)).convert('L')
+
+def decode_cover(image_data, size):
+    """
+    功能:
+        將下載的圖片資料解碼成 size×size 的 RGB 和灰階載體（顯示用，需要 RGB 時才呼叫）
+    
+    參數:
+        image_data: 圖片的二進位資料（None 表示下載失敗）
+        size: 目標圖片尺寸
+    
+    返回:
+        tuple: (RGB 圖片, 灰階圖片)，若沒有資料則返回漸層備用圖
+    """
+    if image_data:
+        img = Image.open(BytesIO(image_data)).convert('RGB')
+        if img.size[0] != size or img.size[1] != size:
+            img = img.resize((size, size), Image.LANCZOS)
+        img_gray = img.convert('L')
+        return img, img_gray
+    
+    img = generate_gradient_image(size, (100, 150, 200), (150, 200, 250))
+    return img, img.convert('L')
+
+def decode_cover_gray(image_data, size, fast=None):
+    """
+    功能:
+        只解碼嵌入/提取需要的灰階載體（不產生 RGB 圖片）
+    
+    參數:
+        image_data: 圖片的二進位資料（None 表示下載失敗）
+        size: 目標圖片尺寸
+        fast: 是否讓 libjpeg 直接輸出灰階（None 表示使用 FAST_COVER_DECODE）
+    
+    返回:
+        img_gray: 灰階 PIL Image (size×size)
+    
+    說明:
+        預設模式與 decode_cover 的灰階結果逐像素相同：
+        - 尺寸已正確：直接 RGB → L，不另外建立 RGB 圖片
+        - 灰階來源需要縮放：直接在 L 上縮放（三通道相同，結果不變）
+        - 彩色來源需要縮放：仍需先在 RGB 上縮放才能維持相同數值
+        快速模式用 Image.draft('L') 讓 JPEG 解碼時就輸出灰階（取 Y 通道並可縮小解碼），
+        速度與記憶體約減半，但灰階數值與預設模式略有差異，
+        用快速模式產生的 Z 碼，提取端也必須使用快速模式（Z 碼 header 有記錄，提取時依 header 傳入 fast）
+    """
+    if not image_data:
+        return fallback_cover_gray(size).copy()
+    
+    if fast is None:
+        fast = FAST_COVER_DECODE
+    
+    img = Image.open(BytesIO(image_data))
+    if fast and img.format == 'JPEG':
+        img.draft('L', (size, size))  # 之後的 mode 為 'L'（縮小解碼時尺寸也會變小）
+    elif img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    
+    if img.size[0] != size or img.size[1] != size:
+        if img.mode != 'L':
+            img = img.convert('RGB').resize((size, size), Image.LANCZOS)
+        else:
+            img = img.convert('L').resize((size, size), Image.LANCZOS)
+    return img.convert('L')
+
+def load_cover_gray(pexels_id, size, use_disk_cache=True, fetch=None, fast=None):
+    """
+    功能:
+        下載並解碼 Pexels 載體成灰階（同一張圖同時只處理一次）
+    
+    參數:
+        pexels_id: Pexels 圖片 ID
+        size: 圖片尺寸
+        use_disk_cache: 是否使用本機磁碟快取
+        fetch: 自訂下載函式 fetch(pexels_id, size)（例如介面的 st.cache_data 版本），
+               None 表示使用 fetch_image_bytes
+        fast: 是否用快速灰階解碼（提取時依 Z 碼 header；None 表示使用 FAST_COVER_DECODE）
+    
+    返回:
+        img_gray: 灰階 PIL Image
+    
+    說明:
+        同時到達的相同請求會等待第一個請求的下載 + 解碼結果，各自拿到一份複本
+    """
+    if fast is None:
+        fast = FAST_COVER_DECODE
+    
+    def load():
+        with stage('download') as counters:
+            if fetch is not None:
+                image_data = fetch(pexels_id, size)
+            else:
+                image_data = fetch_image_bytes(pexels_id, size, use_disk_cache)
+            counters['bytes'] = len(image_data) if image_data else 0
+        
+        with stage('cover_decode', bytes=size * size):
+            return decode_cover_gray(image_data, size, fast)
+    
+    return _inflight.do(('cover', pexels_id, size, bool(fast)), load).copy()
+
+def load_library_cover(style_num, img_num, size, use_disk_cache=True, fast=None):
+    """
+    功能:
+        從圖片庫載入載體（下載 + 解碼）
+    
+    參數:
+        style_num: 風格編號（1~5）
+        img_num: 圖像編號（1~7）
+        size: 圖片尺寸
+        use_disk_cache: 是否使用本機磁碟快取
+        fast: 是否用快速灰階解碼（見 load_cover_gray）
+    
+    返回:
+        img_gray: 灰階 PIL Image
+    
+    例外:
+        圖片庫沒有這張圖時拋出 ValueError
+    """
+    entry = get_library_image(style_num, img_num)
+    if entry is None:
+        raise ValueError(f"圖片庫沒有此圖像：風格 {style_num}、編號 {img_num}")
+    return load_cover_gray(entry["id"], size, use_disk_cache, fast=fast)
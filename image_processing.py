@@ -3,34 +3,70 @@
 
 import numpy as np
 
-from config import BLOCK_SIZE
+from config import BLOCK_SIZE, GRAYSCALE_ROUNDING, GRAYSCALE_CHUNK_ROWS
 
 # ==================== 圖像預處理 ====================
-def convert_to_grayscale(image):
+# 定點權重（16 bits 小數）：0.299、0.587、0.114 × 65536，總和剛好 65536
+GRAY_WEIGHT_R = 19595
+GRAY_WEIGHT_G = 38470
+GRAY_WEIGHT_B = 7471
+GRAY_ROUND = 1 << 15  # 0.5，四捨五入用
+
+def convert_to_grayscale(image, rounding=None):
     """
     功能:
         將彩色圖像轉成灰階（若已是灰階則不處理）
-    
+
     參數:
-        image: numpy array，灰階 (H×W) 或彩色 (H×W×3)
-    
+        image: numpy array，灰階 (H×W) 或彩色 (H×W×3 / H×W×4)
+        rounding: 'legacy'（預設）或 'pil'，None 表示使用 config.GRAYSCALE_ROUNDING
+            - 'legacy': Gray = int(0.299×R + 0.587×G + 0.114×B)（舊版浮點截斷）
+                        舊版從彩色陣列產生的 Z 碼都用此模式
+            - 'pil': Gray = (R×19595 + G×38470 + B×7471 + 32768) >> 16
+                     與 PIL 的 convert('L') 結果完全相同（整數運算較快），嵌入和提取必須用同一模式
+
     返回:
-        gray_image: numpy array，灰階圖像 (H×W)
-    
+        gray_image: numpy array，灰階圖像 (H×W)，uint8
+
     原理:
-        使用標準權重: Gray = 0.299×R + 0.587×G + 0.114×B
+        分段（每次 GRAYSCALE_CHUNK_ROWS 列）寫入預先配置的 uint8 輸出，
+        暫存只有一段大小，不會產生整張圖的 float64 陣列
     """
-    image = np.array(image)
-    
-    if len(image.shape) == 3:  # 彩色圖像
-        gray_image = (
-            0.299 * image[:, :, 0] +  # R × 0.299
-            0.587 * image[:, :, 1] +  # G × 0.587
-            0.114 * image[:, :, 2]    # B × 0.114
-        ).astype(np.uint8)
-        return gray_image
-    
-    return image  # 已是灰階，直接返回
+    image = np.asarray(image)
+
+    if len(image.shape) != 3:  # 已是灰階，直接返回
+        return np.array(image)
+
+    rounding = rounding or GRAYSCALE_ROUNDING
+    if rounding not in ('pil', 'legacy'):
+        raise ValueError(f"未知的灰階轉換模式: {rounding}")
+
+    # 非 uint8 的輸入（例如浮點陣列）沿用舊版公式
+    if image.dtype != np.uint8:
+        rounding = 'legacy'
+
+    height, width = image.shape[:2]
+    gray_image = np.empty((height, width), dtype=np.uint8)
+
+    for start in range(0, height, GRAYSCALE_CHUNK_ROWS):
+        end = min(start + GRAYSCALE_CHUNK_ROWS, height)
+        chunk = image[start:end]
+
+        if rounding == 'legacy':
+            gray_image[start:end] = (
+                0.299 * chunk[:, :, 0] +  # R × 0.299
+                0.587 * chunk[:, :, 1] +  # G × 0.587
+                0.114 * chunk[:, :, 2]    # B × 0.114
+            ).astype(np.uint8)
+        else:
+            acc = np.multiply(chunk[:, :, 0], GRAY_WEIGHT_R, dtype=np.uint32)
+            acc += np.multiply(chunk[:, :, 1], GRAY_WEIGHT_G, dtype=np.uint32)
+            acc += np.multiply(chunk[:, :, 2], GRAY_WEIGHT_B, dtype=np.uint32)
+            acc += GRAY_ROUND
+            acc >>= 16
+            gray_image[start:end] = acc
+
+    return gray_image
 
 def validate_image_size(image):
     """
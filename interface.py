@@ -5,16 +5,16 @@ import streamlit as st
 import streamlit.components.v1 as components
 import numpy as np
 from PIL import Image
-import requests
 from io import BytesIO
 import os
 import math
 import time
 import base64
 import json
-import qrcode
 import html
 
+import profiling
+
 # 延遲載入 pyzbar（較慢的套件）
 @st.cache_resource
 def load_pyzbar():
@@ -23,123 +23,105 @@ def load_pyzbar():
 
 # 載入自訂模組
 from config import *
-from embed import embed_secret, calculate_capacity
-from extract import detect_and_extract
-from secret_encoding import text_to_binary
-from text_encoding import z_to_text, text_to_z
-from image_encoding import z_to_image_with_header, image_to_z_with_header
+from embed import embed_secret, calculate_capacity, plan_embedding, find_min_cover_size
+from extract import detect_and_extract, identify_contact, extract_preview
+from text_encoding import text_to_z
+from secret_encoding import available_image_codecs
+from image_library import STYLE_CATEGORIES, STYLE_TO_NUM, NUM_TO_STYLE, IMAGE_LIBRARY
+from image_library import fetch_image_bytes, load_cover_gray, FAST_COVER_DECODE
+from rendering import ArtifactCache, render_embed_artifacts, make_thumbnail, new_result_id
+from plausibility import is_garbled_text, is_garbled_image, GARBLED
+from upload_analysis import UploadMemo, analyze_secret_image, analyze_z_code_upload, fit_secret_image, get_file_id
 
 # ==================== 輔助函數 ====================
-def is_likely_garbled_text(text):
+def get_icon_base64(icon_name):
     """
     功能:
-        檢測文字是否可能是亂碼
+        讀取 icons 資料夾的圖片並轉成 base64
     
     參數:
-        text: 要檢測的文字
+        icon_name: 圖示名稱（不含副檔名）
     
     返回:
-        bool: True 表示可能是亂碼
+        str: base64 編碼的圖片資料 URI，若檔案不存在則返回空字串
     """
-    if not text or len(text) == 0:
-        return True
-    
-    # 計算中文字符數量
-    chinese_count = 0
-    for char in text:
-        if '\u4e00' <= char <= '\u9fff':
-            chinese_count += 1
-    
-    # 如果超過 30% 是中文，認為是正常文字
-    if (chinese_count / len(text)) > 0.3:
-        return False
-    
-    # 計算「正常」字符的比例（字母、數字、空格、常見標點）
-    normal_chars = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 \n\r\t，。！？、；：""''（）')
-    normal_count = sum(1 for c in text if c in normal_chars)
-    
-    # 如果正常字符比例低於 70%，認為是亂碼
-    if (normal_count / len(text)) < 0.7:
-        return True
-    
-    return False
+    icon_path = os.path.join("icons", f"{icon_name}.png")
+    if os.path.exists(icon_path):
+        with open(icon_path, "rb") as f:
+            data = base64.b64encode(f.read()).decode()
+        return f"data:image/png;base64,{data}"
+    return ""
 
-def is_likely_garbled_image(image_data):
-    """
-    功能:
-        檢測圖像是否可能是亂碼（雜訊圖）
-    
-    參數:
-        image_data: 圖像的 bytes 資料
-    
-    返回:
-        bool: True 表示可能是亂碼
-    """
-    try:
-        img = Image.open(BytesIO(image_data))
-        img_array = np.array(img.convert('RGB'))
-        
-        # 計算相鄰像素的差異
-        h_diff = np.abs(img_array[:, 1:, :].astype(int) - img_array[:, :-1, :].astype(int))
-        v_diff = np.abs(img_array[1:, :, :].astype(int) - img_array[:-1, :, :].astype(int))
-        
-        avg_diff = (np.mean(h_diff) + np.mean(v_diff)) / 2
-        
-        # 正常圖片的平均差異通常 < 30，亂碼圖 > 60
-        return avg_diff > 50
-    except:
-        return True
+# 效能分析階段名稱（顯示用）
+STAGE_LABELS = {
+    'download': '下載載體',
+    'cover_decode': '解碼載體',
+    'grayscale': '灰階轉換',
+    'encode': '機密編碼',
+    'xor': 'XOR 加解密',
+    'blocks': '區塊運算',
+    'decode': '機密解碼',
+}
 
-def generate_gradient_image(size, color1, color2, direction='horizontal'):
+def format_timing_breakdown(timings):
     """
     功能:
-        生成漸層圖片（當網路下載失敗時的備用圖）
+        把效能分析結果轉成 HTML（結果頁顯示用）
     
     參數:
-        size: 圖片尺寸
-        color1: 起始顏色 (R, G, B)
-        color2: 結束顏色 (R, G, B)
-        direction: 漸層方向 ('horizontal' 或 'vertical')
+        timings: profiling.summarize 的結果
     
     返回:
-        img: PIL Image 物件
+        str: HTML 字串，沒有資料則返回空字串
     """
-    img = Image.new('RGB', (size, size))
-    for i in range(size):
-        ratio = i / size
-        r = int(color1[0] + (color2[0] - color1[0]) * ratio)
-        g = int(color1[1] + (color2[1] - color1[1]) * ratio)
-        b = int(color1[2] + (color2[2] - color1[2]) * ratio)
-        for j in range(size):
-            if direction == 'horizontal':
-                img.putpixel((i, j), (r, g, b))
-            else:
-                img.putpixel((j, i), (r, g, b))
-    return img
-
-def get_icon_base64(icon_name):
+    if not timings:
+        return ""
+    lines = []
+    for t in timings:
+        label = STAGE_LABELS.get(t['stage'], t['stage'])
+        extra = f"（{t['blocks']:,} 區塊）" if t.get('blocks') else ""
+        lines.append(f"{label}：{t['duration_s'] * 1000:.1f} ms{extra}")
+    return '<br>'.join(lines)
+
+def extract_overlay_html(preview, fraction):
     """
     功能:
-        讀取 icons 資料夾的圖片並轉成 base64
-    
+        提取中遮罩（含漸進式圖像的低解析度預覽）
+
     參數:
-        icon_name: 圖示名稱（不含副檔名）
-    
+        preview: PIL Image（extract.extract_preview 的結果）
+        fraction: 已解出的比例
+
     返回:
-        str: base64 編碼的圖片資料 URI，若檔案不存在則返回空字串
+        str: HTML 字串
+    """
+    buf = BytesIO()
+    preview.save(buf, format='PNG')
+    data = base64.b64encode(make_thumbnail(buf.getvalue())).decode()
+    mime = 'png' if data.startswith('iVBOR') else 'jpeg'
+    return f"""
+    <div style="position: fixed; top: 0; left: 0; right: 0; bottom: 0; background: rgba(0,0,0,0.5); z-index: 9999; display: flex; justify-content: center; align-items: center;">
+        <div style="background: white; padding: 30px 50px; border-radius: 16px; text-align: center;">
+            <div style="font-size: 32px; font-weight: bold; color: #5D6D7E; margin-bottom: 10px;">🔄 提取中...</div>
+            <img src="data:image/{mime};base64,{data}" style="width: 200px; max-height: 200px; object-fit: contain; image-rendering: pixelated; border-radius: 8px;">
+            <div style="font-size: 18px; color: #888; margin-top: 10px;">預覽（已解出 {fraction:.0%}）</div>
+        </div>
+    </div>
     """
-    icon_path = os.path.join("icons", f"{icon_name}.png")
-    if os.path.exists(icon_path):
-        with open(icon_path, "rb") as f:
-            data = base64.b64encode(f.read()).decode()
-        return f"data:image/png;base64,{data}"
-    return ""
+
+def prefix_garbled(info):
+    """提取時開頭內容的評分是否為亂碼（只供參考，顯示警告頁）"""
+    return info.get('plausibility', {}).get('verdict') == GARBLED
 
 # ==================== 全局緩存 ====================
 if 'embed_result' not in st.session_state:
     st.session_state.embed_result = None
 if 'extract_result' not in st.session_state:
     st.session_state.extract_result = None
+if 'artifact_cache' not in st.session_state:
+    st.session_state.artifact_cache = ArtifactCache()  # 結果頁產物（QR Code、Z碼圖 PNG），依結果編號快取
+if 'upload_memo' not in st.session_state:
+    st.session_state.upload_memo = UploadMemo()  # 上傳檔案的分析結果，依上傳編號 + 內容雜湊記住
 
 # ==================== 對象管理（Supabase 雲端儲存）====================
 def generate_contact_key():
@@ -282,72 +264,6 @@ def get_contact_key(contacts, name):
 if 'contacts' not in st.session_state:
     st.session_state.contacts = load_contacts()
 
-# ==================== 圖片庫設定 ====================
-STYLE_CATEGORIES = {
-    "1. 建築": "建築", 
-    "2. 動物": "動物", 
-    "3. 植物": "植物",
-    "4. 食物": "食物", 
-    "5. 交通": "交通",
-}
-
-STYLE_TO_NUM = {
-    "1. 建築": 1, "2. 動物": 2, "3. 植物": 3, "4. 食物": 4, "5. 交通": 5,
-    "建築": 1, "動物": 2, "植物": 3, "食物": 4, "交通": 5,
-}
-
-NUM_TO_STYLE = {1: "建築", 2: "動物", 3: "植物", 4: "食物", 5: "交通"}
-
-AVAILABLE_SIZES = [64, 128, 256, 512, 1024, 2048, 4096]
-
-IMAGE_LIBRARY = {
-    "建築": [
-        {"id": 29493117, "name": "哈里發塔"},
-        {"id": 34132869, "name": "比薩斜塔"},
-        {"id": 16457365, "name": "埃菲爾鐵塔"},
-        {"id": 236294, "name": "聖彼得大教堂"},
-        {"id": 16681013, "name": "謝赫扎耶德大清真寺"},
-        {"id": 29144355, "name": "熨斗大樓"},
-        {"id": 1650904, "name": "泰坦尼克博物館"},
-    ],
-    "動物": [
-        {"id": 1108099, "name": "拉布拉多"},
-        {"id": 568022, "name": "白羊"},
-        {"id": 19613749, "name": "兔子"},
-        {"id": 7060929, "name": "刺蝟"},
-        {"id": 19597261, "name": "松鼠"},
-        {"id": 10386190, "name": "梅花鹿"},
-        {"id": 34954771, "name": "栗頭蜂虎"},
-    ],
-    "植物": [
-        {"id": 1048024, "name": "仙人掌"},
-        {"id": 11259955, "name": "雛菊"},
-        {"id": 6830332, "name": "櫻花"},
-        {"id": 7048610, "name": "鬱金香"},
-        {"id": 18439973, "name": "洋牡丹"},
-        {"id": 244796, "name": "木槿花"},
-        {"id": 206837, "name": "勿忘我"},
-    ],
-    "食物": [
-        {"id": 28503601, "name": "海鮮燉飯"},
-        {"id": 32538755, "name": "紅醬義大利麵"},
-        {"id": 1566837, "name": "比薩"},
-        {"id": 7245468, "name": "壽司"},
-        {"id": 4110272, "name": "水果拼盤"},
-        {"id": 6441084, "name": "草莓蛋糕"},
-        {"id": 7144558, "name": "鬆餅"},
-    ],
-    "交通": [
-        {"id": 33435422, "name": "摩托車"},
-        {"id": 1595483, "name": "自行車"},
-        {"id": 2263673, "name": "巴士"},
-        {"id": 33519108, "name": "火車"},
-        {"id": 33017407, "name": "飛機"},
-        {"id": 843633, "name": "遊艇"},
-        {"id": 586040, "name": "火箭"},
-    ],
-}
-
 # ==================== 圖片下載與處理 ====================
 def get_recommended_size(secret_bits):
     """
@@ -360,11 +276,8 @@ def get_recommended_size(secret_bits):
     返回:
         int: 推薦的圖像尺寸（邊長）
     """
-    for size in AVAILABLE_SIZES:
-        capacity = calculate_capacity(size, size)
-        if capacity >= secret_bits:
-            return size
-    return AVAILABLE_SIZES[-1]
+    size = find_min_cover_size(secret_bits)
+    return size if size is not None else AVAILABLE_SIZES[-1]
 
 @st.cache_data(ttl=86400, show_spinner=False)
 def download_image_cached(pexels_id, size):
@@ -379,44 +292,43 @@ def download_image_cached(pexels_id, size):
     返回:
         bytes: 圖片的二進位資料，若下載失敗則返回 None
     """
-    url = f"https://images.pexels.com/photos/{pexels_id}/pexels-photo-{pexels_id}.jpeg?auto=compress&cs=tinysrgb&w={size}&h={size}&fit=crop"
-    try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            return response.content
-    except:
-        pass
-    return None
+    return fetch_image_bytes(pexels_id, size, use_disk_cache=False)
 
-def download_image_by_id(pexels_id, size):
+def download_image_by_id(pexels_id, size, fast=None):
     """
     功能:
-        下載指定 ID 和尺寸的圖片，並轉換為 RGB 和灰階版本
+        下載指定 ID 和尺寸的圖片，並解碼成處理用的灰階載體
     
     參數:
         pexels_id: Pexels 圖片 ID
         size: 目標圖片尺寸
+        fast: 是否用快速灰階解碼（提取時依 Z 碼標頭；None 表示 FAST_COVER_DECODE）
     
     返回:
-        tuple: (RGB 圖片, 灰階圖片)，若下載失敗則返回漸層備用圖
-    """
-    image_data = download_image_cached(pexels_id, size)
-    
-    if image_data:
-        img = Image.open(BytesIO(image_data)).convert('RGB')
-        if img.size[0] != size or img.size[1] != size:
-            img = img.resize((size, size), Image.LANCZOS)
-        img_gray = img.convert('L')
-        return img, img_gray
+        灰階 PIL Image，若下載失敗則返回漸層備用圖
     
-    img = generate_gradient_image(size, (100, 150, 200), (150, 200, 250))
-    return img, img.convert('L')
+    註:
+        頁面上的載體預覽直接使用 Pexels 網址，處理流程不需要 RGB 版本
+        多個 session 同時要同一張圖時只下載、解碼一次
+    """
+    return load_cover_gray(pexels_id, size, fetch=download_image_cached, fast=fast)
+
+def decode_qr_upload(image):
+    """pyzbar 解碼（第一次呼叫時才載入 pyzbar）"""
+    return load_pyzbar()(image)
 
 # ==================== 圖像容量計算 ====================
+TEXT_CODEC = 'auto'  # 文字機密自動選最短的編碼（短訊息多半能壓縮，較容易放進單一 QR Code）
+AUTO_CONTACT = "自動偵測"  # 提取時不確定對象：所有對象一次試解 Z 碼開頭，找出收件人
+KEY_TAG = True       # 加上密鑰檢查碼（提取時選錯對象立即顯示，不必解完整個 Z 碼）
+PROGRESSIVE = True   # 逐像素圖像用漸進式順序（提取時先顯示整張低解析度預覽）
+PREVIEW_STEPS = (0.03, 0.2)  # 提取圖像時依序預覽的比例，之後才完整提取
+IMAGE_CODEC_LABELS = {'raw': '原始像素（不壓縮）', 'png': 'PNG 無損壓縮', 'webp': 'WebP 無損壓縮', 'jpeg': 'JPEG 有損壓縮'}
+
 def calculate_required_bits_for_image(image):
     """
     功能:
-        計算圖像作為機密時所需的位元數
+        計算圖像作為機密時所需的位元數（只讀 header，不編碼）
     
     參數:
         image: PIL Image 物件
@@ -424,31 +336,8 @@ def calculate_required_bits_for_image(image):
     返回:
         tuple: (所需位元數, 圖像尺寸)
     """
-    size, mode = image.size, image.mode
-    is_color = mode not in ['L', '1', 'LA']
-    
-    # 判斷是否有透明通道
-    if not is_color:
-        has_alpha = False
-    elif mode == 'P':
-        temp_img = image.convert('RGBA')
-        alpha_channel = temp_img.split()[-1]
-        has_alpha = alpha_channel.getextrema()[0] < 255
-    elif mode in ['RGBA', 'PA']:
-        has_alpha = True
-    else:
-        has_alpha = False
-    
-    # 計算所需位元數
-    header_bits = 34
-    if is_color:
-        bits_per_pixel = 32 if has_alpha else 24
-    else:
-        bits_per_pixel = 8
-    
-    required_bits = header_bits + size[0] * size[1] * bits_per_pixel
-    
-    return required_bits, size
+    plan = plan_embedding(image, 'image')
+    return plan['required_bits'], image.size
 
 # ==================== Streamlit 頁面配置 ====================
 # 設定頁面標題、圖示、寬螢幕模式、隱藏側邊欄
@@ -1510,67 +1399,31 @@ elif st.session_state.current_mode == 'embed':
                 <b>{secret_display}</b>
             </div>
             ''', unsafe_allow_html=True)
+            
+            # 各階段耗時
+            timing_html = format_timing_breakdown(r.get('timings'))
+            if timing_html:
+                st.markdown(f'<p style="font-size: 18px; color: #888; line-height: 1.6; margin-top: 15px;">{timing_html}</p>', unsafe_allow_html=True)
 
         # ----- 右欄：Z碼圖 + 下載按鈕 -----
         with col_right:
-            # 文字機密 → 優先生成 QR Code，失敗則用圖像 Z碼
-            if r['embed_secret_type'] == "文字":
-                z_text = z_to_text(r['z_bits'])
-                style_num = r.get("style_num", 1)
-                img_num = r["embed_image_choice"].split("-")[1]
-                img_size = r["embed_image_choice"].split("-")[2]
-                # 格式: 風格編號-圖像編號-尺寸|Z碼
-                qr_content = f"{style_num}-{img_num}-{img_size}|{z_text}"
-                
-                try:
-                    # 嘗試生成 QR Code
-                    qr = qrcode.QRCode(version=None, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=2)
-                    qr.add_data(qr_content)
-                    qr.make(fit=True)
-                    qr_pil = qr.make_image(fill_color="black", back_color="white").convert('RGB')
-                    
-                    buf = BytesIO()
-                    qr_pil.save(buf, format='PNG')
-                    qr_bytes = buf.getvalue()
-                    
-                    st.markdown('<p style="font-size: 38px; font-weight: bold; color: #443C3C; margin-bottom: 25px;">Z碼圖</p>', unsafe_allow_html=True)
-                    st.image(qr_bytes, width=200)
-                    st.download_button("下載 Z碼圖", qr_bytes, "z_code.png", "image/png", key="dl_z_qr")
-                    st.markdown('<p style="font-size: 38px; color: #443C3C; margin-top: 25px; margin-bottom: 0;">傳送 Z碼圖給對方</p>', unsafe_allow_html=True)
-                    st.markdown('<p style="font-size: 30px; color: #888; margin-top: 5px; white-space: nowrap;">接收方需要此 Z碼圖才能提取機密</p>', unsafe_allow_html=True)
-                except:
-                    # QR Code 失敗（資料太多），改用圖像 Z碼
-                    style_num_int = int(style_num)
-                    img_num_int = int(img_num)
-                    img_size_int = int(img_size)
-                    z_img, _ = z_to_image_with_header(r['z_bits'], style_num_int, img_num_int, img_size_int)
-                    
-                    st.markdown('<p style="font-size: 38px; font-weight: bold; color: #443C3C; margin-bottom: 25px;">Z碼圖</p>', unsafe_allow_html=True)
-                    st.image(z_img, width=200)
-                    buf = BytesIO()
-                    z_img.save(buf, format='PNG')
-                    st.download_button("下載 Z碼圖", buf.getvalue(), "z_code.png", "image/png", key="dl_z_img_fallback")
-                    st.markdown('<p style="font-size: 38px; color: #443C3C; margin-top: 25px; margin-bottom: 0;">傳送 Z碼圖給對方</p>', unsafe_allow_html=True)
-                    st.markdown('<p style="font-size: 30px; color: #888; margin-top: 5px; white-space: nowrap;">接收方需要此 Z碼圖才能提取機密</p>', unsafe_allow_html=True)
-            else:
-                # 圖像機密 → 直接用圖像 Z碼
-                style_num = r.get("style_num", 1)
-                img_num = int(r["embed_image_choice"].split("-")[1])
-                img_size = int(r["embed_image_choice"].split("-")[2])
-                z_img, _ = z_to_image_with_header(r['z_bits'], style_num, img_num, img_size)
-                
-                st.markdown('<p style="font-size: 38px; font-weight: bold; color: #443C3C; margin-bottom: 25px;">Z碼圖</p>', unsafe_allow_html=True)
-                st.image(z_img, width=200)
-                buf = BytesIO()
-                z_img.save(buf, format='PNG')
-                st.download_button("下載 Z碼圖", buf.getvalue(), "z_code.png", "image/png", key="dl_z_img")
-                st.markdown('<p style="font-size: 38px; color: #443C3C; margin-top: 25px; margin-bottom: 0;">傳送 Z碼圖給對方</p>', unsafe_allow_html=True)
-                st.markdown('<p style="font-size: 30px; color: #888; margin-top: 5px; white-space: nowrap;">接收方需要此 Z碼圖才能提取機密</p>', unsafe_allow_html=True)
+            # 文字機密 → 優先生成 QR Code，失敗則用圖像 Z碼；圖像機密 → 直接用圖像 Z碼
+            # 只在第一次顯示時產生，之後的 rerun 直接用快取
+            z_code = st.session_state.artifact_cache.get(r['result_id'], 'z_code', lambda: render_embed_artifacts(r))
+            download_key = {'qr': 'dl_z_qr', 'image_fallback': 'dl_z_img_fallback', 'image': 'dl_z_img'}[z_code['kind']]
+
+            st.markdown('<p style="font-size: 38px; font-weight: bold; color: #443C3C; margin-bottom: 25px;">Z碼圖</p>', unsafe_allow_html=True)
+            z_preview = st.session_state.artifact_cache.get(r['result_id'], 'z_code_preview', lambda: make_thumbnail(z_code['png']))
+            st.image(z_preview, width=200)
+            st.download_button("下載 Z碼圖", z_code['png'], "z_code.png", "image/png", key=download_key)
+            st.markdown('<p style="font-size: 38px; color: #443C3C; margin-top: 25px; margin-bottom: 0;">傳送 Z碼圖給對方</p>', unsafe_allow_html=True)
+            st.markdown('<p style="font-size: 30px; color: #888; margin-top: 5px; white-space: nowrap;">接收方需要此 Z碼圖才能提取機密</p>', unsafe_allow_html=True)
         
         # ----- 返回首頁按鈕 -----
         _, btn_col, _ = st.columns([1, 1, 1])
         with btn_col:
             if st.button("返回首頁", key="back_to_home_from_embed", type="primary"):
+                st.session_state.artifact_cache.evict(r['result_id'])
                 st.session_state.embed_page = 'input'
                 st.session_state.embed_result = None
                 st.session_state.embed_step = 1
@@ -1745,7 +1598,7 @@ elif st.session_state.current_mode == 'embed':
                 with tab_col1:
                     if st.button("文字", key="tab_text_btn", use_container_width=True, type="primary" if saved_type == "文字" else "secondary"):
                         if saved_type != "文字":
-                            for key in ['embed_secret_image_data', 'embed_secret_image_name']:
+                            for key in ['embed_secret_image_data', 'embed_secret_image_name', 'embed_secret_image_file_id', 'embed_secret_fit']:
                                 if key in st.session_state:
                                     del st.session_state[key]
                             st.session_state.secret_bits_saved = 0
@@ -1769,7 +1622,7 @@ elif st.session_state.current_mode == 'embed':
                     embed_text_raw = st.text_area("輸入機密", value=saved_text, placeholder="輸入機密訊息...", height=150, key="embed_text_h", label_visibility="collapsed")
                     if embed_text_raw and embed_text_raw.strip():
                         embed_text = embed_text_raw.strip()
-                        secret_bits_needed = len(text_to_binary(embed_text))
+                        secret_bits_needed = plan_embedding(embed_text, 'text', text_codec=TEXT_CODEC, key_tag=KEY_TAG)['required_bits']
                         st.session_state.secret_bits_saved = secret_bits_needed
                         st.session_state.embed_text_saved = embed_text
                         st.session_state.embed_secret_type_saved = "文字"
@@ -1784,24 +1637,30 @@ elif st.session_state.current_mode == 'embed':
                 # ----- 圖像上傳 -----
                 else:
                     embed_img_file = st.file_uploader("上傳圖像", type=["jpg", "jpeg", "png"], key="embed_img_h", label_visibility="collapsed")
+                    image_codec = st.selectbox("圖像編碼", available_image_codecs(), format_func=IMAGE_CODEC_LABELS.get, key="embed_image_codec")
+                    analyze_with_codec = lambda data: analyze_secret_image(data, image_codec, key_tag=KEY_TAG, progressive=PROGRESSIVE)
                     if embed_img_file:
-                        embed_img_file.seek(0)
-                        secret_img = Image.open(embed_img_file)
-                        secret_bits_needed, _ = calculate_required_bits_for_image(secret_img)
+                        secret_img_data = embed_img_file.getvalue()
+                        secret_info = st.session_state.upload_memo.get(f'secret_image:{image_codec}', secret_img_data, analyze_with_codec,
+                                                                       file_id=get_file_id(embed_img_file))
+                        secret_bits_needed = secret_info['required_bits']
                         st.session_state.secret_bits_saved = secret_bits_needed
                         st.session_state.embed_secret_type_saved = "圖像"
-                        embed_img_file.seek(0)
-                        st.session_state.embed_secret_image_data = embed_img_file.read()
+                        st.session_state.embed_secret_image_data = secret_img_data
                         st.session_state.embed_secret_image_name = embed_img_file.name
-                        st.image(secret_img, width=180)
-                        st.markdown(f'<div class="bits-info">機密圖像：{st.session_state.embed_secret_image_name} ({secret_img.size[0]}×{secret_img.size[1]} px)<br>所需容量：{secret_bits_needed:,} bits</div>', unsafe_allow_html=True)
+                        st.session_state.embed_secret_image_file_id = get_file_id(embed_img_file)
+                        st.image(st.session_state.upload_memo.get('preview', secret_img_data, make_thumbnail), width=180)
+                        st.markdown(f'<div class="bits-info">機密圖像：{st.session_state.embed_secret_image_name} ({secret_info["size"][0]}×{secret_info["size"][1]} px)<br>所需容量：{secret_bits_needed:,} bits</div>', unsafe_allow_html=True)
                         step2_done = True
                     elif st.session_state.get('embed_secret_image_data'):
                         # 已上傳的圖像（從 session_state 讀取）
-                        secret_img = Image.open(BytesIO(st.session_state.embed_secret_image_data))
-                        st.image(secret_img, width=180)
+                        secret_img_data = st.session_state.embed_secret_image_data
+                        secret_info = st.session_state.upload_memo.get(f'secret_image:{image_codec}', secret_img_data, analyze_with_codec,
+                                                                       file_id=st.session_state.get('embed_secret_image_file_id'))
+                        st.session_state.secret_bits_saved = secret_info['required_bits']
+                        st.image(st.session_state.upload_memo.get('preview', secret_img_data, make_thumbnail), width=180)
                         secret_img_name = st.session_state.get('embed_secret_image_name', 'image.png')
-                        st.markdown(f'<div class="bits-info">機密圖像：{secret_img_name} ({secret_img.size[0]}×{secret_img.size[1]} px)<br>所需容量：{st.session_state.get("secret_bits_saved", 0):,} bits</div>', unsafe_allow_html=True)
+                        st.markdown(f'<div class="bits-info">機密圖像：{secret_img_name} ({secret_info["size"][0]}×{secret_info["size"][1]} px)<br>所需容量：{st.session_state.get("secret_bits_saved", 0):,} bits</div>', unsafe_allow_html=True)
                         step2_done = True
                     else:
                         st.session_state.secret_bits_saved = 0
@@ -1849,7 +1708,9 @@ elif st.session_state.current_mode == 'embed':
 
                     # ----- 尺寸選擇（根據機密大小推薦）-----
                     recommended_size = get_recommended_size(secret_bits_needed)
-                    available_sizes = [s for s in AVAILABLE_SIZES if s >= recommended_size]
+                    is_image_secret = st.session_state.get('embed_secret_type_saved') == "圖像"
+                    autofit = is_image_secret and st.checkbox("自動縮小機密圖像以符合載體", key="embed_autofit")
+                    available_sizes = AVAILABLE_SIZES if autofit else [s for s in AVAILABLE_SIZES if s >= recommended_size]
                     
                     size_options = [f"{s}×{s} ⭐ 推薦" if s == recommended_size else f"{s}×{s}" for s in available_sizes]
                     
@@ -1859,6 +1720,30 @@ elif st.session_state.current_mode == 'embed':
                     selected_image = images[img_idx]
                     
                     capacity = calculate_capacity(selected_size, selected_size)
+
+                    # ----- 自動縮放（放不下才處理，結果依圖檔 + 編碼 + 尺寸記住）-----
+                    fit, fit_text = None, ''
+                    if autofit and secret_bits_needed > capacity:
+                        image_codec = st.session_state.get('embed_image_codec')
+                        fit = st.session_state.upload_memo.get(
+                            f'fit:{image_codec}:{selected_size}', st.session_state.embed_secret_image_data,
+                            lambda data: fit_secret_image(data, image_codec, selected_size, key_tag=KEY_TAG,
+                                                           progressive=PROGRESSIVE),
+                            file_id=st.session_state.get('embed_secret_image_file_id'))
+                        if fit['image'] is not None:
+                            fit_info = fit['info']
+                            secret_bits_needed = fit_info['required_bits']
+                            fit_text = f"自動縮放：{fit_info['size'][0]}×{fit_info['size'][1]} px"
+                            if fit_info['quality'] is not None:
+                                fit_text += f"、品質 {fit_info['quality']}"
+                            if fit_info['quantized']:
+                                fit_text += "、256 色"
+                            fit_text += "<br>"
+                        else:
+                            st.markdown(f'<div class="error-box">{fit["error"]}</div>', unsafe_allow_html=True)
+                            fit = None
+                    st.session_state.embed_secret_fit = fit
+
                     usage = secret_bits_needed / capacity * 100
                     capacity_ok = secret_bits_needed <= capacity
                     
@@ -1874,7 +1759,7 @@ elif st.session_state.current_mode == 'embed':
                             <img src="https://images.pexels.com/photos/{selected_image["id"]}/pexels-photo-{selected_image["id"]}.jpeg?auto=compress&cs=tinysrgb&w=200&h=200&fit=crop" style="width: 200px; height: 200px; object-fit: cover; border-radius: 8px;">
                         </div>
                         <div style="color: {info_color}; font-size: 24px; font-weight: bold; line-height: 1.8; white-space: nowrap;">
-                            機密大小：{secret_bits_needed:,} bits<br>
+                            {fit_text}機密大小：{secret_bits_needed:,} bits<br>
                             圖像容量：{capacity:,} bits<br>
                             {usage_text}
                         </div>
@@ -1894,8 +1779,8 @@ elif st.session_state.current_mode == 'embed':
         # ===== 返回按鈕 =====
         if st.button("返回", key="embed_back_btn", type="secondary"):
             for key in ['selected_contact_saved', 'secret_bits_saved', 'embed_text_saved', 
-                        'embed_secret_type_saved', 'embed_secret_image_data', 'embed_secret_image_name',
-                        'embed_image_id', 'embed_image_size', 'embed_image_name', 'embed_style_num']:
+                        'embed_secret_type_saved', 'embed_secret_image_data', 'embed_secret_image_name', 'embed_secret_image_file_id',
+                        'embed_secret_fit', 'embed_image_id', 'embed_image_size', 'embed_image_name', 'embed_style_num']:
                 if key in st.session_state:
                     del st.session_state[key]
             st.session_state.current_mode = None
@@ -1969,12 +1854,15 @@ elif st.session_state.current_mode == 'embed':
             
             try:
                 start = time.time()
+                timing_records = []
 
                 # ----- 下載載體圖像 -----
                 image_id = st.session_state.get('embed_image_id')
                 image_size = st.session_state.get('embed_image_size')
                 style_num = st.session_state.get('embed_style_num', 1)
-                _, img_process = download_image_by_id(image_id, image_size)
+                fast_decode = FAST_COVER_DECODE  # 載體的解碼方式記在 Z 碼標頭
+                with profiling.collect(timing_records):
+                    img_process = download_image_by_id(image_id, image_size, fast_decode)
                 capacity = calculate_capacity(image_size, image_size)
                 
                 # ----- 取得對象密鑰 -----
@@ -1984,6 +1872,7 @@ elif st.session_state.current_mode == 'embed':
                 # ----- 準備機密內容 -----
                 embed_secret_type = st.session_state.get('embed_secret_type_saved', '文字')
                 embed_text = st.session_state.get('embed_text_saved', None)
+                secret_fit = None
                 
                 if embed_secret_type == "文字" and embed_text:
                     secret_content = embed_text
@@ -1992,30 +1881,36 @@ elif st.session_state.current_mode == 'embed':
                     secret_filename = None
                 elif embed_secret_type == "圖像":
                     secret_img_data = st.session_state.get('embed_secret_image_data')
+                    secret_fit = st.session_state.get('embed_secret_fit')
                     if secret_img_data:
-                        secret_content = Image.open(BytesIO(secret_img_data))
+                        secret_content = secret_fit['image'] if secret_fit else Image.open(BytesIO(secret_img_data))
                         secret_type_flag = 'image'
                         secret_desc = f"圖像: {secret_content.size[0]}×{secret_content.size[1]} px"
                         secret_filename = st.session_state.get('embed_secret_image_name', 'image.png')
                 
                 # ----- 執行嵌入 -----
-                z_bits, used_capacity, info = embed_secret(img_process, secret_content, secret_type=secret_type_flag, contact_key=contact_key)
+                with profiling.collect(timing_records):
+                    z_bits, used_capacity, info = embed_secret(img_process, secret_content, secret_type=secret_type_flag, contact_key=contact_key,
+                                                               image_codec=st.session_state.get('embed_image_codec'), text_codec=TEXT_CODEC,
+                                                               quality=secret_fit['info']['quality'] if secret_fit else None, key_tag=KEY_TAG,
+                                                               progressive=PROGRESSIVE)
                 processing_placeholder.empty()
 
                 # ----- 儲存結果 -----
                 st.session_state.embed_result = {
-                    'success': True, 'elapsed_time': time.time()-start,
+                    'success': True, 'elapsed_time': time.time()-start, 'result_id': new_result_id(),
                     'embed_image_choice': embed_image_choice, 'secret_desc': secret_desc,
                     'embed_secret_type': embed_secret_type, 'z_bits': z_bits,
                     'image_name': st.session_state.get('embed_image_name', ''),
                     'image_size': image_size, 'secret_filename': secret_filename,
                     'secret_bits': info['bits'], 'capacity': capacity,
                     'usage_percent': info['bits']*100/capacity,
-                    'style_num': style_num
+                    'style_num': style_num, 'fast_decode': fast_decode,
+                    'timings': profiling.summarize(timing_records)
                 }
                 
                 # ----- 清除輸入狀態 -----
-                for key in ['selected_contact_saved', 'secret_bits_saved', 'embed_text_saved', 'embed_secret_type_saved', 'embed_secret_image_data', 'embed_secret_image_name']:
+                for key in ['selected_contact_saved', 'secret_bits_saved', 'embed_text_saved', 'embed_secret_type_saved', 'embed_secret_image_data', 'embed_secret_image_name', 'embed_secret_image_file_id', 'embed_secret_fit']:
                     if key in st.session_state:
                         del st.session_state[key]
                 st.session_state.embed_page = 'result'
@@ -2072,6 +1967,13 @@ else:
                     st.markdown('<p style="font-size: 24px; font-weight: bold; color: #4f7343;">機密文字:</p>', unsafe_allow_html=True)
                     content_html = format_text_display(r["content"])
                     st.markdown(f'<p style="font-size: 20px; color: #4f7343; line-height: 1.8;">{content_html}</p>', unsafe_allow_html=True)
+                    
+                    # 各階段耗時
+                    if r.get('detected_contact'):
+                        st.markdown(f'<p style="font-size: 18px; color: #888;">自動偵測對象：{html.escape(r["detected_contact"])}</p>', unsafe_allow_html=True)
+                    timing_html = format_timing_breakdown(r.get('timings'))
+                    if timing_html:
+                        st.markdown(f'<p style="font-size: 16px; color: #888; line-height: 1.6;">{timing_html}</p>', unsafe_allow_html=True)
 
                 # 中欄：驗證輸入
                 with col2:
@@ -2148,7 +2050,7 @@ else:
                 ''', unsafe_allow_html=True)
                 _, img_col, _ = st.columns([1.3, 0.6, 1.2])
                 with img_col:
-                    st.image(Image.open(BytesIO(r['image_data'])), width=200)
+                    st.image(st.session_state.artifact_cache.get(r['result_id'], 'secret_preview', lambda: make_thumbnail(r['image_data'])), width=200)
             
             else:
                # ----- 正常情況：提取成功 -----
@@ -2158,8 +2060,15 @@ else:
                 with col_left:
                     st.markdown(f'<p style="font-size: 32px; font-weight: bold; color: #4f7343; margin-bottom: 25px;">提取成功！({r["elapsed_time"]:.2f} 秒)</p>', unsafe_allow_html=True)
                     st.markdown('<p style="font-size: 32px; font-weight: bold; color: #4f7343;">機密圖像:</p>', unsafe_allow_html=True)
-                    st.image(Image.open(BytesIO(r['image_data'])), width=200)
+                    st.image(st.session_state.artifact_cache.get(r['result_id'], 'secret_preview', lambda: make_thumbnail(r['image_data'])), width=200)
                     st.download_button("下載圖像", r['image_data'], "recovered.png", "image/png", key="dl_rec")
+                    
+                    # 各階段耗時
+                    if r.get('detected_contact'):
+                        st.markdown(f'<p style="font-size: 18px; color: #888;">自動偵測對象：{html.escape(r["detected_contact"])}</p>', unsafe_allow_html=True)
+                    timing_html = format_timing_breakdown(r.get('timings'))
+                    if timing_html:
+                        st.markdown(f'<p style="font-size: 16px; color: #888; line-height: 1.6;">{timing_html}</p>', unsafe_allow_html=True)
 
                 # 右欄：圖像驗證
                 with col_right:
@@ -2172,20 +2081,20 @@ else:
                             st.session_state.last_verify_img_name = current_name
                             st.session_state.verify_img_result = None
         
-                        orig_img = Image.open(verify_img)
-                        extracted_img = Image.open(BytesIO(r['image_data']))
-
-                        # 顯示原始和提取圖像
+                        # 顯示原始和提取圖像（縮圖）
                         col_orig, col_ext = st.columns(2)
                         with col_orig:
                             st.markdown('<p style="font-size: 20px; font-weight: bold; color: #443C3C;">原始圖像</p>', unsafe_allow_html=True)
-                            st.image(orig_img, width=150)
+                            st.image(st.session_state.upload_memo.get('preview', verify_img.getvalue(), make_thumbnail,
+                                                                      file_id=get_file_id(verify_img)), width=150)
                         with col_ext:
                             st.markdown('<p style="font-size: 20px; font-weight: bold; color: #443C3C;">提取結果</p>', unsafe_allow_html=True)
-                            st.image(extracted_img, width=150)
+                            st.image(st.session_state.artifact_cache.get(r['result_id'], 'secret_preview', lambda: make_thumbnail(r['image_data'])), width=150)
 
-                        # 驗證按鈕
+                        # 驗證按鈕（按下時才解碼原圖比對）
                         if st.button("驗證", key="verify_img_btn"):
+                            orig_img = Image.open(BytesIO(verify_img.getvalue()))
+                            extracted_img = Image.open(BytesIO(r['image_data']))
                             orig_arr = np.array(orig_img.convert('RGB'))
                             ext_arr = np.array(extracted_img.convert('RGB'))
                             
@@ -2241,6 +2150,7 @@ else:
         _, btn_col, _ = st.columns([1, 1, 1])
         with btn_col:
             if st.button("返回首頁", key="back_to_home_from_extract", type="primary"):
+                st.session_state.artifact_cache.evict(r['result_id'])
                 st.session_state.extract_page = 'input'
                 st.session_state.extract_result = None
                 st.session_state.current_mode = None
@@ -2321,6 +2231,7 @@ else:
 
         # ----- 初始化變數 -----
         extract_z_text, extract_style_num, extract_img_num, extract_img_size = None, None, None, None
+        extract_fast_decode = False
         
         contacts = st.session_state.contacts
         contact_names = list(contacts.keys())
@@ -2355,7 +2266,7 @@ else:
         
         # ----- 檢查步驟完成狀態 -----
         saved_contact = st.session_state.get('extract_contact_saved', None)
-        step1_done = saved_contact is not None and saved_contact in contact_names
+        step1_done = saved_contact is not None and (saved_contact in contact_names or saved_contact == AUTO_CONTACT)
 
         # ----- 兩欄佈局 -----
         col1, col2 = st.columns([1, 1], gap="large")
@@ -2369,7 +2280,7 @@ else:
             """, unsafe_allow_html=True)
             
             if contact_names:
-                options = ["選擇"] + contact_names
+                options = ["選擇", AUTO_CONTACT] + contact_names
                 default_idx = options.index(saved_contact) if saved_contact and saved_contact in options else 0
                 
                 selected_contact = st.selectbox("對象", options, index=default_idx, key="extract_contact_select", label_visibility="collapsed")
@@ -2398,72 +2309,35 @@ else:
                 extract_file = st.file_uploader("上傳 QR Code 或 Z碼圖", type=["png", "jpg", "jpeg"], key="extract_z_upload", label_visibility="collapsed")
                 
                 if extract_file:
-                    uploaded_img = Image.open(extract_file)
-                    detected = False
+                    # ----- 解析 Z碼圖（先試 QR Code，再試圖像 Z碼；同一個檔案只解析一次）-----
+                    z_info = st.session_state.upload_memo.get('z_code', extract_file.getvalue(),
+                                                              lambda data: analyze_z_code_upload(data, decode_qr_upload),
+                                                              file_id=get_file_id(extract_file))
+                    detected = z_info['detected']
                     success_msg = ""
-                    error_msg = ""
-                    
-                    # ----- 先嘗試 QR Code 解碼 -----
-                    try:
-                        decode_qr = load_pyzbar()
-                        decoded = decode_qr(uploaded_img)
-                        if decoded:
-                            qr_content = decoded[0].data.decode('utf-8')
-                            if '|' in qr_content:
-                                header, z_text = qr_content.split('|', 1)
-                                parts = header.split('-')
-                                if len(parts) == 3:
-                                    # 新格式: 風格編號-圖像編號-尺寸
-                                    extract_style_num = int(parts[0])
-                                    extract_img_num = int(parts[1])
-                                    extract_img_size = int(parts[2])
-                                    extract_z_text = z_text
-                                    style_name = NUM_TO_STYLE.get(extract_style_num, "建築")
-                                    images = IMAGE_LIBRARY.get(style_name, [])
-                                    img_name = images[extract_img_num - 1]['name'] if extract_img_num <= len(images) else str(extract_img_num)
-                                    success_msg = f"Z碼圖額外資訊：<br>風格：{extract_style_num}. {style_name}，載體圖像：{extract_img_num}（{img_name}），尺寸：{extract_img_size}×{extract_img_size}"
-                                    detected = True
-                                elif len(parts) == 2:
-                                    # 舊格式: 圖像編號-尺寸（預設風格=建築）
-                                    extract_style_num = 1 
-                                    extract_img_num = int(parts[0])
-                                    extract_img_size = int(parts[1])
-                                    extract_z_text = z_text
-                                    style_name = NUM_TO_STYLE.get(extract_style_num, "建築")
-                                    images = IMAGE_LIBRARY.get(style_name, [])
-                                    img_name = images[extract_img_num - 1]['name'] if extract_img_num <= len(images) else str(extract_img_num)
-                                    success_msg = f"Z碼圖額外資訊：<br>風格：{extract_style_num}. {style_name}，載體圖像：{extract_img_num}（{img_name}），尺寸：{extract_img_size}×{extract_img_size}"
-                                    detected = True
-                    except Exception as e:
-                        error_msg = f"QR: {str(e)}"
+                    error_msg = z_info['error']
                     
-                    # ----- QR 失敗則嘗試圖像 Z碼解碼 -----
-                    if not detected:
-                        try:
-                            z_bits, style_num, img_num, img_size = image_to_z_with_header(uploaded_img)
-                            extract_style_num = style_num
-                            extract_img_num = img_num
-                            extract_img_size = img_size
-                            extract_z_text = z_to_text(z_bits)
-                            style_name = NUM_TO_STYLE.get(extract_style_num, "建築")
-                            images = IMAGE_LIBRARY.get(style_name, [])
-                            img_name = images[extract_img_num - 1]['name'] if extract_img_num <= len(images) else str(extract_img_num)
-                            success_msg = f"Z碼圖額外資訊：<br>風格：{extract_style_num}. {style_name}，載體圖像：{extract_img_num}（{img_name}），尺寸：{extract_img_size}×{extract_img_size}"
-                            detected = True
-                        except Exception as e:
-                            if error_msg:
-                                error_msg += f", {str(e)}"
-                            else:
-                                error_msg = str(e)
+                    if detected:
+                        extract_z_text = z_info['z_text']
+                        extract_style_num = z_info['style_num']
+                        extract_img_num = z_info['img_num']
+                        extract_img_size = z_info['img_size']
+                        extract_fast_decode = z_info.get('fast_decode', False)
+                        style_name = NUM_TO_STYLE.get(extract_style_num, "建築")
+                        images = IMAGE_LIBRARY.get(style_name, [])
+                        img_name = images[extract_img_num - 1]['name'] if extract_img_num <= len(images) else str(extract_img_num)
+                        success_msg = f"Z碼圖額外資訊：<br>風格：{extract_style_num}. {style_name}，載體圖像：{extract_img_num}（{img_name}），尺寸：{extract_img_size}×{extract_img_size}"
                     
                     # ----- 顯示識別結果 -----
                     if detected:
-                        img_bytes = extract_file.getvalue()
+                        img_bytes = st.session_state.upload_memo.get('preview', extract_file.getvalue(), make_thumbnail,
+                                                                     file_id=get_file_id(extract_file))
                         img_b64 = base64.b64encode(img_bytes).decode()
+                        img_mime = Image.MIME.get(Image.open(BytesIO(img_bytes)).format, 'image/png')
                         st.markdown(f'''
                         <div style="display: flex; align-items: center; gap: 20px; margin-top: 10px;">
                             <div style="flex-shrink: 0;">
-                                <img src="data:image/png;base64,{img_b64}" style="width: 180px; border-radius: 8px;">
+                                <img src="data:{img_mime};base64,{img_b64}" style="width: 180px; border-radius: 8px;">
                             </div>
                             <div style="font-size: 26px; color: #4f7343; font-weight: bold; line-height: 1.6;">
                                 {success_msg}
@@ -2471,7 +2345,8 @@ else:
                         </div>
                         ''', unsafe_allow_html=True)
                     else:
-                        st.image(uploaded_img, width=150)
+                        st.image(st.session_state.upload_memo.get('preview', extract_file.getvalue(), make_thumbnail,
+                                                                  file_id=get_file_id(extract_file)), width=150)
                         st.markdown(f'<p style="font-size: 22px; color: #C62828; margin-top: 10px;">無法識別</p>', unsafe_allow_html=True)
             else:
                 st.markdown('<p style="font-size: 24px; color: #999; text-align: center;">請先完成第一步</p>', unsafe_allow_html=True)
@@ -2532,14 +2407,16 @@ else:
                 
                 try:
                     start = time.time()
+                    timing_records = []
 
                     # ----- 解析 Z碼 -----
                     clean = ''.join(c for c in extract_z_text.strip() if c in '01')
                     Z = text_to_z(clean) if clean else None
                     
-                    # ----- 取得對象密鑰 -----
+                    # ----- 取得對象密鑰（自動偵測在下載載體後進行）-----
                     selected_contact = st.session_state.get('extract_contact_saved', None)
                     contact_key = get_contact_key(st.session_state.contacts, selected_contact) if selected_contact else None
+                    detected_contact = None
                     
                     if Z:
                         # ----- 下載載體圖像 -----
@@ -2549,33 +2426,60 @@ else:
                         
                         if img_idx < len(images):
                             selected_image = images[img_idx]
-                            _, img_process = download_image_by_id(selected_image["id"], extract_img_size)
-                            
-                            # ----- 執行提取 -----
-                            secret, secret_type, info = detect_and_extract(img_process, Z, contact_key=contact_key)
+                            with profiling.collect(timing_records):
+                                img_process = download_image_by_id(selected_image["id"], extract_img_size, extract_fast_decode)
+                                
+                                # ----- 自動偵測對象（只試解開頭幾個區塊）-----
+                                if selected_contact == AUTO_CONTACT:
+                                    contact_keys = {name: get_contact_key(st.session_state.contacts, name) for name in st.session_state.contacts}
+                                    detected_contact, detection = identify_contact(img_process, Z, contact_keys)
+                                    if detected_contact is None:
+                                        if len(detection['candidates']) > 1:
+                                            raise ValueError(f"無法判斷對象（{'、'.join(detection['candidates'])} 都有可能），請手動選擇")
+                                        raise ValueError("沒有對象符合這個 Z 碼")
+                                    contact_key = contact_keys[detected_contact]
+                                
+                                # ----- 漸進式圖像：先顯示預覽，再完整提取 -----
+                                for fraction in PREVIEW_STEPS:
+                                    try:
+                                        preview, preview_info = extract_preview(img_process, Z, fraction, contact_key=contact_key)
+                                    except ValueError:
+                                        break  # 對象選錯等錯誤交給下面的完整提取回報
+                                    if preview is None or not preview_info['progressive']:
+                                        break
+                                    processing_placeholder.markdown(extract_overlay_html(preview, fraction), unsafe_allow_html=True)
+                                
+                                # ----- 執行提取 -----
+                                secret, secret_type, info = detect_and_extract(img_process, Z, contact_key=contact_key, early_abort=True)
                             processing_placeholder.empty()
 
                             # ----- 儲存結果 -----
                             if secret_type == 'text':
-                                is_garbled = is_likely_garbled_text(secret)
+                                is_garbled = is_garbled_text(secret) or prefix_garbled(info)
                                 st.session_state.extract_result = {
                                     'success': True, 
+                                    'result_id': new_result_id(),
                                     'type': 'text', 
                                     'elapsed_time': time.time()-start, 
                                     'content': secret,
-                                    'is_garbled': is_garbled
+                                    'is_garbled': is_garbled,
+                                    'detected_contact': detected_contact,
+                                    'timings': profiling.summarize(timing_records)
                                 }
                                 
                             else:
                                 buf = BytesIO()
                                 secret.save(buf, format='PNG')
-                                is_garbled = 'error' in info or is_likely_garbled_image(buf.getvalue())
+                                is_garbled = 'error' in info or prefix_garbled(info) or is_garbled_image(secret)
                                 st.session_state.extract_result = {
                                     'success': True, 
+                                    'result_id': new_result_id(),
                                     'type': 'image', 
                                     'elapsed_time': time.time()-start, 
                                     'image_data': buf.getvalue(),
-                                    'is_garbled': is_garbled
+                                    'is_garbled': is_garbled,
+                                    'detected_contact': detected_contact,
+                                    'timings': profiling.summarize(timing_records)
                                 }
 
                             # ----- 清除輸入狀態 -----
@@ -3,6 +3,8 @@
 
 import numpy as np
 import hashlib
+import functools
+import itertools
 
 def generate_Q_from_block(block, q_length=7, contact_key=None):
     """
@@ -21,7 +23,7 @@ def generate_Q_from_block(block, q_length=7, contact_key=None):
     原理:
         1. 取區塊第一行前 7 個像素值
         2. 按值排序，得到 Q
-        3. 用 contact_key 對 Q 進行額外置換（增加安全性）
+        3. 用 contact_key 對 Q 進行額外置換（增加安全性，置換順序見 get_key_permutation）
     
     範例:
         原始像素值：
@@ -57,21 +59,8 @@ def generate_Q_from_block(block, q_length=7, contact_key=None):
     Q = (sorted_indices + 1).tolist()
     
     # 用 contact_key 對 Q 進行額外置換
-    if contact_key:
-        # 步驟 1：用 SHA-256 把 contact_key 轉成固定的 hash 值
-        # 例如 "Alice" → 32 bytes 的 hash
-        key_hash = hashlib.sha256(contact_key.encode('utf-8')).digest()
-
-        # 步驟 2：取 hash 的前 4 bytes 作為種子
-        # 同一個 contact_key 永遠產生同一個種子
-        perm_seed = int.from_bytes(key_hash[:4], 'big')
-        
-        # 步驟 3：用種子建立隨機數生成器，生成置換順序
-        # 同一個種子永遠產生同一個置換順序
-        rng = np.random.default_rng(perm_seed)
-        perm_order = list(range(q_length))  # 建立索引列表 [0,1,2,3,4,5,6]
-        rng.shuffle(perm_order)             # 打亂順序，例如 [3,0,5,1,6,2,4]
-        
+    perm_order = get_key_permutation(contact_key, q_length)
+    if perm_order is not None:
         # 步驟 4：用置換順序重新排列 Q
         # 例如 Q = [1,4,2,7,5,3,6], perm_order = [3,0,5,1,6,2,4]
         #      新 Q = [Q[3], Q[0], Q[5], Q[1], Q[6], Q[2], Q[4]]
@@ -80,6 +69,40 @@ def generate_Q_from_block(block, q_length=7, contact_key=None):
     
     return Q
 
+@functools.lru_cache(maxsize=256)
+def get_key_permutation(contact_key, q_length=7):
+    """
+    功能:
+        取得 contact_key 對應的置換順序（generate_Q_from_block 的步驟 1~3，結果快取）
+    
+    參數:
+        contact_key: 對象專屬密鑰（字串）
+        q_length: Q 的長度，預設 7
+    
+    返回:
+        perm_order: 置換順序 tuple（0-based），沒有 contact_key 時返回 None
+    
+    用途:
+        批次計算多個區塊的 Q 時，同一個 contact_key 只需計算一次
+    """
+    if not contact_key:
+        return None
+    
+    # 步驟 1：用 SHA-256 把 contact_key 轉成固定的 hash 值
+    # 例如 "Alice" → 32 bytes 的 hash
+    key_hash = hashlib.sha256(contact_key.encode('utf-8')).digest()
+
+    # 步驟 2：取 hash 的前 4 bytes 作為種子
+    # 同一個 contact_key 永遠產生同一個種子
+    perm_seed = int.from_bytes(key_hash[:4], 'big')
+    
+    # 步驟 3：用種子建立隨機數生成器，生成置換順序
+    # 同一個種子永遠產生同一個置換順序
+    rng = np.random.default_rng(perm_seed)
+    perm_order = list(range(q_length))  # 建立索引列表 [0,1,2,3,4,5,6]
+    rng.shuffle(perm_order)             # 打亂順序，例如 [3,0,5,1,6,2,4]
+    return tuple(perm_order)
+
 def apply_permutation(values, Q):
     """
     功能:
@@ -140,3 +163,91 @@ def apply_Q_three_rounds(averages_21, Q):
     
     reordered_all = round1 + round2 + round3
     return reordered_all
+
+# ==================== 排列編號（permutation id）====================
+# 7 個元素只有 7! = 5040 種排列，Q 可以用 0~5039 的編號（uint16，2 bytes）表示
+# 編號 = 排列在字典序中的位置（Lehmer code），例如 [0,1,2,3,4,5,6] → 0、[6,5,4,3,2,1,0] → 5039
+PERMUTATION_TABLE = np.array(list(itertools.permutations(range(7))), dtype=np.uint8)  # (5040, 7)，0-based
+PERMUTATION_TUPLES = [tuple(int(v) for v in row) for row in PERMUTATION_TABLE]
+
+# 三輪排列的取值索引：第 k 輪使用 Q + 7k，可一次從 21 個平均值取出排列後的結果
+THREE_ROUND_TABLE = np.concatenate(
+    [PERMUTATION_TABLE, PERMUTATION_TABLE + 7, PERMUTATION_TABLE + 14], axis=1
+)  # (5040, 21)
+
+# 排列 → 編號的查表：把排列視為 7 進位數字（最大 7^7 = 823543），表中存該排列的編號
+PERMUTATION_CODE_WEIGHTS = 7 ** np.arange(6, -1, -1, dtype=np.int64)  # [7^6, ..., 7, 1]
+
+@functools.lru_cache(maxsize=1)
+def get_permutation_id_lookup():
+    """7 進位代碼 → 排列編號的查表（uint16，約 1.6 MB；第一次用到時才建立）"""
+    lookup = np.zeros(7 ** 7, dtype=np.uint16)
+    lookup[PERMUTATION_TABLE.astype(np.int64) @ PERMUTATION_CODE_WEIGHTS] = np.arange(len(PERMUTATION_TABLE))
+    lookup.setflags(write=False)
+    return lookup
+
+def permutations_to_ids(perms):
+    """
+    功能:
+        把多個 0-based 排列轉成排列編號
+
+    參數:
+        perms: (N×7) 的 0-based 排列（例如 np.argsort 的結果）
+
+    返回:
+        ids: numpy array (N,)，uint16
+
+    原理:
+        排列 [p0..p6] 視為 7 進位數字 p0×7^6 + ... + p6，查 get_permutation_id_lookup() 得到編號
+        （比逐位計算 Lehmer code 快很多，查表約 1.6 MB，第一次呼叫時才建立）
+    """
+    perms = np.asarray(perms).reshape(-1, 7)
+    return get_permutation_id_lookup()[perms @ PERMUTATION_CODE_WEIGHTS]
+
+def permutation_to_id(Q):
+    """
+    功能:
+        把 Q（1-based 列表，generate_Q_from_block 的輸出）轉成排列編號
+
+    參數:
+        Q: 長度 7 的 1-based 排列
+
+    返回:
+        int: 排列編號（0~5039）
+    """
+    return int(permutations_to_ids(np.asarray(Q) - 1)[0])
+
+def id_to_permutation(perm_id):
+    """
+    功能:
+        把排列編號轉回 Q（1-based 列表）
+
+    參數:
+        perm_id: 排列編號（0~5039）
+
+    返回:
+        Q: 長度 7 的 1-based 排列
+    """
+    return [v + 1 for v in PERMUTATION_TUPLES[perm_id]]
+
+@functools.lru_cache(maxsize=256)
+def get_key_composition_table(contact_key, q_length=7):
+    """
+    功能:
+        取得 contact_key 的置換合成表：table[原始 Q 的編號] = 套用 contact_key 置換後 Q 的編號
+
+    參數:
+        contact_key: 對象專屬密鑰（字串）
+        q_length: Q 的長度（只支援 7）
+
+    返回:
+        table: numpy array (5040,)，uint16；沒有 contact_key 時返回 None
+
+    原理:
+        generate_Q_from_block 的步驟 4：新 Q = [Q[i] for i in perm_order]
+        對 5040 種 Q 各算一次，之後每個區塊只需查表
+    """
+    perm_order = get_key_permutation(contact_key, q_length)
+    if perm_order is None:
+        return None
+    return permutations_to_ids(PERMUTATION_TABLE[:, list(perm_order)])
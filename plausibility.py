@@ -0,0 +1,301 @@
+# 建立 plausibility.py → 提取內容合理性評分模組
+# 舊版 Z 碼沒有密鑰檢查碼，選錯對象或載體時只能從內容判斷是不是亂碼
+# 只看開頭幾百 bytes（串流評分）就能判斷，不必解完整個 Z 碼；最終判斷也只取樣
+#
+# 判斷依據:
+#   文字: UTF-8 是否有效、字元種類比例（中日文、英數標點 vs 控制字元、無效 bytes）
+#   圖像: header 的寬×高是否符合 Z 碼長度、相鄰像素是否平滑（亂碼接近均勻分布，平均差異約 85）
+#
+# 只有格式上的依據（STRUCTURAL_REASONS）能確定是亂碼；內容統計的依據只供參考（見 extract.extract_secret）
+#   圖檔: 開頭是否為 PNG / JPEG / WebP 的檔頭
+
+import codecs
+import zlib
+
+import numpy as np
+
+from config import IMAGE_HEADER_SIZE, TYPE_MARKER_SIZE, EXTENDED_HEADER_SIZE, KEY_TAG_SIZE, PAYLOAD_FLAG_KEY_TAG
+from config import PAYLOAD_TYPE_TEXT, PAYLOAD_TYPE_IMAGE_RAW, PAYLOAD_TYPE_IMAGE_FILE
+from config import PLAUSIBILITY_PREFIX_BYTES, PLAUSIBILITY_SAMPLE_ROWS, PAYLOAD_FLAG_SEEKABLE, PAYLOAD_FLAG_PROGRESSIVE
+from secret_encoding import xor_cipher, bits_to_bytes, parse_payload_header, ADAM7_PASSES
+from text_codecs import TEXT_ESCAPE, CODEC_BY_ID, PRESET_DICTIONARY, MAX_DECODED_BYTES, cjk_decode
+
+PLAUSIBLE, GARBLED, UNDECIDED = 'plausible', 'garbled', 'undecided'
+
+# 格式上的判斷依據（header、尺寸、長度、檔頭、壓縮格式）：正確的對象和載體不可能出現，可以直接停止提取；
+# 其餘依據（文字字元比例、像素平滑度）是內容統計，棋盤格、雜訊圖等正常機密也可能不通過，只供參考
+STRUCTURAL_REASONS = ('header', 'size', 'length', 'type', 'signature', 'codec')
+
+TEXT_MIN_CHARS = 8         # 少於此字數（且還沒讀完）不下判斷
+TEXT_CJK_RATIO = 0.3       # 中日文超過此比例視為正常文字
+TEXT_NORMAL_RATIO = 0.7    # 英數、標點、空白低於此比例視為亂碼
+TEXT_INVALID_RATIO = 0.05  # 無效 bytes、控制字元超過此比例視為亂碼（正常文字幾乎不會出現）
+IMAGE_MIN_PIXELS = 64      # 少於此像素數不下判斷
+IMAGE_DIFF_LIMIT = 50      # 相鄰像素平均差異超過此值視為亂碼（正常圖片通常 < 30）
+
+FILE_SIGNATURES = (b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff', b'RIFF')
+
+NORMAL_CHARS = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 \n\r\t'
+                   '!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~，。！？、；：「」『』（）…—～')
+
+# ==================== 文字 ====================
+def classify_char(ch):
+    """字元種類：'cjk'、'normal'、'invalid'（無效 UTF-8、控制字元）或 'other'"""
+    if ch in NORMAL_CHARS:
+        return 'normal'
+    if '\u4e00' <= ch <= '\u9fff' or '\u3040' <= ch <= '\u30ff' or '\u3400' <= ch <= '\u4dbf':
+        return 'cjk'
+    if ch == '\ufffd' or ch < ' ' or '\x7f' <= ch <= '\x9f':
+        return 'invalid'
+    return 'other'
+
+class TextScorer:
+    """
+    文字串流評分（依序 feed bytes 或字串，隨時可取 verdict）
+
+    用法:
+        scorer = TextScorer()
+        scorer.feed(data)                  # bytes（不完整的 UTF-8 結尾會等下一段）
+        scorer.verdict()                   # 'plausible'、'garbled' 或 'undecided'
+    """
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.counts = {'cjk': 0, 'normal': 0, 'invalid': 0, 'other': 0}
+        self.total = 0
+
+    def feed(self, data, final=False):
+        text = data if isinstance(data, str) else self._decoder.decode(data, final)
+        for ch in text:
+            self.counts[classify_char(ch)] += 1
+        self.total += len(text)
+        return self
+
+    def score(self):
+        """0~1，越像正常文字越高（無效字元加倍扣分）"""
+        if not self.total:
+            return 0.0
+        return max(0.0, (self.counts['cjk'] + self.counts['normal'] - self.counts['invalid']) / self.total)
+
+    def verdict(self, final=False):
+        if self.total == 0:
+            return GARBLED if final else UNDECIDED
+        if self.total < TEXT_MIN_CHARS and not final:
+            return UNDECIDED
+        if self.counts['invalid'] / self.total > TEXT_INVALID_RATIO:
+            return GARBLED
+        if self.counts['cjk'] / self.total > TEXT_CJK_RATIO:
+            return PLAUSIBLE
+        return PLAUSIBLE if self.score() >= TEXT_NORMAL_RATIO else GARBLED
+
+def decode_text_prefix(data):
+    """
+    功能:
+        解出文字機密開頭（可能不完整）的內容
+
+    參數:
+        data: 文字機密內容的開頭 bytes（XOR 解密後）
+
+    返回:
+        text: 字串（UTF-8 的無效 bytes 以 '\ufffd' 表示），壓縮格式解不開時返回 None
+    """
+    if len(data) < 2 or data[0] != TEXT_ESCAPE or data[1] not in CODEC_BY_ID:
+        return data.decode('utf-8', errors='replace').rstrip('\ufffd')  # 結尾可能切在多 byte 字元中間
+
+    name, body = CODEC_BY_ID[data[1]][0], data[2:]
+    try:
+        if name == 'deflate':
+            decompressor = zlib.decompressobj(-15, zdict=PRESET_DICTIONARY)
+            raw = decompressor.decompress(body, MAX_DECODED_BYTES)
+            return raw.decode('utf-8', errors='replace').rstrip('\ufffd')
+        if name == 'utf16':
+            return body[:len(body) // 2 * 2].decode('utf-16-be', errors='replace')
+        for cut in range(min(5, len(body) + 1)):  # 結尾可能切在字元中間（最多 5 bytes）
+            try:
+                return cjk_decode(body[:len(body) - cut])
+            except ValueError:
+                continue
+    except zlib.error:
+        pass
+    return None
+
+def is_garbled_text(text, max_chars=PLAUSIBILITY_PREFIX_BYTES * 4):
+    """
+    功能:
+        判斷提取出的文字是否為亂碼（只看前 max_chars 個字）
+
+    參數:
+        text: 提取出的文字
+        max_chars: 取樣字數
+
+    返回:
+        bool: True 表示可能是亂碼
+    """
+    return TextScorer().feed(text[:max_chars]).verdict(final=True) == GARBLED
+
+# ==================== 圖像 ====================
+def raw_image_bits(width, height, is_color, has_alpha):
+    """逐像素格式的位元數（含 34 bits header）"""
+    bits_per_pixel = (32 if has_alpha else 24) if is_color else 8
+    return IMAGE_HEADER_SIZE + width * height * bits_per_pixel
+
+def read_raw_image_header(bits):
+    """34 bits header → (寬, 高, is_color, has_alpha)"""
+    width = int(''.join(map(str, bits[0:16])), 2)
+    height = int(''.join(map(str, bits[16:32])), 2)
+    return width, height, int(bits[32]), int(bits[33])
+
+def pixel_smoothness(pixels, channels, width=None):
+    """
+    功能:
+        相鄰像素的平均差異（逐通道）
+
+    參數:
+        pixels: numpy array (uint8)，像素 bytes（掃描順序）
+        channels: 每像素通道數（1、3、4）
+        width: 每列像素數；有值時比對左右和上下相鄰的像素（不比對換列處），
+               None 表示只比對掃描順序的前後像素
+
+    返回:
+        float: 平均差異（0~255），像素太少時返回 None
+    """
+    count = len(pixels) // channels
+    if count < 2:
+        return None
+    values = pixels[:count * channels].reshape(count, channels).astype(np.int16)
+    if width is None or width >= count:
+        return float(np.abs(np.diff(values, axis=0)).mean())
+
+    rows = count // width
+    grid = values[:rows * width].reshape(rows, width, channels)
+    tail = values[rows * width:]   # 最後不完整的一列
+    diffs = [np.abs(np.diff(grid, axis=1)).ravel(), np.abs(np.diff(grid, axis=0)).ravel(),
+             np.abs(np.diff(tail, axis=0)).ravel(), np.abs(tail - grid[-1, :len(tail)]).ravel()]
+    return float(np.concatenate(diffs).mean())
+
+def is_garbled_image(image, sample_rows=PLAUSIBILITY_SAMPLE_ROWS):
+    """
+    功能:
+        判斷提取出的圖像是否為亂碼（雜訊圖），只取樣部分列
+
+    參數:
+        image: PIL Image 物件
+        sample_rows: 取樣列數（每個取樣點取相鄰兩列，計算水平與垂直差異）
+
+    返回:
+        bool: True 表示可能是亂碼
+    """
+    try:
+        array = np.asarray(image.convert('RGB') if image.mode not in ('L', 'RGB') else image)
+        if array.ndim == 2:
+            array = array[:, :, None]
+        height = array.shape[0]
+        if height < 2 or array.shape[1] < 2:
+            return True
+        rows = np.unique(np.linspace(0, height - 2, min(sample_rows, height - 1)).astype(int))
+        pairs = np.stack([array[rows], array[rows + 1]]).astype(np.int16)   # (2, 取樣列, 寬, 通道)
+        h_diff = np.abs(np.diff(pairs[0], axis=1)).mean()
+        v_diff = np.abs(pairs[1] - pairs[0]).mean()
+        return (h_diff + v_diff) / 2 > IMAGE_DIFF_LIMIT
+    except Exception:
+        return True
+
+# ==================== Z 碼開頭 ====================
+def assess_prefix(encrypted_bits, contact_key, total_bits=None):
+    """
+    功能:
+        解密 Z 碼開頭並判斷內容是否合理（提取前的快速檢查，也用於自動偵測對象評分）
+
+    參數:
+        encrypted_bits: 從 Z 碼還原、尚未 XOR 解密的開頭位元（建議至少 PLAUSIBILITY_PREFIX_BYTES bytes）
+        contact_key: 對象專屬密鑰
+        total_bits: Z 碼總位元數（用來核對 header 中的尺寸、長度；None 表示不核對）
+
+    返回:
+        dict:
+            - verdict: 'plausible'、'garbled' 或 'undecided'
+            - score: 0~1，越像正常內容越高
+            - reason: 判斷依據
+
+    註:
+        有密鑰檢查碼的 Z 碼由 extract.read_key_tag 判斷，這裡不處理
+    """
+    bits = [int(b) for b in encrypted_bits]
+    if not bits:
+        return {'verdict': UNDECIDED, 'score': 0.0, 'reason': 'empty'}
+
+    if bits[0] == 0:
+        # 舊版文字: [0] + XOR(文字)
+        content_bits = None if total_bits is None else total_bits - TYPE_MARKER_SIZE
+        return assess_text(bits_to_bytes(xor_cipher(bits[1:], contact_key)), content_bits)
+
+    try:
+        payload_header = parse_payload_header(bits[1:])
+    except ValueError:
+        return {'verdict': GARBLED, 'score': 0.0, 'reason': 'header'}
+
+    if payload_header is None:
+        # 舊版圖像: [1] + [header 34 bits] + XOR(像素)；header 不加密，寬×高必須符合 Z 碼長度
+        if len(bits) < TYPE_MARKER_SIZE + IMAGE_HEADER_SIZE:
+            return {'verdict': UNDECIDED, 'score': 0.0, 'reason': 'short'}
+        header = read_raw_image_header(bits[1:1 + IMAGE_HEADER_SIZE])
+        if total_bits is not None and raw_image_bits(*header) != total_bits - TYPE_MARKER_SIZE:
+            return {'verdict': GARBLED, 'score': 0.0, 'reason': 'size'}
+        pixels = bits_to_bytes(xor_cipher(bits[1 + IMAGE_HEADER_SIZE:], contact_key))
+        return assess_pixels(pixels, header)
+
+    # 擴充 header: [1] + [header 64 bits]（+ 檢查碼）+ XOR(內容)
+    start = TYPE_MARKER_SIZE + EXTENDED_HEADER_SIZE
+    if payload_header['flags'] & PAYLOAD_FLAG_KEY_TAG:
+        start += KEY_TAG_SIZE
+    if total_bits is not None and start + payload_header['length'] != total_bits:
+        return {'verdict': GARBLED, 'score': 0.0, 'reason': 'length'}
+    content = xor_cipher(bits[start:], contact_key, counter=bool(payload_header['flags'] & PAYLOAD_FLAG_SEEKABLE))
+
+    if payload_header['type'] == PAYLOAD_TYPE_TEXT:
+        return assess_text(bits_to_bytes(content), payload_header['length'])
+    if payload_header['type'] == PAYLOAD_TYPE_IMAGE_FILE:
+        data = bits_to_bytes(content)
+        if len(data) < 4:
+            return {'verdict': UNDECIDED, 'score': 0.0, 'reason': 'short'}
+        ok = data.startswith(FILE_SIGNATURES)
+        return {'verdict': PLAUSIBLE if ok else GARBLED, 'score': float(ok), 'reason': 'signature'}
+    if payload_header['type'] == PAYLOAD_TYPE_IMAGE_RAW:
+        if len(content) < IMAGE_HEADER_SIZE:
+            return {'verdict': UNDECIDED, 'score': 0.0, 'reason': 'short'}
+        header = read_raw_image_header(content[:IMAGE_HEADER_SIZE])
+        if raw_image_bits(*header) != payload_header['length']:
+            return {'verdict': GARBLED, 'score': 0.0, 'reason': 'size'}
+        return assess_pixels(bits_to_bytes(content[IMAGE_HEADER_SIZE:]), header,
+                             progressive=bool(payload_header['flags'] & PAYLOAD_FLAG_PROGRESSIVE))
+    return {'verdict': GARBLED, 'score': 0.0, 'reason': 'type'}
+
+def assess_text(data, content_bits=None):
+    """文字機密開頭的判斷（content_bits 為文字內容總位元數，開頭已涵蓋全部時做最終判斷）"""
+    complete = content_bits is not None and len(data) * 8 >= content_bits
+    text = decode_text_prefix(data)
+    if text is None:
+        return {'verdict': GARBLED, 'score': 0.0, 'reason': 'codec'}
+    scorer = TextScorer().feed(text)
+    return {'verdict': scorer.verdict(final=complete), 'score': scorer.score(), 'reason': 'text'}
+
+def assess_pixels(data, header, progressive=False):
+    """
+    逐像素圖像開頭的判斷（依相鄰像素的平滑程度）
+    漸進式圖像的開頭是 Adam7 第 1 輪（每 8×8 一個像素的縮小圖），依縮小圖的位置比對相鄰像素
+    """
+    width, height, is_color, has_alpha = header
+    channels = (4 if has_alpha else 3) if is_color else 1
+    pixels = np.frombuffer(data, dtype=np.uint8)
+    if progressive:
+        x0, y0, dx, dy, _, _ = ADAM7_PASSES[0]
+        width = len(range(x0, width, dx))
+        pixels = pixels[:width * len(range(y0, height, dy)) * channels]
+    diff = pixel_smoothness(pixels, channels, max(width, 1))
+    if diff is None:
+        return {'verdict': UNDECIDED, 'score': 0.0, 'reason': 'short'}
+    score = max(0.0, 1 - diff / 128)
+    if len(pixels) // channels < IMAGE_MIN_PIXELS:
+        verdict = UNDECIDED
+    else:
+        verdict = GARBLED if diff > IMAGE_DIFF_LIMIT else PLAUSIBLE
+    return {'verdict': verdict, 'score': score, 'reason': 'pixels'}
@@ -0,0 +1,198 @@
+# 建立 profiling.py → 效能分析模組
+# 記錄嵌入/提取流程各階段的耗時、處理的資料量（未啟用時幾乎零成本）
+
+import os
+import json
+import time
+import logging
+import threading
+
+# ==================== Hook 註冊 ====================
+# 全域 hook：所有執行緒的階段紀錄都會送到這裡（例如寫 log）
+_hooks = []
+_hooks_lock = threading.Lock()
+
+# 收集器：只收集目前執行緒的紀錄（Streamlit 每個 session 跑在不同執行緒）
+_local = threading.local()
+
+logger = logging.getLogger('ecihmsb.profiling')
+
+def add_hook(callback):
+    """
+    功能:
+        註冊全域 hook，每個階段結束時呼叫 callback(record)
+    
+    參數:
+        callback: 函式，接收一筆階段紀錄（dict）
+    """
+    with _hooks_lock:
+        if callback not in _hooks:
+            _hooks.append(callback)
+
+def remove_hook(callback):
+    """
+    功能:
+        移除全域 hook
+    
+    參數:
+        callback: 先前註冊的函式
+    """
+    with _hooks_lock:
+        if callback in _hooks:
+            _hooks.remove(callback)
+
+def is_enabled():
+    """
+    功能:
+        是否有人需要階段紀錄（有 hook 或目前執行緒有收集器）
+    
+    返回:
+        bool: True 表示需要計時
+    """
+    return bool(_hooks) or bool(getattr(_local, 'collectors', None))
+
+def emit(record):
+    """
+    功能:
+        把一筆階段紀錄送給所有 hook 和目前執行緒的收集器
+    
+    參數:
+        record: 階段紀錄，例如 {'stage': 'blocks', 'duration_s': 0.12, 'blocks': 6}
+    """
+    for collector in getattr(_local, 'collectors', None) or ():
+        collector.append(record)
+    for callback in list(_hooks):
+        try:
+            callback(record)
+        except Exception:
+            logger.exception("profiling hook 執行失敗")
+
+# ==================== 階段計時 ====================
+class _Stage:
+    """
+    單一階段的計時器（用 with 語法）
+    
+    範例:
+        with stage('xor', bits=len(bits)) as counters:
+            result = xor_cipher(bits, key)
+            counters['bytes'] = len(bits) // 8
+    """
+    __slots__ = ('name', 'counters', 'start')
+    
+    def __init__(self, name, counters):
+        self.name = name
+        self.counters = counters
+        self.start = time.perf_counter()
+    
+    def __enter__(self):
+        return self.counters
+    
+    def __exit__(self, exc_type, exc, tb):
+        record = {'stage': self.name, 'duration_s': time.perf_counter() - self.start}
+        record.update(self.counters)
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        emit(record)
+        return False
+
+class _NullStage:
+    """未啟用時使用的空計時器（不計時、不建立紀錄）"""
+    __slots__ = ('counters',)
+    
+    def __init__(self):
+        self.counters = {}
+    
+    def __enter__(self):
+        self.counters.clear()
+        return self.counters
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+def stage(name, **counters):
+    """
+    功能:
+        建立階段計時器，結束時輸出 {'stage', 'duration_s', 其他計數}
+    
+    參數:
+        name: 階段名稱（例如 'grayscale', 'blocks', 'xor'）
+        **counters: 額外計數（例如 bytes=…, blocks=…, bits=…）
+    
+    返回:
+        context manager，with 區塊內可再補充計數
+    
+    註:
+        沒有 hook 也沒有收集器時返回共用的空計時器，成本只有一次判斷
+    """
+    if not is_enabled():
+        return _NULL_STAGE
+    return _Stage(name, counters)
+
+class collect:
+    """
+    功能:
+        收集目前執行緒在 with 區塊內的所有階段紀錄
+    
+    範例:
+        with profiling.collect() as records:
+            embed_secret(...)
+        records → [{'stage': 'grayscale', 'duration_s': ...}, ...]
+    
+    參數:
+        records: 要附加紀錄的既有列表（可分多段收集到同一個列表），預設建立新列表
+    """
+    def __init__(self, records=None):
+        self.records = records if records is not None else []
+    
+    def __enter__(self):
+        if not hasattr(_local, 'collectors'):
+            _local.collectors = []
+        _local.collectors.append(self.records)
+        return self.records
+    
+    def __exit__(self, exc_type, exc, tb):
+        # 依物件身分移除最後加入的一筆（巢狀收集器的列表內容相同，list.remove 會誤刪外層）
+        collectors = _local.collectors
+        index = max(i for i, records in enumerate(collectors) if records is self.records)
+        del collectors[index]
+        return False
+
+def summarize(records):
+    """
+    功能:
+        把同名階段的紀錄合併（耗時、計數相加）
+    
+    參數:
+        records: 階段紀錄列表
+    
+    返回:
+        summary: 依出現順序排列的合併結果列表
+    """
+    summary = {}
+    for record in records:
+        merged = summary.setdefault(record['stage'], {'stage': record['stage'], 'duration_s': 0.0, 'calls': 0})
+        merged['calls'] += 1
+        for key, value in record.items():
+            if key == 'stage' or not isinstance(value, (int, float)):
+                continue
+            merged[key] = merged.get(key, 0) + value
+    return list(summary.values())
+
+# ==================== 結構化 log ====================
+def log_hook(record):
+    """把階段紀錄以 JSON 格式寫到 'ecihmsb.profiling' logger"""
+    logger.info(json.dumps(record, ensure_ascii=False))
+
+def enable_logging():
+    """啟用結構化 log（每個階段一行 JSON）"""
+    add_hook(log_hook)
+
+def disable_logging():
+    """停用結構化 log"""
+    remove_hook(log_hook)
+
+# 設定環境變數 ECIHMSB_PROFILE_LOG=1 即自動啟用結構化 log
+if os.environ.get('ECIHMSB_PROFILE_LOG') == '1':
+    enable_logging()
@@ -0,0 +1,152 @@
+# 建立 rendering.py → 結果頁產物模組
+# 產生結果頁要顯示、下載的圖檔（QR Code、Z碼圖 PNG），並依結果編號快取
+#
+# Streamlit 每次重新執行腳本（滑鼠移過、按下載）都會重畫整頁，
+# 大張 Z碼圖每次重新編碼 PNG 很慢；產物只在第一次顯示時產生，之後直接重用
+# 頁面上的預覽一律用縮圖（原圖只經由下載按鈕傳給瀏覽器）
+
+import uuid
+from io import BytesIO
+
+import qrcode
+from PIL import Image
+
+from config import PREVIEW_MAX_SIDE, PREVIEW_JPEG_QUALITY
+from text_encoding import z_to_text_with_header
+from image_encoding import z_to_image_with_header
+
+# ==================== 產生圖檔 ====================
+def encode_png(image):
+    """PIL Image → PNG bytes"""
+    buf = BytesIO()
+    image.save(buf, format='PNG')
+    return buf.getvalue()
+
+def render_qr_png(content):
+    """
+    功能:
+        將文字內容畫成 QR Code
+
+    參數:
+        content: QR Code 內容（字串）
+
+    返回:
+        png_bytes: PNG bytes
+
+    例外:
+        資料超過 QR Code 容量時拋出 qrcode 的例外
+    """
+    qr = qrcode.QRCode(version=None, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=2)
+    qr.add_data(content)
+    qr.make(fit=True)
+    return encode_png(qr.make_image(fill_color="black", back_color="white").convert('RGB'))
+
+def render_z_image_png(z_bits, style_num, img_num, img_size, fast_decode=False):
+    """Z 碼 → 含標頭的 Z碼圖 PNG bytes"""
+    z_img, _ = z_to_image_with_header(z_bits, int(style_num), int(img_num), int(img_size), fast_decode)
+    return encode_png(z_img)
+
+def render_embed_artifacts(result):
+    """
+    功能:
+        產生嵌入結果頁的 Z碼圖
+
+    參數:
+        result: st.session_state.embed_result
+
+    返回:
+        dict:
+            - kind: 'qr'（文字機密的 QR Code）、'image_fallback'（文字太長改用 Z碼圖）或 'image'（圖像機密）
+            - png: Z碼圖 PNG bytes（顯示與下載共用）
+
+    原理:
+        文字機密優先生成 QR Code，資料太多時改用圖像 Z碼；圖像機密直接用圖像 Z碼
+    """
+    style_num = result.get("style_num", 1)
+    _, img_num, img_size = result["embed_image_choice"].split("-")[:3]
+    fast_decode = result.get("fast_decode", False)  # 載體用快速灰階解碼時記在標頭
+
+    if result['embed_secret_type'] == "文字":
+        # 格式: 風格編號-圖像編號-尺寸|Z碼（快速解碼: 風格編號-圖像編號-尺寸-f|Z碼）
+        qr_content = z_to_text_with_header(result['z_bits'], style_num, img_num, img_size, fast_decode)
+        try:
+            return {'kind': 'qr', 'png': render_qr_png(qr_content)}
+        except Exception:
+            return {'kind': 'image_fallback',
+                    'png': render_z_image_png(result['z_bits'], style_num, img_num, img_size, fast_decode)}
+
+    return {'kind': 'image', 'png': render_z_image_png(result['z_bits'], style_num, img_num, img_size, fast_decode)}
+
+# ==================== 預覽縮圖 ====================
+def make_thumbnail(data, max_side=PREVIEW_MAX_SIDE):
+    """
+    功能:
+        產生網頁預覽用的縮圖
+
+    參數:
+        data: 圖檔 bytes
+        max_side: 縮圖最長邊
+
+    返回:
+        thumbnail_bytes: 縮圖 bytes（有透明通道用 PNG，否則 JPEG）；
+                         原圖已經夠小時直接返回原本的 bytes
+
+    原理:
+        JPEG 先用 draft() 在解碼時就縮小，再用 thumbnail()（內部以 reduce() 整數倍縮小後再重新取樣）
+    """
+    image = Image.open(BytesIO(data))
+    if max(image.size) <= max_side:
+        return data
+
+    image.draft(image.mode, (max_side, max_side))
+    if image.mode not in ('L', 'RGB', 'RGBA'):
+        has_alpha = 'A' in image.mode or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    image.thumbnail((max_side, max_side))
+
+    buf = BytesIO()
+    if image.mode == 'RGBA':
+        image.save(buf, format='PNG')
+    else:
+        image.save(buf, format='JPEG', quality=PREVIEW_JPEG_QUALITY)
+    return buf.getvalue()
+
+# ==================== 快取 ====================
+def new_result_id():
+    """結果編號（每次嵌入、提取產生新的）"""
+    return uuid.uuid4().hex
+
+class ArtifactCache:
+    """
+    結果頁產物快取（放在 st.session_state，每個使用者各自一份）
+
+    結構:
+        {結果編號: {產物名稱: 產物}}
+
+    用法:
+        cache.get(result_id, 'z_code', lambda: render_embed_artifacts(r))
+        cache.get(result_id, 'z_code_preview', lambda: make_thumbnail(z_code['png']))
+        cache.evict(result_id)   # 離開結果頁時
+    """
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, result_id, name, render):
+        """取得產物，沒有才呼叫 render() 產生"""
+        artifacts = self._entries.setdefault(result_id, {})
+        if name not in artifacts:
+            artifacts[name] = render()
+        return artifacts[name]
+
+    def evict(self, result_id):
+        """移除某個結果的所有產物"""
+        self._entries.pop(result_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __contains__(self, result_id):
+        return result_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
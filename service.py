@@ -0,0 +1,449 @@
+# 建立 service.py → HTTP 服務模組
+# 以 ASGI 介面提供 /embed、/extract、/capacity（不依賴任何 web 框架）
+#
+# 用法:
+#   python service.py --port 8000 --workers 4        # 需要安裝 uvicorn
+#   uvicorn service:app --port 8000
+#
+# 本機測試（不開 port）:
+#   client = ServiceClient(create_app(workers=0))
+#   status, body = client.post('/capacity', {'text': 'Hello'})
+
+import os
+import sys
+import json
+import base64
+import asyncio
+import argparse
+import functools
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from embed import embed_secret, plan_embedding, calculate_capacity
+from autofit import fit_image_secret
+from extract import detect_and_extract, identify_contact
+from config import AVAILABLE_SIZES
+from image_library import load_library_cover, get_library_image, get_cache_path, COVER_CACHE_DIR, FAST_COVER_DECODE
+from ecihmsb import parse_library_ref, encode_z_code, decode_z_code
+
+DEFAULT_QUEUE_SIZE = 16     # 等待中的請求上限（超過即回 503）
+COVER_CACHE_SIZE = 32       # 每個 worker 快取的灰階載體數量
+# 解碼後的灰階載體存成 .npy，所有 worker 以唯讀 mmap 共用（可用環境變數 ECIHMSB_GRAY_CACHE_DIR 指定）
+GRAY_CACHE_DIR = os.environ.get('ECIHMSB_GRAY_CACHE_DIR', os.path.join(COVER_CACHE_DIR, 'gray'))
+MAX_BODY_BYTES = 32 << 20   # 請求內容上限 32 MB
+
+# ==================== Worker 端（在子行程執行）====================
+def library_ref(source):
+    """
+    功能:
+        檢查請求的 cover 是圖片庫代號（服務不接受伺服器上的檔案路徑）
+
+    參數:
+        source: 請求中的 cover 字串
+
+    返回:
+        (style_num, img_num, img_size)
+
+    例外:
+        不是「風格編號-圖像編號-尺寸」或尺寸不在 AVAILABLE_SIZES 時拋出 ValueError
+    """
+    ref = parse_library_ref(source)
+    if ref is None or ref[2] not in AVAILABLE_SIZES:
+        raise ValueError(f"cover 必須是圖片庫代號「風格編號-圖像編號-尺寸」（尺寸: {AVAILABLE_SIZES}），"
+                         f"自訂載體請用 cover_b64")
+    return ref
+
+def load_shared_cover(ref, fast=False):
+    """
+    功能:
+        從跨行程共用的灰階快取載入圖片庫載體（沒有時解碼後寫入）
+
+    參數:
+        ref: (style_num, img_num, img_size)，見 library_ref
+        fast: 是否用快速灰階解碼（見 image_library.decode_cover_gray）
+
+    返回:
+        cover: numpy array（唯讀；讀到快取檔時是 mmap，各 worker 共用作業系統的分頁快取）
+
+    註:
+        先寫暫存檔再改名，其他 worker 不會讀到寫一半的檔案；
+        原始圖片不在磁碟快取（下載失敗、改用漸層備用載體）時不寫入，下次仍會重新下載
+    """
+    style_num, img_num, img_size = ref
+    path = os.path.join(GRAY_CACHE_DIR, f"{style_num}-{img_num}-{img_size}{'-fast' if fast else ''}.npy")
+    try:
+        return np.asarray(np.load(path, mmap_mode='r'))
+    except (OSError, ValueError):
+        pass
+
+    cover = np.array(load_library_cover(*ref, fast=fast))
+    entry = get_library_image(style_num, img_num)
+    if os.path.exists(get_cache_path(entry['id'], img_size)):
+        try:
+            os.makedirs(GRAY_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, cover)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+    cover.setflags(write=False)
+    return cover
+
+@functools.lru_cache(maxsize=COVER_CACHE_SIZE)
+def load_cover_cached(ref, fast=False):
+    """
+    功能:
+        載入圖片庫載體並快取在 worker 記憶體
+
+    參數:
+        ref: (style_num, img_num, img_size)，見 library_ref
+        fast: 是否用快速灰階解碼（見 image_library.decode_cover_gray）
+
+    返回:
+        cover: numpy array（唯讀，避免被修改後污染快取）
+
+    註:
+        原始圖片檔、解碼後的灰階陣列都存在磁碟快取，所有 worker 共用（見 load_shared_cover），
+        一張載體只解碼一次；MSB 平面依對象密鑰而不同，每個請求各自計算，不寫入共用快取
+    """
+    return load_shared_cover(ref, fast)
+
+def resolve_cover(request, fast=None):
+    """
+    功能:
+        取得請求指定的載體
+
+    參數:
+        request: 請求內容，'cover'（圖片庫代號）或 'cover_b64'（base64 圖片）
+        fast: 圖片庫載體是否用快速灰階解碼（提取時依 Z 碼 header；None 表示 FAST_COVER_DECODE）
+
+    返回:
+        (cover, header): 灰階載體、要寫入 Z 碼 header 的 (style_num, img_num, img_size, fast_decode)
+
+    例外:
+        cover 不是圖片庫代號時拋出 ValueError（見 library_ref）
+    """
+    if request.get('cover_b64'):
+        gray = Image.open(BytesIO(base64.b64decode(request['cover_b64']))).convert('L')
+        cover = np.array(gray)
+        return cover, (0, 0, cover.shape[1], False)
+
+    source = request.get('cover')
+    if not source:
+        raise ValueError("缺少 cover 或 cover_b64")
+    ref = library_ref(source)
+    fast = FAST_COVER_DECODE if fast is None else bool(fast)
+    return load_cover_cached(ref, fast), ref + (fast,)
+
+def read_secret(request):
+    """
+    功能:
+        取得請求中的機密內容
+
+    參數:
+        request: 請求內容，'text'（文字）或 'image_b64'（base64 圖片）
+
+    返回:
+        (secret, secret_type)
+    """
+    if request.get('text') is not None:
+        return request['text'], 'text'
+    if request.get('image_b64'):
+        return Image.open(BytesIO(base64.b64decode(request['image_b64']))), 'image'
+    raise ValueError("缺少 text 或 image_b64")
+
+def embed_job(request):
+    """
+    功能:
+        嵌入工作（在 worker 執行）
+
+    參數:
+        request: {'cover' | 'cover_b64', 'text' | 'image_b64', 'contact_key', 'format', 'backend'（選填）,
+                  'image_codec'、'quality'（選填，圖像機密壓縮方式）、'text_codec'（選填，文字機密編碼方式）、
+                  'autofit'（選填，圖像機密放不下時自動縮放）、'key_tag'（選填，加上密鑰檢查碼）、
+                  'progressive'（選填，逐像素圖像用漸進式順序）}
+
+    返回:
+        dict: {'z_code' 或 'z_code_b64', 'info'}
+    """
+    cover, header = resolve_cover(request)
+    secret, secret_type = read_secret(request)
+    quality, fit_info = request.get('quality'), None
+    if request.get('autofit') and secret_type == 'image':
+        secret, fit_info = fit_image_secret(secret, budget_bits=calculate_capacity(cover.shape[1], cover.shape[0]),
+                                            image_codec=request.get('image_codec'), quality=quality,
+                                            key_tag=request.get('key_tag'), progressive=request.get('progressive'))
+        quality = fit_info['quality']
+    z_bits, capacity, info = embed_secret(cover, secret, secret_type=secret_type, contact_key=request.get('contact_key'),
+                                          backend=request.get('backend'), image_codec=request.get('image_codec'),
+                                          quality=quality, text_codec=request.get('text_codec'), key_tag=request.get('key_tag'),
+                                          progressive=request.get('progressive'))
+
+    fmt = request.get('format') or ('text' if secret_type == 'text' else 'png')
+    output = encode_z_code(z_bits, *header, fmt=fmt)
+    info = dict(info, capacity=capacity, z_bits=len(z_bits))
+    if fit_info is not None:
+        info['autofit'] = fit_info
+    if fmt == 'png':
+        return {'z_code_b64': base64.b64encode(output).decode(), 'info': info}
+    return {'z_code': output.decode('utf-8').strip(), 'info': info}
+
+def extract_job(request):
+    """
+    功能:
+        提取工作（在 worker 執行）
+
+    參數:
+        request: {'z_code' | 'z_code_b64', 'contact_key' | 'contacts'（{名稱: 密鑰}，自動偵測對象）,
+                  'cover'（選填）| 'cover_b64'（選填）, 'backend'（選填）, 'early_abort'（選填，開頭格式不合就停止，
+                  內容評分記在 info['plausibility']）}
+
+    返回:
+        dict: {'type', 'text' 或 'image_b64', 'info'}
+    """
+    if request.get('z_code_b64'):
+        z_bits, header = decode_z_code(base64.b64decode(request['z_code_b64']))
+    elif request.get('z_code'):
+        z_bits, header = decode_z_code(request['z_code'].encode('utf-8'))
+    else:
+        raise ValueError("缺少 z_code 或 z_code_b64")
+
+    if not request.get('cover') and not request.get('cover_b64'):
+        if header is None or header[0] == 0:
+            raise ValueError("Z 碼沒有圖片庫資訊，請指定 cover")
+        request = dict(request, cover='-'.join(str(v) for v in header[:3]))
+    cover, _ = resolve_cover(request, fast=header[3] if header else None)
+
+    contact_key, contact = request.get('contact_key'), None
+    if request.get('contacts'):
+        contact, detection = identify_contact(cover, z_bits, request['contacts'])
+        if contact is None:
+            raise ValueError("無法判斷對象" if len(detection['candidates']) > 1 else "沒有對象符合這個 Z 碼")
+        contact_key = request['contacts'][contact]
+    secret, secret_type, info = detect_and_extract(cover, z_bits, contact_key=contact_key, backend=request.get('backend'),
+                                                   early_abort=bool(request.get('early_abort')))
+    if contact is not None:
+        info = dict(info, contact=contact)
+    info = {k: v for k, v in info.items() if isinstance(v, (int, float, str, bool, list, tuple, dict, type(None)))}
+    if secret_type == 'text':
+        return {'type': 'text', 'text': secret, 'info': info}
+    buf = BytesIO()
+    secret.save(buf, format='PNG')
+    return {'type': 'image', 'image_b64': base64.b64encode(buf.getvalue()).decode(), 'info': info}
+
+def capacity_job(request):
+    """
+    功能:
+        容量規劃（只讀 header，直接在事件迴圈執行；壓縮圖像要準確值時在 worker 執行）
+
+    參數:
+        request: {'text' | 'image_b64', 'image_codec'、'quality'、'text_codec'、'key_tag'、'progressive'（選填）,
+                  'exact'（選填，預設 true；false 時壓縮圖像不實際壓縮，只回傳估計值，見 plan_embedding）}
+
+    返回:
+        dict: plan_embedding 的結果
+    """
+    secret, secret_type = read_secret(request)
+    return plan_embedding(secret, secret_type, image_codec=request.get('image_codec'), quality=request.get('quality'),
+                          text_codec=request.get('text_codec'), key_tag=request.get('key_tag'),
+                          progressive=request.get('progressive'), exact=request.get('exact') is not False)
+
+# ==================== ASGI 應用 ====================
+class ServiceApp:
+    """
+    ASGI 應用：路由 + 有上限的工作佇列
+
+    參數:
+        workers: worker 行程數（0 表示在同一行程的執行緒執行，方便本機測試）
+        queue_size: 等待中的請求上限，超過即回 503（背壓）
+    """
+    ROUTES = {
+        '/embed': embed_job,
+        '/extract': extract_job,
+    }
+
+    def __init__(self, workers=None, queue_size=DEFAULT_QUEUE_SIZE):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max(self.workers, 1) + queue_size
+        self.pending = 0
+        self.executor = None
+
+    def get_executor(self):
+        """延遲建立 worker pool（第一次有工作時才啟動行程）"""
+        if self.executor is None:
+            if self.workers > 0:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=1)
+        return self.executor
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.handle_lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        status, body = await self.handle_http(scope, receive)
+        headers = [(b'content-type', b'application/json; charset=utf-8')]
+        if status == 503:
+            headers.append((b'retry-after', b'1'))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': json.dumps(body, ensure_ascii=False).encode('utf-8')})
+
+    async def handle_lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise ValueError("請求內容太大")
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def handle_http(self, scope, receive):
+        """
+        功能:
+            處理一個 HTTP 請求
+
+        返回:
+            (status, body): HTTP 狀態碼、JSON 內容
+        """
+        path, method = scope['path'], scope['method']
+        if path == '/health':
+            return 200, {'status': 'ok', 'pending': self.pending, 'max_pending': self.max_pending}
+        if path not in self.ROUTES and path != '/capacity':
+            return 404, {'error': f'找不到路徑 {path}'}
+        if method != 'POST':
+            return 405, {'error': '只接受 POST'}
+
+        try:
+            request = json.loads(await self.read_body(receive) or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError("請求內容必須是 JSON 物件")
+        except ValueError as e:
+            return 400, {'error': f'請求格式錯誤：{e}'}
+
+        # 容量規劃很輕，不進 worker pool（壓縮圖像的準確值需要實際壓縮，仍交給 worker）
+        if path == '/capacity' and ((request.get('image_codec') or 'raw') == 'raw' or request.get('exact') is False):
+            try:
+                return 200, capacity_job(request)
+            except Exception as e:
+                return 400, {'error': str(e)}
+
+        # 背壓：等待 + 執行中的工作已滿就直接拒絕，避免請求無限堆積
+        if self.pending >= self.max_pending:
+            return 503, {'error': '伺服器忙碌中，請稍後再試'}
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            job = capacity_job if path == '/capacity' else self.ROUTES[path]
+            result = await loop.run_in_executor(self.get_executor(), job, request)
+            return 200, result
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': f'{type(e).__name__}: {e}'}
+        finally:
+            self.pending -= 1
+
+def create_app(workers=None, queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    功能:
+        建立 ASGI 應用
+
+    參數:
+        workers: worker 行程數（預設 CPU 核心數，0 表示不開子行程）
+        queue_size: 等待中的請求上限
+
+    返回:
+        ServiceApp
+    """
+    return ServiceApp(workers=workers, queue_size=queue_size)
+
+# 給 uvicorn service:app 使用（worker 數可用環境變數 ECIHMSB_WORKERS 設定）
+app = create_app(workers=int(os.environ['ECIHMSB_WORKERS']) if os.environ.get('ECIHMSB_WORKERS') else None)
+
+# ==================== 本機測試用 client ====================
+class ServiceClient:
+    """
+    在同一行程直接呼叫 ASGI 應用（不開 port），用於本機測試
+
+    範例:
+        client = ServiceClient(create_app(workers=0))
+        status, body = client.post('/embed', {'cover_b64': ..., 'text': 'Hi'})
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def request_async(self, method, path, payload=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        scope = {'type': 'http', 'method': method, 'path': path, 'headers': []}
+        received = {'sent': False}
+        response = {}
+
+        async def receive():
+            if received['sent']:
+                return {'type': 'http.disconnect'}
+            received['sent'] = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['body'] = response.get('body', b'') + message.get('body', b'')
+
+        await self.app(scope, receive, send)
+        return response['status'], json.loads(response['body'])
+
+    def request(self, method, path, payload=None):
+        return asyncio.run(self.request_async(method, path, payload))
+
+    def post(self, path, payload):
+        return self.request('POST', path, payload)
+
+    def get(self, path):
+        return self.request('GET', path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="E-CIHMSB HTTP 服務")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None, help="worker 行程數（預設 CPU 核心數）")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help="等待中的請求上限")
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("需要安裝 uvicorn：pip install uvicorn", file=sys.stderr)
+        return 1
+
+    uvicorn.run(create_app(args.workers, args.queue_size), host=args.host, port=args.port)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,28 @@
+# 建立 tests/conftest.py → pytest 共用設定
+# 模組都放在專案根目錄（同 conformance/、benchmarks/ 的做法），測試從根目錄匯入
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+@pytest.fixture
+def cover():
+    """256×256 漸層 + 少量雜訊的灰階載體（接近真實照片）"""
+    rng = np.random.default_rng(0)
+    gradient = np.add.outer(np.arange(256), np.arange(256)) / 2
+    return np.clip(gradient + rng.integers(-3, 4, (256, 256)), 0, 255).astype(np.uint8)
+
+
+@pytest.fixture
+def photo():
+    """32×24 彩色漸層圖（圖像機密）"""
+    x, y = np.meshgrid(np.linspace(0, 255, 32), np.linspace(0, 255, 24))
+    return Image.fromarray(np.stack([x, y, (x + y) / 2], axis=-1).astype(np.uint8), 'RGB')
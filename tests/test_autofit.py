@@ -0,0 +1,60 @@
+# 建立 tests/test_autofit.py → 圖像機密自動縮放與調色盤壓縮測試
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from autofit import fit_image_secret, quantize_palette, required_bits
+from secret_encoding import encode_image_file, decode_image_file
+
+
+@pytest.fixture
+def noisy_photo():
+    """128×128 彩色漸層 + 雜訊（無損壓縮效果差，減色後明顯變小）"""
+    rng = np.random.default_rng(0)
+    x, y = np.meshgrid(np.linspace(0, 255, 128), np.linspace(0, 255, 128))
+    pixels = np.stack([x, y, (x + y) / 2], axis=-1) + rng.normal(0, 12, (128, 128, 3))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), 'RGB')
+
+
+def test_palette_png_keeps_palette(noisy_photo):
+    quantized = quantize_palette(noisy_photo)
+    palette_png = encode_image_file(quantized, 'png')
+    rgb_png = encode_image_file(quantized.convert('RGB'), 'png')
+    assert len(palette_png) < len(rgb_png) * 0.6
+
+    restored = decode_image_file(palette_png)
+    assert restored.mode == 'P'
+    assert np.array_equal(np.asarray(restored.convert('RGB')), np.asarray(quantized.convert('RGB')))
+
+
+def test_palette_png_keeps_transparency(noisy_photo):
+    rgba = noisy_photo.convert('RGBA')
+    rgba.putalpha(Image.new('L', rgba.size, 128))
+    restored = decode_image_file(encode_image_file(quantize_palette(rgba), 'png'))
+    assert restored.convert('RGBA').getextrema()[3] != (255, 255)
+
+
+def test_autofit_quantizes_before_shrinking(noisy_photo):
+    palette_bits = required_bits(quantize_palette(noisy_photo), 'png', None)
+    assert palette_bits < required_bits(noisy_photo, 'png', None)
+
+    fitted, info = fit_image_secret(noisy_photo, budget_bits=palette_bits + 64, image_codec='png')
+    assert info['quantized'] and info['size'] == noisy_photo.size
+    assert info['required_bits'] <= palette_bits + 64
+
+
+def test_autofit_shrinks_raw(photo):
+    fitted, info = fit_image_secret(photo, budget_bits=5000, image_codec='raw')
+    assert info['changed'] and info['required_bits'] <= 5000
+    assert fitted.size[0] / fitted.size[1] == pytest.approx(photo.size[0] / photo.size[1], rel=0.2)
+
+
+def test_webp_hidden_without_pillow_support(monkeypatch, capsys):
+    import secret_encoding
+    monkeypatch.setattr(secret_encoding.features, 'check', lambda name: name != 'webp')
+    assert secret_encoding.available_image_codecs() == ['raw', 'png', 'jpeg']
+    import ecihmsb
+    with pytest.raises(SystemExit):
+        ecihmsb.build_parser().parse_args(['embed', '--cover', 'c.png', '--image', 'a.png', '--image-codec', 'webp'])
+    assert "invalid choice: 'webp'" in capsys.readouterr().err
@@ -0,0 +1,25 @@
+# 建立 tests/test_backends.py → 運算後端註冊表測試
+
+import numpy as np
+import pytest
+
+from backends import Backend, register_backend, available_backends, get_backend
+
+
+def test_incomplete_backend_cannot_be_created():
+    class Incomplete(Backend):
+        name = 'incomplete'
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_register_rejects_non_backend():
+    with pytest.raises(TypeError):
+        register_backend(object())
+
+
+@pytest.mark.parametrize('name', available_backends())
+def test_backends_match_reference(cover, name):
+    expected = list(get_backend('reference').msb_plane(cover, 40, 'Alice', first_block=3))
+    assert [int(v) for v in get_backend(name).msb_plane(cover, 40, 'Alice', first_block=3)] == expected
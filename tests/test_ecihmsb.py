@@ -0,0 +1,51 @@
+# 建立 tests/test_ecihmsb.py → 命令列與函式庫入口測試
+
+import numpy as np
+from PIL import Image
+
+import ecihmsb
+
+
+def write_cover(path, width, height):
+    rng = np.random.default_rng(1)
+    Image.fromarray(rng.integers(0, 256, (height, width), dtype=np.uint8), 'L').save(path)
+    return str(path)
+
+
+def test_local_non_square_cover_round_trip(tmp_path):
+    cover_path = write_cover(tmp_path / 'cover.png', 384, 256)
+    output, _ = ecihmsb.embed(cover_path, '非正方形載體', contact_key='Alice')
+    secret, secret_type, _ = ecihmsb.extract(output, contact_key='Alice', cover_source=cover_path)
+    assert (secret_type, secret) == ('text', '非正方形載體')
+
+
+def test_cli_round_trip(tmp_path, photo):
+    cover_path = write_cover(tmp_path / 'cover.png', 384, 256)
+    photo.save(tmp_path / 'secret.png')
+    z_path, out_path = str(tmp_path / 'z.png'), str(tmp_path / 'out.png')
+    assert ecihmsb.main(['embed', '--cover', cover_path, '--image', str(tmp_path / 'secret.png'),
+                         '--key', 'Alice', '--output', z_path]) == 0
+    assert ecihmsb.main(['extract', '--z', z_path, '--cover', cover_path, '--key', 'Alice', '--output', out_path]) == 0
+    assert np.array_equal(np.asarray(Image.open(out_path)), np.asarray(photo))
+
+
+def test_library_ref_parsing():
+    assert ecihmsb.parse_library_ref('1-3-512') == (1, 3, 512)
+    assert ecihmsb.parse_library_ref('/etc/passwd') is None
+
+
+def test_library_cover_decode_mode_follows_header(monkeypatch, cover):
+    calls = []
+
+    def fake_library_cover(style_num, img_num, size, fast=None):
+        calls.append(fast)
+        return Image.fromarray(cover[:size, :size], 'L')
+
+    monkeypatch.setattr(ecihmsb, 'load_library_cover', fake_library_cover)
+    monkeypatch.setattr(ecihmsb, 'FAST_COVER_DECODE', True)
+    output, _ = ecihmsb.embed('1-2-128', '快速解碼', contact_key='Alice')
+    assert output.startswith(b'1-2-128-f|')
+
+    monkeypatch.setattr(ecihmsb, 'FAST_COVER_DECODE', False)  # 提取端設定不同也依 header 解碼
+    secret, _, _ = ecihmsb.extract(output, contact_key='Alice')
+    assert secret == '快速解碼' and calls == [True, True]
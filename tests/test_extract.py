@@ -0,0 +1,119 @@
+# 建立 tests/test_extract.py → 擴充 header、密鑰檢查碼、部分提取與漸進式預覽測試
+
+import numpy as np
+import pytest
+
+from config import EXTENDED_HEADER_SIZE, KEY_TAG_SIZE, TYPE_MARKER_SIZE
+from embed import embed_secret, plan_embedding
+from extract import (check_key, detect_and_extract, extract_range, extract_preview, identify_contact,
+                     KEY_MISMATCH_MESSAGE, GARBLED_MESSAGE)
+
+TEXT = '部分提取：只還原涵蓋的區塊 Range extraction test'
+
+
+def test_legacy_header_by_default(cover):
+    z_bits, _, _ = embed_secret(cover, 'Hi', contact_key='Alice')
+    assert len(z_bits) == TYPE_MARKER_SIZE + 16
+    assert check_key(cover, z_bits, 'Alice') is None
+
+
+def test_v2_header_with_key_tag(cover):
+    z_bits, _, _ = embed_secret(cover, 'Hi', contact_key='Alice', key_tag=True)
+    assert len(z_bits) == TYPE_MARKER_SIZE + EXTENDED_HEADER_SIZE + KEY_TAG_SIZE + 16
+    assert len(z_bits) == plan_embedding('Hi', key_tag=True)['required_bits']
+    assert check_key(cover, z_bits, 'Alice') is True
+    assert check_key(cover, z_bits, 'Bob') is False
+    assert detect_and_extract(cover, z_bits, contact_key='Alice')[0] == 'Hi'
+    with pytest.raises(ValueError, match=KEY_MISMATCH_MESSAGE):
+        detect_and_extract(cover, z_bits, contact_key='Bob')
+
+
+def test_identify_contact(cover):
+    z_bits, _, _ = embed_secret(cover, 'Hi', contact_key='c-key', key_tag=True)
+    assert identify_contact(cover, z_bits, {'Alice': 'a-key', 'Bob': 'b-key', 'Carol': 'c-key'})[0] == 'Carol'
+
+
+@pytest.mark.parametrize('key_tag', [False, True])
+@pytest.mark.parametrize('start, end', [(0, 5), (7, 30), (20, None), (200, 300)])
+def test_extract_range_matches_full(cover, key_tag, start, end):
+    z_bits, _, _ = embed_secret(cover, TEXT, contact_key='Alice', key_tag=key_tag)
+    data, info = extract_range(cover, z_bits, start, end, contact_key='Alice')
+    full = TEXT.encode('utf-8')
+    assert info['content_bytes'] == len(full)
+    assert data == full[start:end]
+
+
+def test_extract_range_rejects_wrong_key(cover):
+    z_bits, _, _ = embed_secret(cover, TEXT, contact_key='Alice', key_tag=True)
+    with pytest.raises(ValueError, match=KEY_MISMATCH_MESSAGE):
+        extract_range(cover, z_bits, 0, 4, contact_key='Bob')
+
+
+@pytest.mark.parametrize('progressive', [False, True])
+def test_progressive_round_trip_and_preview(cover, photo, progressive):
+    z_bits, _, _ = embed_secret(cover, photo, secret_type='image', contact_key='Alice', progressive=progressive)
+    restored, secret_type, _ = detect_and_extract(cover, z_bits, contact_key='Alice')
+    assert secret_type == 'image' and np.array_equal(np.array(restored), np.array(photo))
+
+    preview, info = extract_preview(cover, z_bits, 0.05, contact_key='Alice')
+    assert info['progressive'] is progressive and preview.size == photo.size
+    assert info['end_byte'] < info['content_bytes']
+    full, _ = extract_preview(cover, z_bits, 1.0, contact_key='Alice')
+    assert np.array_equal(np.array(full.convert('RGB')), np.array(photo))
+
+
+@pytest.fixture
+def noise_cover():
+    """256×256 均勻雜訊載體（選錯密鑰時開頭區塊的 MSB 幾乎全變）"""
+    return np.random.default_rng(1).integers(0, 256, (256, 256), dtype=np.uint8)
+
+
+def test_short_z_code_wrong_key_stops(noise_cover):
+    z_bits, _, _ = embed_secret(noise_cover, 'hello world', contact_key='A' * 32)
+    aborted = 0
+    for i in range(32):
+        try:
+            detect_and_extract(noise_cover, z_bits, contact_key=f'wrong-{i}', early_abort=True)
+        except ValueError as e:
+            assert str(e) == GARBLED_MESSAGE
+            aborted += 1
+    assert aborted > 0
+
+
+def test_legacy_image_size_checked_before_decoding(noise_cover):
+    z_bits, _, _ = embed_secret(noise_cover, 'hello world', contact_key='A' * 32)
+    z_bits = [1 - z_bits[0]] + z_bits[1:]  # 類型標記改成圖像：header 是亂碼尺寸
+    secret, secret_type, info = detect_and_extract(noise_cover, z_bits, contact_key='A' * 32)
+    assert secret_type == 'image' and 'error' in info
+
+
+def test_key_tag_on_noise_cover(noise_cover):
+    z_bits, _, _ = embed_secret(noise_cover, 'hello world', contact_key='A' * 32, key_tag=True)
+    assert check_key(noise_cover, z_bits, 'A' * 32) is True
+    assert all(check_key(noise_cover, z_bits, f'wrong-{i}') is False for i in range(50))
+    contacts = {f'c{i}': f'wrong-{i}' for i in range(20)}
+    contacts['me'] = 'A' * 32
+    name, details = identify_contact(noise_cover, z_bits, contacts)
+    assert name == 'me' and details['method'] == 'tag'
+    for i in range(20):
+        with pytest.raises(ValueError, match=KEY_MISMATCH_MESSAGE):
+            detect_and_extract(noise_cover, z_bits, contact_key=f'wrong-{i}', early_abort=True)
+    assert detect_and_extract(noise_cover, z_bits, contact_key='A' * 32)[0] == 'hello world'
+
+
+def test_extract_range_with_key_tag_on_noise_cover(noise_cover, photo):
+    z_bits, _, _ = embed_secret(noise_cover, photo, secret_type='image', contact_key='Alice', key_tag=True)
+    full, info = extract_range(noise_cover, z_bits, 0, None, contact_key='Alice')
+    for start, end in [(0, 3), (5, 40), (100, None)]:
+        assert extract_range(noise_cover, z_bits, start, end, contact_key='Alice')[0] == full[start:end]
+    restored = detect_and_extract(noise_cover, z_bits, contact_key='Alice')[0]
+    assert np.array_equal(np.array(restored), np.array(photo))
+
+
+def test_bad_header_version_reports_garbled(cover, photo):
+    z_bits, _, _ = embed_secret(cover, photo, secret_type='image', contact_key='Alice', progressive=True)
+    z_bits[TYPE_MARKER_SIZE + 16] ^= 1  # 擴充 header 版本 2 → 10
+    with pytest.raises(ValueError, match=GARBLED_MESSAGE):
+        detect_and_extract(cover, z_bits, contact_key='Alice')
+    with pytest.raises(ValueError, match=GARBLED_MESSAGE):
+        extract_range(cover, z_bits, 0, 4, contact_key='Alice')
@@ -0,0 +1,27 @@
+# 建立 tests/test_golden.py → 黃金向量測試（conformance/golden_vectors.json 的 64×64 子集）
+# 完整的多後端比對請跑 conformance/run_conformance.py
+
+import json
+
+import pytest
+
+from conformance.run_conformance import GOLDEN_PATH, GOLDEN_KEYS, COVER_KINDS, make_cover, make_secrets, sha256_hex, secrets_equal
+from embed import embed_secret
+from extract import detect_and_extract
+
+with open(GOLDEN_PATH, 'r', encoding='utf-8') as f:
+    GOLDEN = json.load(f)['vectors']
+
+
+@pytest.mark.parametrize('kind', COVER_KINDS)
+def test_golden_vectors(kind):
+    cover = make_cover(kind, 64)
+    for secret_name, secret_type, secret in make_secrets():
+        for key in GOLDEN_KEYS:
+            stored = GOLDEN[f"{kind}_64/{secret_name}/key={key}"]
+            assert stored['cover_sha256'] == sha256_hex(cover.tobytes())
+            z_bits, _, _ = embed_secret(cover, secret, secret_type=secret_type, contact_key=key)
+            assert (sha256_hex(z_bits), len(z_bits)) == (stored['z_sha256'], stored['z_bits'])
+
+            restored, restored_type, _ = detect_and_extract(cover, z_bits, contact_key=key)
+            assert restored_type == secret_type and secrets_equal(restored, secret)
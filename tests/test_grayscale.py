@@ -0,0 +1,38 @@
+# 建立 tests/test_grayscale.py → 彩色載體轉灰階測試
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from embed import embed_secret
+from extract import detect_and_extract
+from image_processing import convert_to_grayscale
+
+
+@pytest.fixture
+def rgb_cover():
+    rng = np.random.default_rng(2)
+    return rng.integers(0, 256, (64, 64, 3), dtype=np.uint8)
+
+
+def test_default_is_legacy_truncation(rgb_cover):
+    legacy = (0.299 * rgb_cover[:, :, 0] + 0.587 * rgb_cover[:, :, 1] + 0.114 * rgb_cover[:, :, 2]).astype(np.uint8)
+    assert np.array_equal(convert_to_grayscale(rgb_cover), legacy)
+
+
+def test_pil_rounding_matches_pillow(rgb_cover):
+    expected = np.asarray(Image.fromarray(rgb_cover, 'RGB').convert('L'))
+    assert np.array_equal(convert_to_grayscale(rgb_cover, rounding='pil'), expected)
+
+
+@pytest.mark.parametrize('rounding', [None, 'legacy', 'pil'])
+def test_rgb_cover_round_trip(rgb_cover, rounding):
+    z_bits, _, _ = embed_secret(rgb_cover, '彩色載體', contact_key='Alice', rounding=rounding)
+    secret, secret_type, _ = detect_and_extract(rgb_cover, z_bits, contact_key='Alice', rounding=rounding)
+    assert (secret_type, secret) == ('text', '彩色載體')
+
+
+def test_legacy_z_code_needs_legacy_rounding(rgb_cover):
+    z_bits, _, _ = embed_secret(rgb_cover, '舊版 Z 碼的內容比較長一點', contact_key='Alice', key_tag=False, rounding='legacy')
+    assert detect_and_extract(rgb_cover, z_bits, contact_key='Alice')[0] == '舊版 Z 碼的內容比較長一點'
+    assert detect_and_extract(rgb_cover, z_bits, contact_key='Alice', rounding='pil')[0] != '舊版 Z 碼的內容比較長一點'
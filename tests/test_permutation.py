@@ -0,0 +1,33 @@
+# 建立 tests/test_permutation.py → 排列密鑰與排列編號測試
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from permutation import generate_Q_from_block, get_key_composition_table, permutation_to_id, id_to_permutation
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_example_from_docstring():
+    block = np.tile([44, 61, 72, 58, 70, 79, 66, 0], (8, 1))
+    assert generate_Q_from_block(block) == [1, 4, 2, 7, 5, 3, 6]
+
+
+@pytest.mark.parametrize('contact_key', ['Alice', '王小明', '🔑' * 20])
+def test_key_composition_table_matches_per_block_q(contact_key):
+    rng = np.random.default_rng(3)
+    table = get_key_composition_table(contact_key)
+    for _ in range(200):
+        block = rng.integers(0, 256, (8, 8))
+        plain = permutation_to_id(generate_Q_from_block(block))
+        assert id_to_permutation(int(table[plain])) == generate_Q_from_block(block, contact_key=contact_key)
+
+
+def test_id_lookup_is_built_lazily():
+    code = "import permutation; print(permutation.get_permutation_id_lookup.cache_info().currsize)"
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == '0'
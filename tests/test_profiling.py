@@ -0,0 +1,24 @@
+# 建立 tests/test_profiling.py → 階段計時與收集器測試
+
+import profiling
+
+
+def test_nested_collectors():
+    with profiling.collect() as outer:
+        with profiling.collect() as inner:
+            with profiling.stage('b'):
+                pass
+        # 內層結束時兩個列表內容相同：不可把外層的收集器移除
+        with profiling.stage('c'):
+            pass
+    assert [r['stage'] for r in outer] == ['b', 'c']
+    assert [r['stage'] for r in inner] == ['b']
+
+
+def test_collect_into_existing_list():
+    records = []
+    for name in ('x', 'y'):
+        with profiling.collect(records):
+            with profiling.stage(name):
+                pass
+    assert [r['stage'] for r in records] == ['x', 'y']
@@ -0,0 +1,90 @@
+# 建立 tests/test_service.py → HTTP 服務測試（ServiceClient，不開 port）
+
+import base64
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from service import ServiceClient, create_app
+
+
+@pytest.fixture
+def client():
+    app = create_app(workers=0)
+    yield ServiceClient(app)
+    app.shutdown()
+
+
+@pytest.fixture
+def cover_b64(cover):
+    buf = BytesIO()
+    Image.fromarray(cover, 'L').save(buf, format='PNG')
+    return base64.b64encode(buf.getvalue()).decode()
+
+
+def test_text_round_trip(client, cover_b64):
+    status, body = client.post('/embed', {'cover_b64': cover_b64, 'text': '服務測試', 'contact_key': 'Alice'})
+    assert status == 200
+    status, body = client.post('/extract', {'z_code': body['z_code'], 'cover_b64': cover_b64, 'contact_key': 'Alice'})
+    assert status == 200 and body['text'] == '服務測試'
+
+
+def test_image_round_trip_with_contact_detection(client, cover_b64, photo):
+    buf = BytesIO()
+    photo.save(buf, format='PNG')
+    status, body = client.post('/embed', {'cover_b64': cover_b64, 'image_b64': base64.b64encode(buf.getvalue()).decode(),
+                                          'contact_key': 'Bob', 'image_codec': 'png', 'key_tag': True})
+    assert status == 200
+    status, body = client.post('/extract', {'z_code_b64': body['z_code_b64'], 'cover_b64': cover_b64,
+                                            'contacts': {'Alice': 'a-key', 'Bob': 'Bob'}})
+    assert status == 200 and body['info']['contact'] == 'Bob'
+    restored = Image.open(BytesIO(base64.b64decode(body['image_b64'])))
+    assert np.array_equal(np.asarray(restored.convert('RGB')), np.asarray(photo))
+
+
+@pytest.mark.parametrize('source', ['/etc/passwd', '../cover.png', '1-3-99999', '1-3'])
+def test_rejects_non_library_cover(client, source):
+    status, body = client.post('/embed', {'cover': source, 'text': 'x'})
+    assert status == 400 and 'cover' in body['error']
+
+
+def test_capacity(client):
+    status, body = client.post('/capacity', {'text': 'Hello'})
+    assert status == 200 and body['required_bits'] > 0
+    assert client.get('/health')[0] == 200
+
+
+def test_capacity_estimate_for_compressed_image(client, photo):
+    buf = BytesIO()
+    photo.save(buf, format='PNG')
+    request = {'image_b64': base64.b64encode(buf.getvalue()).decode(), 'image_codec': 'png'}
+    status, exact = client.post('/capacity', request)
+    assert status == 200 and exact['exact'] is True
+    status, estimate = client.post('/capacity', dict(request, exact=False))
+    assert status == 200 and estimate['exact'] is False
+    assert estimate['required_bits'] > 0
+
+
+def test_shared_gray_cache(monkeypatch, tmp_path, cover):
+    import service
+    calls = []
+    raw = tmp_path / 'raw.jpeg'
+    monkeypatch.setattr(service, 'GRAY_CACHE_DIR', str(tmp_path / 'gray'))
+    monkeypatch.setattr(service, 'get_cache_path', lambda pexels_id, size: str(raw))
+    monkeypatch.setattr(service, 'load_library_cover',
+                        lambda *ref, fast=None: calls.append(ref) or Image.fromarray(cover, 'L'))
+
+    # 原始圖片不在磁碟快取（備用載體）：不寫入共用快取
+    service.load_shared_cover((1, 1, 256))
+    assert not (tmp_path / 'gray').exists()
+
+    raw.write_bytes(b'jpeg')
+    first = service.load_shared_cover((1, 1, 256))
+    second = service.load_shared_cover((1, 1, 256))  # 其他 worker：直接讀 .npy，不再解碼
+    assert len(calls) == 2
+    assert np.array_equal(first, cover) and np.array_equal(second, cover)
+    assert not second.flags.writeable
+    service.load_shared_cover((1, 1, 256), fast=True)
+    assert len(calls) == 3
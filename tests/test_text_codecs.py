@@ -0,0 +1,44 @@
+# 建立 tests/test_text_codecs.py → 文字機密編碼（text_codecs.py）測試
+
+import pytest
+
+from secret_encoding import text_to_binary, binary_to_text, calculate_text_bits
+from text_codecs import TEXT_ESCAPE, TEXT_CODECS, available_text_codecs, encode_text_payload, text_codec_name
+
+MESSAGES = ['Hello', '今天下午三點在老地方見面', 'Meet me 在 101 大樓 at 3pm!', '', '😀 emoji']
+
+
+@pytest.mark.parametrize('codec', available_text_codecs())
+@pytest.mark.parametrize('text', MESSAGES)
+def test_round_trip(codec, text):
+    bits = text_to_binary(text, codec)
+    assert len(bits) == calculate_text_bits(text, codec)
+    assert binary_to_text(bits) == text
+
+
+@pytest.mark.parametrize('codec', list(TEXT_CODECS))
+def test_escape_prefix(codec):
+    text = '今天下午三點在老地方見面'
+    data = encode_text_payload(text, codec)
+    if len(data) < len(text.encode('utf-8')):
+        assert data[0] == TEXT_ESCAPE and data[1] == TEXT_CODECS[codec][0]
+        assert text_codec_name(data) == codec
+    else:
+        assert data == text.encode('utf-8')
+
+
+def test_raw_is_legacy_utf8():
+    text = '舊版 UTF-8'
+    assert encode_text_payload(text, 'raw') == text.encode('utf-8')
+    assert text_codec_name(text.encode('utf-8')) == 'raw'
+
+
+def test_auto_picks_shortest():
+    text = '今天下午三點在老地方見面'
+    auto = len(encode_text_payload(text, 'auto'))
+    assert auto == min(len(encode_text_payload(text, c)) for c in available_text_codecs() if c != 'auto')
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        text_to_binary('x', 'lzma')
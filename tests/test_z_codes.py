@@ -0,0 +1,28 @@
+# 建立 tests/test_z_codes.py → Z 碼輸出格式（含 header 文字、Z碼圖）測試
+
+import pytest
+
+from text_encoding import z_to_text_with_header, text_to_z_with_header
+from image_encoding import z_to_image_with_header, image_to_z_with_header
+
+Z_BITS = [1, 0, 1, 1, 0, 0, 1, 0, 1]
+
+
+@pytest.mark.parametrize('fast_decode', [False, True])
+def test_text_header_round_trip(fast_decode):
+    content = z_to_text_with_header(Z_BITS, 2, 5, 512, fast_decode)
+    assert content.startswith('2-5-512-f|' if fast_decode else '2-5-512|')
+    assert text_to_z_with_header(content) == (Z_BITS, 2, 5, 512, fast_decode)
+
+
+def test_text_header_old_format():
+    assert text_to_z_with_header('3-256|1011') == ([1, 0, 1, 1], 1, 3, 256, False)
+    with pytest.raises(ValueError):
+        text_to_z_with_header('1-3-256-x-y|1011')
+
+
+@pytest.mark.parametrize('fast_decode', [False, True])
+def test_image_header_round_trip(fast_decode):
+    image, length = z_to_image_with_header(Z_BITS, 5, 7, 4096, fast_decode)
+    assert length == len(Z_BITS)
+    assert image_to_z_with_header(image) == (Z_BITS, 5, 7, 4096, fast_decode)
@@ -0,0 +1,211 @@
+# 建立 text_codecs.py → 文字壓縮模組
+# 短訊息文字機密的編碼方式（選用），以跳脫位元組標示，與舊版 UTF-8 格式相容
+#
+# 格式（XOR 加密前的文字內容）:
+#   舊版: [UTF-8 bytes]
+#   壓縮: [0xFF] + [編碼編號 1 byte] + [編碼後的 bytes]
+#   UTF-8 的第一個 byte 不可能是 0xFF，所以舊版 Z 碼一定不會被誤認
+#
+# 編碼方式:
+#   raw:     UTF-8（舊版）
+#   deflate: 預設字典的 raw deflate（常見中英文短句，短訊息也壓得動）
+#   utf16:   UTF-16BE（中文每字 2 bytes，UTF-8 要 3 bytes）
+#   cjk:     ASCII 1 byte、中日文 2 bytes 的視窗編碼（中英混合的訊息比 UTF-16 短）
+#   auto:    所有編碼都試一次，取最短的（都沒有比 UTF-8 短就用 UTF-8）
+
+import zlib
+
+from config import DEFAULT_TEXT_CODEC
+
+TEXT_ESCAPE = 0xFF
+MAX_DECODED_BYTES = 1 << 24  # 解壓縮上限（16 MB），避免錯誤密鑰的亂碼解出超大內容
+
+# ==================== 預設字典 ====================
+# deflate 會從字典中找重複字串，越常用的放越後面（距離越短、編碼越省）
+PRESET_PHRASES = [
+    # 英文
+    "the and that have for not with you this but his from they say her she will one all would there their",
+    "what about which when make can like time just him know take people into year your good some could them",
+    "see other than then now look only come its over think also back after use two how our work first well",
+    "way even new want because any these give day most us is are was were been has had do does did done",
+    "please thank you thanks sorry hello hi hey dear meet meeting tomorrow today tonight morning afternoon",
+    "evening call me text message send sent password account code number address phone email login secret",
+    "key open door home office school at on in to of a I'm I'll don't can't it's let's see you later",
+    "see you soon love miss you ok okay yes no maybe sure great nice happy birthday congratulations",
+    "The password is ", "My password is ", "Meet me at ", "See you at ", "Call me at ", "Don't tell anyone",
+    "Hello, World!", "Hello, ", "Hi, ", "Thank you", "I love you", "Good morning", "Good night",
+    # 中文
+    "的一是不了人我在有他這中大來上個國到說們為子和你地出道也時年得就那要下以生會自着去之過家學對可",
+    "她裡後小麼心多天而能好都然沒日於起還發成事只作當想看文無開手十用主行方又如前所本見經頭面公同三",
+    "已老從動兩長知民樣現分將外但身些與高意進把法此實回二理美點月明其種聲全工己話兒者向情部正名定女",
+    "問力機給等幾很業最間新什打便位因重被走電四第門相次東政海口使教西再平真聽世氣信北少關並內加化由",
+    "你好", "您好", "謝謝", "不客氣", "對不起", "沒關係", "再見", "明天見", "晚安", "早安", "午安",
+    "我愛你", "想你", "生日快樂", "新年快樂", "恭喜", "辛苦了", "加油", "沒問題", "好的", "知道了",
+    "收到", "請問", "麻煩你", "幫我", "記得", "不要", "可以", "應該", "已經", "現在", "今天", "明天",
+    "昨天", "晚上", "早上", "下午", "中午", "時間", "地點", "見面", "開會", "會議", "公司", "學校",
+    "老師", "同學", "朋友", "家人", "媽媽", "爸爸", "密碼", "帳號", "號碼", "電話", "地址", "訊息",
+    "秘密", "機密", "重要", "小心", "注意", "安全", "危險", "不要告訴別人", "這是秘密", "只有你知道",
+    "你在哪裡", "我在這裡", "什麼時候", "為什麼", "怎麼辦", "怎麼樣", "沒有", "還有", "因為", "所以",
+    "但是", "如果", "一起", "一下", "一點", "一個", "我們", "你們", "他們", "大家", "自己", "喜歡",
+    "覺得", "知道", "告訴", "需要", "希望", "問題", "事情", "東西", "地方", "今天天氣很好",
+    "，", "。", "！", "？", "：", "、", "「", "」", "（", "）", "…",
+]
+PRESET_DICTIONARY = ' '.join(PRESET_PHRASES).encode('utf-8')
+
+# ==================== 編碼 ====================
+def deflate_encode(text):
+    """文字 → 預設字典 raw deflate bytes"""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, zdict=PRESET_DICTIONARY)
+    return compressor.compress(text.encode('utf-8')) + compressor.flush()
+
+def deflate_decode(data):
+    """預設字典 raw deflate bytes → 文字"""
+    decompressor = zlib.decompressobj(-15, zdict=PRESET_DICTIONARY)
+    raw = decompressor.decompress(data, MAX_DECODED_BYTES)
+    if decompressor.unconsumed_tail:
+        raise ValueError("解壓縮後的文字超過上限")
+    return raw.decode('utf-8')
+
+def utf16_encode(text):
+    return text.encode('utf-16-be')
+
+def utf16_decode(data):
+    return data.decode('utf-16-be')
+
+# cjk 視窗編碼：第一個 byte < 0x80 → ASCII 1 byte；否則 2 bytes，低 15 bits 為視窗索引
+# 視窗依序排列（索引 = 視窗起點 + 偏移），其他字元用 CJK_OTHER_INDEX + 3 bytes 碼位
+CJK_WINDOWS = [
+    (0x4E00, 0x9FFF),  # 中日韓統一表意文字（常用漢字）
+    (0x3000, 0x303F),  # 中日韓標點（、。「」等）
+    (0xFF00, 0xFFEF),  # 全形字元（，！？：等）
+    (0x3040, 0x30FF),  # 平假名、片假名
+    (0x3100, 0x312F),  # 注音符號
+    (0x3400, 0x4DBF),  # 擴充 A
+]
+CJK_OTHER_INDEX = 0x7FFF  # 不在任何視窗的字元（emoji、拉丁字母等）
+
+def build_cjk_windows():
+    """視窗表：[(碼位起點, 碼位終點, 索引起點)]"""
+    windows, index = [], 0
+    for start, end in CJK_WINDOWS:
+        windows.append((start, end, index))
+        index += end - start + 1
+    assert index <= CJK_OTHER_INDEX
+    return windows
+
+CJK_WINDOW_TABLE = build_cjk_windows()
+
+def cjk_encode(text):
+    """文字 → cjk 視窗編碼"""
+    out = bytearray()
+    for ch in text:
+        code = ord(ch)
+        if code < 0x80:
+            out.append(code)
+            continue
+        for start, end, base in CJK_WINDOW_TABLE:
+            if start <= code <= end:
+                index = base + code - start
+                break
+        else:
+            index = CJK_OTHER_INDEX
+        out += bytes([0x80 | (index >> 8), index & 0xFF])
+        if index == CJK_OTHER_INDEX:
+            out += code.to_bytes(3, 'big')
+    return bytes(out)
+
+def cjk_decode(data):
+    """cjk 視窗編碼 → 文字"""
+    chars, i = [], 0
+    while i < len(data):
+        if data[i] < 0x80:
+            chars.append(chr(data[i]))
+            i += 1
+            continue
+        if i + 2 > len(data):
+            raise ValueError("cjk 編碼不完整")
+        index = ((data[i] & 0x7F) << 8) | data[i + 1]
+        i += 2
+        if index == CJK_OTHER_INDEX:
+            if i + 3 > len(data):
+                raise ValueError("cjk 編碼不完整")
+            chars.append(chr(int.from_bytes(data[i:i + 3], 'big')))
+            i += 3
+            continue
+        for start, end, base in CJK_WINDOW_TABLE:
+            if base <= index <= base + end - start:
+                chars.append(chr(start + index - base))
+                break
+        else:
+            raise ValueError(f"cjk 編碼的視窗索引超出範圍: {index}")
+    return ''.join(chars)
+
+# 編碼名稱 → (編號, 編碼函數, 解碼函數)
+TEXT_CODECS = {
+    'deflate': (1, deflate_encode, deflate_decode),
+    'utf16': (2, utf16_encode, utf16_decode),
+    'cjk': (3, cjk_encode, cjk_decode),
+}
+CODEC_BY_ID = {codec_id: (name, decode) for name, (codec_id, _, decode) in TEXT_CODECS.items()}
+
+def available_text_codecs():
+    """可用的編碼名稱（含 'raw'、'auto'）"""
+    return ['raw', 'auto'] + list(TEXT_CODECS)
+
+def encode_text_payload(text, codec=None):
+    """
+    功能:
+        將文字編碼成文字機密內容（XOR 加密前）
+
+    參數:
+        text: 文字字串
+        codec: 'raw'、'auto' 或 TEXT_CODECS 中的名稱，None 表示 config.DEFAULT_TEXT_CODEC
+
+    返回:
+        data: bytes（沒有比 UTF-8 短時一律用 UTF-8）
+    """
+    codec = codec or DEFAULT_TEXT_CODEC
+    raw = text.encode('utf-8')
+    if codec == 'raw':
+        return raw
+    if codec == 'auto':
+        candidates = list(TEXT_CODECS)
+    elif codec in TEXT_CODECS:
+        candidates = [codec]
+    else:
+        raise ValueError(f"未知的文字編碼方式: {codec}（可用: {', '.join(available_text_codecs())}）")
+
+    best = raw
+    for name in candidates:
+        codec_id, encode, _ = TEXT_CODECS[name]
+        data = bytes([TEXT_ESCAPE, codec_id]) + encode(text)
+        if len(data) < len(best):
+            best = data
+    return best
+
+def decode_text_payload(data):
+    """
+    功能:
+        將文字機密內容解碼成文字（自動判斷編碼方式）
+
+    參數:
+        data: bytes
+
+    返回:
+        text: 文字（無法解碼的部分忽略，與舊版 binary_to_text 相同）
+
+    註:
+        密鑰或載體不對時內容是亂碼，剛好以 0xFF 開頭也會因解碼失敗而當成 UTF-8 處理
+    """
+    if len(data) >= 2 and data[0] == TEXT_ESCAPE and data[1] in CODEC_BY_ID:
+        try:
+            return CODEC_BY_ID[data[1]][1](data[2:])
+        except (ValueError, OverflowError, zlib.error):
+            pass
+    return data.decode('utf-8', errors='ignore')
+
+def text_codec_name(data):
+    """文字機密內容使用的編碼名稱（'raw' 或 TEXT_CODECS 中的名稱）"""
+    if len(data) >= 2 and data[0] == TEXT_ESCAPE and data[1] in CODEC_BY_ID:
+        return CODEC_BY_ID[data[1]][0]
+    return 'raw'
@@ -1,6 +1,8 @@
 # 建立 text_encoding.py → Z 碼文字編碼模組
 # Z 碼與二進位字串互轉
 
+from config import Z_FAST_DECODE_TEXT_TAG
+
 def z_to_text(z_bits):
     """
     功能:
@@ -36,3 +38,64 @@ def text_to_z(z_text):
     z_bits = [int(bit) for bit in z_text]
     
     return z_bits
+
+# ==================== 含 Header 版（QR Code 內容、CLI 管線使用）====================
+def z_to_text_with_header(z_bits, style_num, img_num, img_size, fast_decode=False):
+    """
+    功能:
+        將 Z 碼編碼成含 header 的文字（QR Code 內容格式）
+    
+    參數:
+        z_bits: Z 碼位元列表
+        style_num: 風格編號（1~5）
+        img_num: 圖像編號（1~7）
+        img_size: 圖像尺寸（64, 128, 256...）
+        fast_decode: 載體是否用快速灰階解碼（見 image_library.decode_cover_gray）
+    
+    返回:
+        content: 文字，格式為 "風格編號-圖像編號-尺寸|Z碼"，快速解碼時為 "風格編號-圖像編號-尺寸-f|Z碼"
+    
+    範例:
+        [1, 0, 1, 1], 1, 3, 512 → "1-3-512|1011"
+        [1, 0, 1, 1], 1, 3, 512, fast_decode=True → "1-3-512-f|1011"
+    """
+    tag = f"-{Z_FAST_DECODE_TEXT_TAG}" if fast_decode else ""
+    return f"{style_num}-{img_num}-{img_size}{tag}|{z_to_text(z_bits)}"
+
+def text_to_z_with_header(content):
+    """
+    功能:
+        從含 header 的文字解碼 Z 碼
+    
+    參數:
+        content: 文字，格式為 "風格編號-圖像編號-尺寸|Z碼"（快速解碼的載體為 "風格編號-圖像編號-尺寸-f|Z碼"）
+                 或舊格式 "圖像編號-尺寸|Z碼"（風格預設為 1）
+    
+    返回:
+        z_bits: Z 碼位元列表
+        style_num: 風格編號
+        img_num: 圖像編號
+        img_size: 圖像尺寸
+        fast_decode: 載體是否用快速灰階解碼
+    
+    例外:
+        格式錯誤時拋出 ValueError
+    """
+    if '|' not in content:
+        raise ValueError("Z碼文字格式錯誤：缺少 '|'")
+    
+    header, z_text = content.split('|', 1)
+    parts = header.strip().split('-')
+    fast_decode = len(parts) == 4 and parts[3] == Z_FAST_DECODE_TEXT_TAG
+    if fast_decode:
+        parts = parts[:3]
+    if len(parts) == 3:    # 新格式: 風格編號-圖像編號-尺寸
+        style_num, img_num, img_size = (int(p) for p in parts)
+    elif len(parts) == 2:  # 舊格式: 圖像編號-尺寸（預設風格=建築）
+        style_num = 1
+        img_num, img_size = (int(p) for p in parts)
+    else:
+        raise ValueError(f"Z碼文字格式錯誤：{header}")
+    
+    z_bits = text_to_z(''.join(c for c in z_text if c in '01'))
+    return z_bits, style_num, img_num, img_size, fast_decode
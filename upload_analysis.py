@@ -0,0 +1,172 @@
+# 建立 upload_analysis.py → 上傳檔案分析模組
+# 分析使用者上傳的機密圖像、Z碼圖（含自動縮放），並依「上傳編號 + 內容雜湊」記住結果
+#
+# Streamlit 每次重新執行腳本都會重跑頁面程式；上傳的檔案沒變時，
+# 直接用記住的分析結果，不必重新開圖、轉 RGBA 判斷透明度、重跑 pyzbar 解碼
+
+import hashlib
+from io import BytesIO
+
+from PIL import Image
+
+from embed import plan_embedding
+from autofit import fit_image_secret
+from secret_encoding import get_image_color_info
+from text_encoding import z_to_text, text_to_z_with_header
+from image_encoding import image_to_z_with_header
+
+MEMO_MAX_ENTRIES = 8  # 每個 session 最多記住幾個上傳檔案
+
+# ==================== 分析 ====================
+def analyze_secret_image(data, image_codec=None, key_tag=None, progressive=None):
+    """
+    功能:
+        分析上傳的機密圖像
+
+    參數:
+        data: 圖檔 bytes
+        image_codec: 嵌入時的圖像編碼方式（見 embed.embed_secret）
+        key_tag: 嵌入時是否加密鑰檢查碼
+        progressive: 嵌入時逐像素圖像是否用漸進式順序
+
+    返回:
+        dict:
+            - size: (寬, 高)
+            - mode: 色彩模式（'RGB'、'P' 等）
+            - has_alpha: 是否有透明通道
+            - required_bits: 嵌入所需位元數（含類型標記）
+    """
+    image = Image.open(BytesIO(data))
+    _, has_alpha = get_image_color_info(image)
+    return {
+        'size': image.size,
+        'mode': image.mode,
+        'has_alpha': has_alpha,
+        'required_bits': plan_embedding(image, 'image', image_codec=image_codec, key_tag=key_tag,
+                                        progressive=progressive)['required_bits'],
+    }
+
+def fit_secret_image(data, image_codec, cover_size, key_tag=None, progressive=None):
+    """
+    功能:
+        將上傳的機密圖像自動縮放到放得進指定尺寸的載體（見 autofit.fit_image_secret）
+
+    參數:
+        data: 圖檔 bytes
+        image_codec: 嵌入時的圖像編碼方式
+        cover_size: 載體邊長
+        key_tag: 嵌入時是否加密鑰檢查碼
+        progressive: 嵌入時逐像素圖像是否用漸進式順序
+
+    返回:
+        dict:
+            - image: 調整後的 PIL Image（失敗為 None）
+            - info: fit_image_secret 的調整資訊（失敗為 None）
+            - error: 縮到最小仍放不下的原因
+    """
+    try:
+        fitted, info = fit_image_secret(Image.open(BytesIO(data)), cover_size=cover_size, image_codec=image_codec,
+                                        key_tag=key_tag, progressive=progressive)
+    except ValueError as e:
+        return {'image': None, 'info': None, 'error': str(e)}
+    return {'image': fitted, 'info': info, 'error': ''}
+
+def analyze_z_code_upload(data, decode_qr=None):
+    """
+    功能:
+        解析上傳的 Z碼圖（先試 QR Code，失敗再試圖像 Z碼）
+
+    參數:
+        data: 圖檔 bytes
+        decode_qr: pyzbar 的 decode 函數（None 表示跳過 QR Code）
+
+    返回:
+        dict:
+            - detected: 是否成功識別
+            - source: 'qr' 或 'image'（識別失敗為 None）
+            - z_text: Z 碼的 0/1 字串
+            - style_num, img_num, img_size, fast_decode: 標頭中的載體資訊（fast_decode: 載體用快速灰階解碼）
+            - error: 識別失敗的原因
+    """
+    uploaded_img = Image.open(BytesIO(data))
+    result = {'detected': False, 'source': None, 'z_text': None,
+              'style_num': None, 'img_num': None, 'img_size': None, 'fast_decode': False, 'error': ''}
+    errors = []
+
+    # ----- 先嘗試 QR Code 解碼 -----
+    if decode_qr is not None:
+        try:
+            decoded = decode_qr(uploaded_img)
+            if decoded:
+                qr_content = decoded[0].data.decode('utf-8')
+                if '|' in qr_content:
+                    # 格式: 風格編號-圖像編號-尺寸|Z碼（舊格式: 圖像編號-尺寸|Z碼）
+                    z_bits, style_num, img_num, img_size, fast_decode = text_to_z_with_header(qr_content)
+                    result.update(detected=True, source='qr', z_text=z_to_text(z_bits), style_num=style_num,
+                                  img_num=img_num, img_size=img_size, fast_decode=fast_decode)
+                    return result
+        except Exception as e:
+            errors.append(f"QR: {str(e)}")
+
+    # ----- QR 失敗則嘗試圖像 Z碼解碼 -----
+    try:
+        z_bits, style_num, img_num, img_size, fast_decode = image_to_z_with_header(uploaded_img)
+        result.update(detected=True, source='image', z_text=z_to_text(z_bits), style_num=style_num,
+                      img_num=img_num, img_size=img_size, fast_decode=fast_decode)
+    except Exception as e:
+        errors.append(str(e))
+
+    result['error'] = ", ".join(errors)
+    return result
+
+# ==================== 記憶 ====================
+def upload_identity(data, file_id=None):
+    """
+    功能:
+        上傳檔案的識別鍵
+
+    參數:
+        data: 檔案 bytes
+        file_id: Streamlit UploadedFile 的編號（沒有則只用內容雜湊）
+
+    返回:
+        (file_id, sha256 十六進位字串)
+    """
+    return file_id, hashlib.sha256(data).hexdigest()
+
+def get_file_id(uploaded_file):
+    """Streamlit UploadedFile 的編號（舊版 Streamlit 為 id）"""
+    return getattr(uploaded_file, 'file_id', None) or getattr(uploaded_file, 'id', None)
+
+class UploadMemo:
+    """
+    上傳檔案分析結果（放在 st.session_state，每個使用者各自一份）
+
+    結構:
+        {(分析種類, file_id, sha256): 分析結果}，超過 MEMO_MAX_ENTRIES 時移除最舊的
+
+    用法:
+        info = memo.get('secret_image', data, analyze_secret_image, file_id=get_file_id(f))
+    """
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = {}
+
+    def get(self, kind, data, analyze, file_id=None):
+        """取得分析結果，沒有才呼叫 analyze(data) 分析"""
+        key = (kind,) + upload_identity(data, file_id)
+        if key in self._entries:
+            self._entries[key] = self._entries.pop(key)  # 移到最新
+            return self._entries[key]
+
+        result = analyze(data)
+        self._entries[key] = result
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+        return result
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)